@@ -0,0 +1,280 @@
+"""Local stand-in for the Gemini and Bittrex APIs used by the pollers.
+
+The server is seeded with synthetic trades and implements the request
+signatures, pagination and rate limit errors of the real APIs, with an
+optional latency added to every response. Run it on its own with e.g.
+
+    python -m benchmarks.fake_exchange_server --port 8000 --trades 10000 --latency 0.05
+"""
+
+import argparse
+import base64
+from datetime import datetime, timedelta
+from decimal import Decimal
+import hashlib
+import hmac
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+GEMINI_MARKETS = {
+        'btcusd': ('BTC', 'USD'),
+        'ethusd': ('ETH', 'USD'),
+        'ethbtc': ('ETH', 'BTC'),
+        'zecbtc': ('ZEC', 'BTC')}
+BITTREX_MARKETS = ('BTC-LTC', 'BTC-ETH', 'ETH-OMG', 'USDT-BTC')
+GEMINI_PAGE_LIMIT = 500
+FIRST_TRADE_DATE = datetime(2018, 1, 1)
+# decimal places of the amounts and prices sent by both APIs
+AMOUNT_PLACES = 8
+
+def randomAmount(generator, maxAmount):
+    """Return a random amount of up to maxAmount with all decimal places used."""
+
+    return Decimal(generator.randint(1, maxAmount * 10 ** AMOUNT_PLACES)).scaleb(-AMOUNT_PLACES)
+
+def generateGeminiTrades(numTrades, seed=0):
+    """Create time-ordered trades over the Gemini markets, filling orders in up to four parts."""
+
+    generator = random.Random(seed)
+    trades = {symbol: [] for symbol in GEMINI_MARKETS}
+    timestampms = int(FIRST_TRADE_DATE.timestamp() * 1000)
+    tradeId = 0
+    while tradeId < numTrades:
+        symbol = generator.choice(sorted(GEMINI_MARKETS))
+        orderId = str(generator.getrandbits(40))
+        orderType = generator.choice(('Buy', 'Sell'))
+        price = randomAmount(generator, 1000)
+        for _ in range(min(generator.randint(1, 4), numTrades - tradeId)):
+            # trades often share a second, and sometimes a millisecond
+            timestampms += generator.choice((0, 1, 250, 1000, 60000))
+            amount = randomAmount(generator, 100)
+            trades[symbol].append({
+                    'tid': tradeId,
+                    'order_id': orderId,
+                    'timestamp': timestampms // 1000,
+                    'timestampms': timestampms,
+                    'type': orderType,
+                    'price': str(price),
+                    'amount': str(amount),
+                    'fee_currency': GEMINI_MARKETS[symbol][1],
+                    'fee_amount': str(round(amount * price / 400, AMOUNT_PLACES)),
+                    'aggressor': generator.random() < 0.5,
+                    'exchange': 'gemini',
+                    'is_auction_fill': False})
+            tradeId += 1
+    return trades
+
+def generateBittrexOrders(numOrders, seed=0):
+    """Create closed Bittrex orders, most recently closed first as returned by the API."""
+
+    generator = random.Random(seed)
+    orders = []
+    closedDate = FIRST_TRADE_DATE
+    for _ in range(numOrders):
+        closedDate += timedelta(seconds=generator.choice((0, 1, 30, 3600)))
+        # JSON numbers, which the API rounds to the decimal places of the exchange
+        quantity = float(randomAmount(generator, 100))
+        limit = float(randomAmount(generator, 1))
+        price = round(quantity * limit, AMOUNT_PLACES)
+        orders.append({
+                'OrderUuid': "{:032x}".format(generator.getrandbits(128)),
+                'Exchange': generator.choice(BITTREX_MARKETS),
+                'TimeStamp': (closedDate - timedelta(minutes=5)).isoformat(),
+                'OrderType': generator.choice(('LIMIT_BUY', 'LIMIT_SELL')),
+                'Limit': limit,
+                'Quantity': quantity,
+                'QuantityRemaining': 0.0,
+                'Commission': round(price * 0.0025, AMOUNT_PLACES),
+                'Price': price,
+                'PricePerUnit': limit,
+                'IsConditional': False,
+                'Condition': None,
+                'ConditionTarget': None,
+                'ImmediateOrCancel': False,
+                'Closed': closedDate.isoformat()})
+    orders.reverse()
+    return orders
+
+class FakeExchangeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if not self._admitRequest():
+            return
+        url = urlsplit(self.path)
+        if url.path == '/v1/symbols':
+            self._reply(sorted(self.server.geminiTrades))
+        elif url.path.startswith('/v1/symbols/details/'):
+            symbol = url.path.rsplit('/', 1)[1]
+            if symbol not in GEMINI_MARKETS:
+                self._reply({'result': 'error', 'reason': 'InvalidSymbol'}, status=400)
+                return
+            currency, baseCurrency = GEMINI_MARKETS[symbol]
+            self._reply({
+                    'symbol': symbol.upper(), 'base_currency': currency,
+                    'quote_currency': baseCurrency})
+        elif url.path == '/api/v1.1/account/getorderhistory':
+            self._bittrexOrderHistory(parse_qs(url.query))
+        else:
+            self._reply({'result': 'error', 'reason': 'EndpointNotFound'}, status=404)
+
+    def do_POST(self):
+        if not self._admitRequest():
+            return
+        if self.path != '/v1/mytrades':
+            self._reply({'result': 'error', 'reason': 'EndpointNotFound'}, status=404)
+            return
+        encodedPayload = self.headers.get('X-GEMINI-PAYLOAD', '')
+        signature = hmac.new(
+                self.server.secret.encode(), encodedPayload.encode(), hashlib.sha384).hexdigest()
+        if (self.headers.get('X-GEMINI-APIKEY') != self.server.key
+                or not hmac.compare_digest(signature, self.headers.get('X-GEMINI-SIGNATURE', ''))):
+            self._reply({'result': 'error', 'reason': 'InvalidSignature'}, status=400)
+            return
+        payload = json.loads(base64.b64decode(encodedPayload))
+        with self.server.lock:
+            nonceUsed = (self.server.key, payload['nonce']) in self.server.nonces
+            self.server.nonces.add((self.server.key, payload['nonce']))
+        if nonceUsed:
+            self._reply({'result': 'error', 'reason': 'InvalidNonce'}, status=400)
+            return
+        timestamp = payload.get('timestamp', 0)
+        # timestamps may be given in seconds or milliseconds
+        timestampms = timestamp if timestamp > 10 ** 11 else timestamp * 1000
+        limit = min(payload.get('limit_trades', 50), GEMINI_PAGE_LIMIT)
+        trades = self.server.geminiTrades.get(payload['symbol'], [])
+        if 'timestamp' in payload:
+            page = [trade for trade in trades if trade['timestampms'] >= timestampms][:limit]
+        else:
+            page = trades[-limit:]
+        # the newest trades are listed first
+        self._reply(page[::-1])
+
+    def _bittrexOrderHistory(self, query):
+        requestUrl = "http://{}:{}{}".format(
+                self.server.server_address[0], self.server.server_port, self.path)
+        signature = hmac.new(
+                self.server.secret.encode(), requestUrl.encode(), hashlib.sha512).hexdigest()
+        if (query.get('apikey') != [self.server.key]
+                or not hmac.compare_digest(signature, self.headers.get('apisign', ''))):
+            self._reply({'success': False, 'message': 'INVALID_SIGNATURE', 'result': None})
+        else:
+            self._reply({'success': True, 'message': '', 'result': self.server.bittrexOrders})
+
+    def _admitRequest(self):
+        """Delay the response by the server's latency, rejecting requests over its rate limit."""
+
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.numRequests += 1
+            now = time.monotonic()
+            if self.server.rateLimit:
+                self.server.tokens = min(
+                        self.server.rateLimit,
+                        self.server.tokens + (now - self.server.updated) * self.server.rateLimit)
+                self.server.updated = now
+                if self.server.tokens < 1:
+                    self.server.numRejected += 1
+                    rejected = True
+                else:
+                    self.server.tokens -= 1
+                    rejected = False
+            else:
+                rejected = False
+            if (not rejected and self.server.failEvery
+                    and self.server.numRequests % self.server.failEvery == 0):
+                self.server.numRejected += 1
+                rejected = True
+        if rejected:
+            body = b"Too Many Requests"
+            self.send_response(429)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        return not rejected
+
+    def _reply(self, value, status=200):
+        body = json.dumps(value).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeExchangeServer(ThreadingHTTPServer):
+    """HTTP server answering Gemini and Bittrex API requests from seeded synthetic trades.
+
+    rateLimit is the number of requests per second accepted before replying
+    with 429 Too Many Requests, and every failEvery-th request is rejected
+    the same way regardless of the rate.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+            self, port=0, key='key', secret='secret', numTrades=1000, seed=0,
+            latency=0, rateLimit=None, failEvery=None):
+        super(FakeExchangeServer, self).__init__(('127.0.0.1', port), FakeExchangeHandler)
+        self.key = key
+        self.secret = secret
+        self.geminiTrades = generateGeminiTrades(numTrades, seed)
+        self.bittrexOrders = generateBittrexOrders(numTrades, seed)
+        self.latency = latency
+        self.rateLimit = rateLimit
+        self.failEvery = failEvery
+        self.lock = threading.Lock()
+        self.nonces = set()
+        self.numRequests = 0
+        self.numRejected = 0
+        self.tokens = rateLimit or 0
+        self.updated = time.monotonic()
+        self.thread = None
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+def main():
+    argumentParser = argparse.ArgumentParser(
+            description="Serve synthetic Gemini and Bittrex order history.")
+    argumentParser.add_argument('--port', type=int, default=8000)
+    argumentParser.add_argument(
+            '--trades', type=int, default=10000, help="number of trades per exchange")
+    argumentParser.add_argument('--seed', type=int, default=0)
+    argumentParser.add_argument(
+            '--latency', type=float, default=0, help="seconds added to every response")
+    argumentParser.add_argument(
+            '--rate-limit', type=float, help="requests per second before replying 429")
+    args = argumentParser.parse_args()
+    server = FakeExchangeServer(
+            port=args.port, numTrades=args.trades, seed=args.seed,
+            latency=args.latency, rateLimit=args.rate_limit)
+    print("Serving on {} with API key 'key' and secret 'secret'".format(server.url))
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
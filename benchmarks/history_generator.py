@@ -0,0 +1,137 @@
+"""Write synthetic exchange history files in the formats read by the history parsers.
+
+Orders are filled by up to four trades, and a re-import file can be
+written which overlaps the end of a history file, as when a newer export
+of the same account is imported. Run with e.g.
+
+    python -m benchmarks.history_generator --format kraken --rows 100000 --overlap 0.5 /tmp/history
+"""
+
+import argparse
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import chain, islice
+import os
+import random
+
+FIRST_TRADE_DATE = datetime(2018, 1, 1)
+EIGHT_PLACES = Decimal('1E-8')
+# market names of each format, in the order of MARKETS
+MARKETS = (('ETH', 'BTC'), ('LTC', 'BTC'), ('BTC', 'USD'), ('ETH', 'USD'))
+BITTREX_MARKETS = ('BTC-ETH', 'BTC-LTC', 'USD-BTC', 'USD-ETH')
+KRAKEN_MARKETS = ('XETHXXBT', 'XLTCXXBT', 'XXBTZUSD', 'XETHZUSD')
+POLONIEX_MARKETS = ('ETH/BTC', 'LTC/BTC', 'BTC/USD', 'ETH/USD')
+
+BITTREX_HEADER = 'OrderUuid,Exchange,Type,Quantity,Limit,CommissionPaid,Price,Opened,Closed'
+KRAKEN_HEADER = (
+        '"txid","ordertxid","pair","time","type","ordertype",'
+        '"price","cost","fee","vol","margin","misc","ledgers"')
+POLONIEX_HEADER = (
+        'Date,Market,Category,Type,Price,Amount,Total,Fee,Order Number,'
+        'Base Total Less Fee,Quote Total Less Fee')
+
+Fill = namedtuple('Fill', (
+        'tradeId', 'orderId', 'fillNumber', 'closedDate', 'orderType', 'market', 'price', 'amount'))
+
+def generateFills(seed=0, maxFillsPerOrder=4):
+    """Generate endless trades in order of time, filling orders in up to maxFillsPerOrder parts."""
+
+    generator = random.Random(seed)
+    closedDate = FIRST_TRADE_DATE
+    tradeId = 0
+    while True:
+        market = generator.randrange(len(MARKETS))
+        orderId = generator.getrandbits(128)
+        orderType = generator.choice(('Buy', 'Sell'))
+        price = Decimal(generator.randint(1, 10 ** 6)).scaleb(-4)
+        for fillNumber in range(generator.randint(1, maxFillsPerOrder)):
+            closedDate += timedelta(seconds=generator.choice((0, 1, 30, 3600)))
+            amount = Decimal(generator.randint(1, 10 ** 6)).scaleb(-4)
+            yield Fill(tradeId, orderId, fillNumber, closedDate, orderType, market, price, amount)
+            tradeId += 1
+
+def formatBittrexLine(fill):
+    subtotal = fill.price * fill.amount
+    return ("{:032x},{},LIMIT_{},{},{},{},{},"
+            "{:%m/%d/%Y %I:%M:%S %p},{:%m/%d/%Y %I:%M:%S %p}\n").format(
+            fill.orderId, BITTREX_MARKETS[fill.market], fill.orderType.upper(),
+            fill.amount, fill.price, (subtotal * Decimal('0.0025')).quantize(EIGHT_PLACES),
+            subtotal, fill.closedDate - timedelta(minutes=5), fill.closedDate)
+
+def formatKrakenLine(fill):
+    cost = fill.price * fill.amount
+    return '"T{:015X}","O{:015X}","{}","{:%Y-%m-%d %H:%M:%S}.{:04d}","{}","limit",' \
+            '"{}","{}","{}","{}","0.00000","","L{:015X},L{:015X}"\n'.format(
+            fill.tradeId, fill.orderId % 16 ** 15, KRAKEN_MARKETS[fill.market], fill.closedDate,
+            fill.tradeId % 10000, fill.orderType.lower(), fill.price, cost,
+            (cost * Decimal('0.0026')).quantize(EIGHT_PLACES), fill.amount,
+            2 * fill.tradeId, 2 * fill.tradeId + 1)
+
+def formatPoloniexLine(fill):
+    total = fill.price * fill.amount
+    if fill.orderType == 'Buy':
+        baseTotal = -total
+        quoteTotal = fill.amount - (fill.amount * Decimal('0.0025')).quantize(EIGHT_PLACES)
+    else:
+        baseTotal = total - (total * Decimal('0.0025')).quantize(EIGHT_PLACES)
+        quoteTotal = -fill.amount
+    return "{:%Y-%m-%d %H:%M:%S},{},Exchange,{},{},{},{},0.25%,{},{},{}\n".format(
+            fill.closedDate, POLONIEX_MARKETS[fill.market], fill.orderType, fill.price, fill.amount,
+            total, fill.orderId % 10 ** 11, baseTotal, quoteTotal)
+
+# header, line formatter, file encoding and trades per order of each format
+FORMATS = {
+        'bittrex': (BITTREX_HEADER, formatBittrexLine, 'utf-8', 1),
+        # as exported by Bittrex for some accounts, with a byte order mark
+        'bittrex-utf16': (BITTREX_HEADER, formatBittrexLine, 'utf-16', 1),
+        'kraken': (KRAKEN_HEADER, formatKrakenLine, 'utf-8', 4),
+        'poloniex': (POLONIEX_HEADER, formatPoloniexLine, 'utf-8', 4)}
+
+def writeHistoryFile(path, historyFormat, numRows, seed=0, firstRow=0):
+    """Write numRows trades of a history starting from the order including its trade firstRow.
+
+    Starting from the beginning of an order, a file overlapping a previous
+    one completes the order that was cut off at the end of the previous file.
+    """
+
+    header, formatLine, encoding, maxFillsPerOrder = FORMATS[historyFormat]
+    fills = generateFills(seed, maxFillsPerOrder)
+    start = next(fill for fill in fills if fill.tradeId >= firstRow and fill.fillNumber == 0)
+    with open(path, 'w', encoding=encoding, newline='') as historyFile:
+        historyFile.write(header + '\n')
+        historyFile.writelines(formatLine(fill) for fill in islice(chain([start], fills), numRows))
+    return path
+
+def writeHistoryFiles(directory, historyFormat, numRows, seed=0, overlap=0.5):
+    """Write a history file and a re-import file sharing some of its rows, returning their paths."""
+
+    name = "{}-{}".format(historyFormat, numRows)
+    path = writeHistoryFile(os.path.join(directory, name + '.csv'), historyFormat, numRows, seed)
+    reimportPath = writeHistoryFile(
+            os.path.join(directory, name + '-reimport.csv'), historyFormat, numRows, seed,
+            firstRow=int(numRows * (1 - overlap)))
+    return path, reimportPath
+
+def main():
+    argumentParser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argumentParser.add_argument('directory')
+    argumentParser.add_argument(
+            '--format', choices=sorted(FORMATS), action='append', dest='formats')
+    argumentParser.add_argument(
+            '--rows', type=int, action='append', help="default 10000, 100000 and 1000000")
+    argumentParser.add_argument(
+            '--overlap', type=float, default=0.5,
+            help="fraction of rows repeated by the re-import file")
+    argumentParser.add_argument('--seed', type=int, default=0)
+    args = argumentParser.parse_args()
+    os.makedirs(args.directory, exist_ok=True)
+    for historyFormat in args.formats or sorted(FORMATS):
+        for numRows in args.rows or (10000, 100000, 1000000):
+            paths = writeHistoryFiles(
+                    args.directory, historyFormat, numRows, args.seed, args.overlap)
+            for path in paths:
+                print(path)
+
+if __name__ == "__main__":
+    main()
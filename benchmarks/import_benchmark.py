@@ -0,0 +1,161 @@
+"""Measure each stage of importing synthetic history files into an empty database.
+
+For every format and number of rows, a history file and an overlapping
+re-import file are written, and the time taken by each stage along with
+the peak memory of the process is recorded. Run with e.g.
+
+    python -m benchmarks.import_benchmark --format poloniex --rows 100000 --tracker
+"""
+
+import argparse
+from contextlib import contextmanager
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.history_generator import FORMATS, writeHistoryFiles
+from model import Base, createEngine, createReaderEngine
+from parsers.history_file import HistoryFile
+from parsers.history_parser_factory import HistoryParserFactory
+from trading.portfolio import Portfolio
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def _maxRssMiB():
+    if resource is None:
+        return None
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+@contextmanager
+def _stage(results, name, traceMemory):
+    if traceMemory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    yield
+    results[name] = {'seconds': time.perf_counter() - start, 'maxRssMiB': _maxRssMiB()}
+    if traceMemory:
+        results[name]['peakAllocatedMiB'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+def _parse(path):
+    parser, _ = HistoryParserFactory.detectFileParser(path)
+    with HistoryFile(path) as historyFile:
+        trades = list(parser.parseTrades(historyFile.lines(), lambda **kwargs: None))
+    return parser, trades
+
+def benchmarkImport(path, reimportPath, databasePath, tracker=False, traceMemory=False):
+    """Import a history file and its re-import file into a new database, with results by stage."""
+
+    results = {}
+    # configured as the database of the GUI and command line interface
+    engine = createEngine('sqlite:///' + databasePath)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    portfolio = Portfolio.getOrCreate(session)
+
+    with _stage(results, 'detectAndParse', traceMemory):
+        parser, trades = _parse(path)
+    with _stage(results, 'ordersFromTrades', traceMemory):
+        orders = list(parser.ordersFromTrades(trades))
+    with _stage(results, 'parseHistoryFile', traceMemory):
+        # as imported from the GUI, in parallel for large files
+        parser.parseHistoryFile(
+                path, lambda **kwargs: None, lambda parsedOrders: list(parsedOrders))
+    numRows = len(trades)
+    del trades
+    with _stage(results, 'addOrders', traceMemory):
+        portfolio.addOrders(orders, session, lambda **kwargs: None, lambda changes: None)
+    reimportParser, reimportTrades = _parse(reimportPath)
+    reimportOrders = list(reimportParser.ordersFromTrades(reimportTrades))
+    reimportChanges = []
+    with _stage(results, 'reimportAddOrders', traceMemory):
+        portfolio.addOrders(reimportOrders, session, lambda **kwargs: None, reimportChanges.append)
+    with _stage(results, 'createClosedPositionOffers', traceMemory):
+        offers = portfolio.createClosedPositionOffers()
+        session.commit()
+    session.close()
+    results['counts'] = {
+            'rows': numRows,
+            'orders': len(orders),
+            'reimportedOrders': len(reimportOrders),
+            'reimportInsertedOrders': len(reimportChanges[0].insertedOrderIds),
+            'reimportUpdatedOrders': len(reimportChanges[0].updatedOrderIds),
+            'closedPositionOffers': len(offers)}
+    if tracker:
+        _benchmarkTracker(results, engine, traceMemory)
+    engine.dispose()
+    return results
+
+def _benchmarkTracker(results, engine, traceMemory):
+    # the GUI is only imported when its data-building methods are measured,
+    # without Kivy reading the arguments of the benchmark
+    os.environ.setdefault('KIVY_NO_ARGS', '1')
+    from model import (
+            engine as defaultEngine, readerEngine as defaultReaderEngine, ReadSession, Session)
+    from tracker import TrackerApp
+
+    readerEngine = createReaderEngine(engine)
+    app = TrackerApp(databaseEngine=engine, databaseReaderEngine=readerEngine)
+    try:
+        session = Session()
+        app.portfolioId = Portfolio.getOrCreate(session).id
+        session.close()
+        # rows are built without being shown, as no window is open
+        with _stage(results, 'updateOrderData', traceMemory):
+            app._updateOrderData(lambda **kwargs: None)
+        with _stage(results, 'updatePositionData', traceMemory):
+            app._updatePositionData(lambda **kwargs: None)
+    finally:
+        Session.configure(bind=defaultEngine)
+        ReadSession.configure(bind=defaultReaderEngine)
+        readerEngine.dispose()
+
+def runBenchmark(directory, formats=tuple(sorted(FORMATS)), sizes=(10000,), seed=0, tracker=False,
+        traceMemory=False):
+    """Benchmark importing history files of every format and size, by format and number of rows."""
+
+    results = {}
+    for historyFormat in formats:
+        for numRows in sizes:
+            path, reimportPath = writeHistoryFiles(directory, historyFormat, numRows, seed)
+            databasePath = os.path.join(directory, "{}-{}.db".format(historyFormat, numRows))
+            if os.path.exists(databasePath):
+                os.remove(databasePath)
+            results.setdefault(historyFormat, {})[numRows] = benchmarkImport(
+                    path, reimportPath, databasePath, tracker, traceMemory)
+    return results
+
+def main():
+    argumentParser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argumentParser.add_argument(
+            '--format', choices=sorted(FORMATS), action='append', dest='formats')
+    argumentParser.add_argument(
+            '--rows', type=int, action='append',
+            help="default 10000 and 100000, e.g. 1000000 as well")
+    argumentParser.add_argument('--seed', type=int, default=0)
+    argumentParser.add_argument('--directory', help="where history files and databases are written")
+    argumentParser.add_argument(
+            '--tracker', action='store_true',
+            help="also measure building the data displayed by the GUI")
+    argumentParser.add_argument(
+            '--trace-memory', action='store_true',
+            help="record the peak memory allocated in each stage, which slows every stage down")
+    args = argumentParser.parse_args()
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        if args.directory:
+            os.makedirs(args.directory, exist_ok=True)
+        results = runBenchmark(
+                args.directory or temporaryDirectory, args.formats or sorted(FORMATS),
+                args.rows or (10000, 100000), args.seed, args.tracker, args.trace_memory)
+    print(json.dumps(results, indent=4))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Measure how quickly orders polled from exchanges are committed to the database.
+
+All exchanges are refreshed at once from a local fake exchange server, as
+by the Refresh All button, and each exchange's orders are added to an
+empty portfolio as they arrive. Run with e.g.
+
+    python -m benchmarks.poller_benchmark --trades 20000 --latency 0.05
+"""
+
+import argparse
+import json
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.fake_exchange_server import FakeExchangeServer
+from model import Base
+from pollers.bittrex_poller import BittrexPoller
+from pollers.gemini_poller import GeminiPoller
+from pollers.poller import Poller
+from trading.portfolio import Portfolio
+
+def runBenchmark(numTrades=10000, latency=0, serverRateLimit=None, failEvery=None, seed=0):
+    """Poll all exchanges from a fake exchange server and return timings in seconds by exchange."""
+
+    engine = create_engine('sqlite://', echo=False)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    portfolio = Portfolio.getOrCreate(session)
+    results = {'exchanges': {}}
+    with FakeExchangeServer(
+            numTrades=numTrades, seed=seed, latency=latency,
+            rateLimit=serverRateLimit, failEvery=failEvery) as server:
+        pollers = [
+                GeminiPoller('key', 'secret', server.url),
+                BittrexPoller('key', 'secret', server.url)]
+        start = time.perf_counter()
+
+        def addPolledOrders(orders, **kwargs):
+            received = time.perf_counter()
+            orders = list(orders)
+            portfolio.addOrders(
+                    orders, session, lambda **kwargs: None, lambda changes: None, **kwargs)
+            committed = time.perf_counter()
+            exchange, = kwargs['syncCursors'] or [None]
+            results['exchanges'][exchange] = {
+                    'orders': len(orders),
+                    'retrievedAfter': received - start,
+                    'committedAfter': committed - start,
+                    'addOrdersTime': committed - received}
+
+        Poller.refreshAll(pollers, lambda **kwargs: None, addPolledOrders)
+        totalTime = time.perf_counter() - start
+        results.update({
+                'trades': 2 * numTrades,
+                'totalTime': totalTime,
+                'tradesPerSecond': 2 * numTrades / totalTime,
+                'requests': server.numRequests,
+                'rejectedRequests': server.numRejected})
+    session.close()
+    return results
+
+def main():
+    argumentParser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argumentParser.add_argument(
+            '--trades', type=int, default=10000, help="number of trades per exchange")
+    argumentParser.add_argument(
+            '--latency', type=float, default=0, help="seconds added to every response")
+    argumentParser.add_argument(
+            '--rate-limit', type=float, help="requests per second accepted by the server")
+    argumentParser.add_argument('--seed', type=int, default=0)
+    args = argumentParser.parse_args()
+    results = runBenchmark(args.trades, args.latency, args.rate_limit, seed=args.seed)
+    print(json.dumps(results, indent=4))
+
+if __name__ == "__main__":
+    main()
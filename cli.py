@@ -0,0 +1,225 @@
+"""Command line interface for importing orders and reporting positions without the GUI.
+
+Usage examples:
+
+    python cli.py import bittrex.csv kraken.csv
+    python cli.py poll gemini
+    python cli.py poll --full-resync
+    python cli.py --json report
+    python cli.py --timings timings.json import poloniex.csv
+"""
+
+import argparse
+from decimal import Decimal
+import json
+import logging
+import sys
+
+from instrumentation import Instruments
+from keys import KEYS
+from logger import Logger
+from migration import migrate
+from model import engine, Session
+from parsers.history_parser_factory import HistoryParserFactory
+from pollers.poller import Poller
+from pollers.poller_factory import PollerFactory
+from progress_reporter import ProgressReporter
+from trading.portfolio import Portfolio
+from trading.portfolio_changes import PortfolioChanges
+from trading.position import Position
+
+def _logProgress(text, value, maxValue, throughput, remainingSeconds):
+    Logger.debug(
+            "%s %s/%s %s", text or "", value, maxValue or "?",
+            ProgressReporter.describeRate(throughput, remainingSeconds))
+
+def _createProgressReporter():
+    # progress is logged about once a second, as it is reported for every record
+    return ProgressReporter(_logProgress, rate=1)
+
+def _collect(results):
+    """Create a callback which stores its arguments, as worker callbacks are synchronous here."""
+
+    return lambda orders, **kwargs: results.append((orders, kwargs))
+
+def importFiles(session, paths):
+    """Parse history files and add their orders to the portfolio."""
+
+    changes = PortfolioChanges()
+    portfolio = Portfolio.getOrCreate(session)
+    progress = _createProgressReporter()
+    for path in paths:
+        parser, header = HistoryParserFactory.detectFileParser(path)
+        if not parser:
+            Logger.error("Parser: Unsupported history file '%s' with header: %s", path, header)
+            continue
+        parsedOrders = []
+        parser.parseHistoryFile(path, progress, _collect(parsedOrders))
+        orders, _ = parsedOrders[0]
+        portfolio.addOrders(list(orders), session, progress, changes.update)
+        Logger.info("Imported %s", path)
+    return changes
+
+def pollExchanges(session, exchanges, fullResync=False):
+    """Retrieve the order history of exchanges with API keys in keys.py and add it to the portfolio.
+
+    The exchanges are queried at the same time and their orders are added
+    as each exchange finishes. Only orders added since the last refresh are
+    retrieved, unless fullResync is set. Returns the changes and the
+    RefreshErrors of the exchanges that failed.
+    """
+
+    changes = PortfolioChanges()
+    errors = []
+    portfolio = Portfolio.getOrCreate(session)
+    pollers = PollerFactory.createPollers(KEYS, exchanges)
+    progress = _createProgressReporter()
+    storedCursors = {
+            poller.EXCHANGE: portfolio.getSyncCursor(poller.EXCHANGE) for poller in pollers}
+    syncCursors = {} if fullResync else storedCursors
+
+    def addPolledOrders(orders, **kwargs):
+        portfolio.addOrders(list(orders), session, progress, changes.update, **kwargs)
+        Logger.info("Refreshed %d orders", len(orders))
+
+    Poller.refreshAll(
+            pollers, progress, addPolledOrders, syncCursors, errors.append, storedCursors)
+    return changes, errors
+
+def createReport(session):
+    """Summarize the positions, balances and closed position offers of the portfolio.
+
+    Only orders added since the last search are scanned, as in the GUI, and
+    offers found before are made again until they are accepted there.
+    """
+
+    portfolio = Portfolio.getOrCreate(session)
+    report = {
+            'openPositions': [],
+            'closedPositions': [],
+            'balances': {},
+            'offers': []}
+    for summary in portfolio.getPositionSummaries(session):
+        position = {
+                'id': summary.id,
+                'exchange': summary.exchange,
+                'currency': summary.currency,
+                'baseCurrency': summary.baseCurrency,
+                'netCurrency': summary.netCurrency,
+                'netBase': summary.netBase,
+                'numOrders': summary.numOrders,
+                'firstOrderDate': summary.firstOrderDate,
+                'lastOrderDate': summary.lastOrderDate}
+        if summary.isOpen:
+            report['openPositions'].append(position)
+        else:
+            position['closedDate'] = summary.closedDate or summary.lastOrderDate
+            position['profitPercent'] = Position.profitPercent(
+                    summary.absoluteBuys, summary.absoluteSells)
+            report['closedPositions'].append(position)
+        balances = report['balances'].setdefault(summary.exchange, {})
+        balances[summary.currency] = balances.get(summary.currency, 0) + summary.netCurrency
+        balances[summary.baseCurrency] = balances.get(summary.baseCurrency, 0) + summary.netBase
+    for offer in portfolio.createClosedPositionOffers():
+        report['offers'].append({key: offer[key] for key in (
+                'positionId', 'exchange', 'currency', 'baseCurrency',
+                'numOrders', 'firstDate', 'lastDate', 'netBase')})
+    # save the progress of the search for offers
+    session.commit()
+    return report
+
+def _toJson(value):
+    # amounts are written as strings to keep their precision
+    if isinstance(value, Decimal):
+        return "{:.8f}".format(value)
+    return str(value)
+
+def _formatReport(report):
+    lines = ["Open positions:"]
+    for position in report['openPositions']:
+        lines.append("  {exchange} {baseCurrency}/{currency}: {netCurrency:+.8f} {currency}, "
+                "{netBase:+.8f} {baseCurrency} ({numOrders} orders)".format(**position))
+    lines.append("Closed positions:")
+    for position in report['closedPositions']:
+        lines.append("  {exchange} {baseCurrency}/{currency} {closedDate}: "
+                "{netCurrency:+.8f} {currency}, {netBase:+.8f} {baseCurrency} "
+                "({profitPercent:+.2f}%)".format(**position))
+    lines.append("Balances:")
+    for exchange, balances in sorted(report['balances'].items()):
+        for currency, quantity in sorted(balances.items()):
+            lines.append("  {} {}: {:.8f}".format(exchange, currency, quantity))
+    lines.append("Closed position offers:")
+    for offer in report['offers']:
+        lines.append("  {exchange} {baseCurrency}/{currency}: close {numOrders} orders of position "
+                "{positionId} from {firstDate} to {lastDate}, "
+                "profit {netBase:.8f} {baseCurrency}".format(**offer))
+    return "\n".join(lines)
+
+def _formatChanges(changes):
+    return {
+            'insertedOrders': len(changes.insertedOrderIds),
+            'updatedOrders': len(changes.updatedOrderIds),
+            'positions': len(changes.positionIds)}
+
+def _createArgumentParser():
+    argumentParser = argparse.ArgumentParser(
+            description="Import orders and report positions without the GUI.")
+    argumentParser.add_argument('--json', action='store_true', help="write results as JSON")
+    argumentParser.add_argument(
+            '--debug', action='store_true',
+            help="log progress messages and the time taken by each stage")
+    argumentParser.add_argument(
+            '--timings', metavar='FILE', help="write the time taken by each stage as JSON")
+    commands = argumentParser.add_subparsers(dest='command')
+    commands.required = True
+    importCommand = commands.add_parser('import', help="import exchange history files")
+    importCommand.add_argument('paths', nargs='+', metavar='FILE')
+    pollCommand = commands.add_parser(
+            'poll', help="refresh orders from exchanges configured in keys.py")
+    pollCommand.add_argument('--full-resync', action='store_true',
+            help="retrieve all orders instead of only those added since the last refresh")
+    pollCommand.add_argument('exchanges', nargs='*', metavar='EXCHANGE', help=(
+            "one of {}; all configured exchanges if omitted".format(
+                    ", ".join(sorted(PollerFactory.POLLERS)))))
+    commands.add_parser('report', help="show positions, balances and closed position offers")
+    return argumentParser
+
+def main(argv=None):
+    argumentParser = _createArgumentParser()
+    args = argumentParser.parse_args(argv)
+    if args.command == 'poll':
+        unknownExchanges = set(args.exchanges) - set(PollerFactory.POLLERS)
+        if unknownExchanges:
+            argumentParser.error(
+                    "unsupported exchanges: {}".format(", ".join(sorted(unknownExchanges))))
+    logging.basicConfig(format="%(levelname)s: %(message)s")
+    Logger.setLevel(logging.DEBUG if args.debug else logging.INFO)
+    if args.debug or args.timings:
+        Instruments.enable(args.timings)
+    migrate(engine)
+    Instruments.reset()
+    session = Session()
+    errors = []
+    try:
+        if args.command == 'import':
+            result = _formatChanges(importFiles(session, args.paths))
+        elif args.command == 'poll':
+            changes, errors = pollExchanges(session, args.exchanges, args.full_resync)
+            result = _formatChanges(changes)
+        else:
+            result = createReport(session)
+    finally:
+        session.close()
+    Instruments.logReport()
+    if args.json:
+        print(json.dumps(result, default=_toJson, indent=4))
+    elif args.command == 'report':
+        print(_formatReport(result))
+    else:
+        print("{insertedOrders} orders added, {updatedOrders} updated, "
+                "{positions} positions changed".format(**result))
+    # the orders of the other exchanges were still added
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
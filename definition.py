@@ -1,7 +1,10 @@
 class Definition():
     """Store instructions for determining an attribute while parsing records."""
 
-    def __init__(self, key=None, value=None, transform=None):
+    def __init__(self, key=None, value=None, transform=None, item=None):
         self.key = key
         self.value = value
         self.transform = transform
+        # index into the transformed value, allowing several attributes
+        # to share the result of one transform of the same key
+        self.item = item
@@ -0,0 +1,167 @@
+"""Timing of the stages of importing and refreshing orders.
+
+Stages are timed by named spans, which may be nested, and count the
+records they process. Timing is off unless enabled by the debug argument
+of the GUI or the command line interface, or by setting the environment
+variable TRACKER_INSTRUMENTATION to 1, or to the path of a file the
+report of each run is written to as JSON.
+"""
+
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+from logger import Logger
+
+ENVIRONMENT_VARIABLE = 'TRACKER_INSTRUMENTATION'
+
+class Stage():
+    def __init__(self):
+        self.seconds = 0.0
+        # time spent in the stage itself, excluding the spans nested in it
+        self.selfSeconds = 0.0
+        self.calls = 0
+        self.records = 0
+
+class Instrumentation():
+    """Collects the durations and record counts of named stages over a run."""
+
+    def __init__(self, enabled=False, reportPath=None):
+        self.enabled = enabled
+        self.reportPath = reportPath
+        self.lock = threading.Lock()
+        # spans in progress in each thread, innermost last
+        self.local = threading.local()
+        self.reset()
+
+    @classmethod
+    def fromEnvironment(cls):
+        value = os.environ.get(ENVIRONMENT_VARIABLE, '')
+        return cls(
+                enabled=value not in ('', '0'),
+                reportPath=value if value not in ('', '0', '1') else None)
+
+    def enable(self, reportPath=None):
+        self.enabled = True
+        self.reportPath = reportPath or self.reportPath
+
+    def reset(self):
+        """Start a new run, discarding the stages of the previous one."""
+
+        with self.lock:
+            self.stages = {}
+            self.started = time.perf_counter()
+
+    @contextmanager
+    def span(self, name, records=0):
+        """Time the code in the block as part of a stage, along with a number of records."""
+
+        if not self.enabled:
+            yield
+            return
+        spans = self._spans()
+        # time in nested spans is accumulated here
+        spans.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            nestedSeconds = spans.pop()
+            if spans:
+                spans[-1] += seconds
+            self._add(name, seconds, seconds - nestedSeconds, 1, records)
+
+    def count(self, name, records=1):
+        """Add records to a stage, e.g. processed in a span before their number was known."""
+
+        if self.enabled:
+            self._add(name, 0.0, 0.0, 0, records)
+
+    def iterate(self, name, iterable):
+        """Time producing each item of an iterable as a stage, counting each item as a record.
+
+        This measures e.g. a generator of parsed trades separately from the
+        code consuming them as they are parsed.
+        """
+
+        if not self.enabled:
+            return iterable
+        return self._timedIterator(name, iterable)
+
+    def _timedIterator(self, name, iterable):
+        iterator = iter(iterable)
+        spans = self._spans()
+        seconds = 0.0
+        records = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed = time.perf_counter() - start
+                    seconds += elapsed
+                    if spans:
+                        spans[-1] += elapsed
+                records += 1
+                yield item
+        finally:
+            self._add(name, seconds, seconds, 1, records)
+
+    def _spans(self):
+        if not hasattr(self.local, 'spans'):
+            self.local.spans = []
+        return self.local.spans
+
+    def _add(self, name, seconds, selfSeconds, calls, records):
+        with self.lock:
+            stage = self.stages.setdefault(name, Stage())
+            stage.seconds += seconds
+            stage.selfSeconds += selfSeconds
+            stage.calls += calls
+            stage.records += records
+
+    def report(self):
+        """Summarize the stages of the run, with their share of the time since the run started."""
+
+        with self.lock:
+            totalSeconds = time.perf_counter() - self.started
+            stages = {}
+            for name, stage in sorted(self.stages.items()):
+                stages[name] = {
+                        'seconds': stage.seconds,
+                        'selfSeconds': stage.selfSeconds,
+                        'share': stage.selfSeconds / totalSeconds if totalSeconds else 0.0,
+                        'calls': stage.calls,
+                        'records': stage.records,
+                        'recordsPerSecond': (
+                                stage.records / stage.seconds
+                                if stage.records and stage.seconds else None)}
+        return {'totalSeconds': totalSeconds, 'stages': stages}
+
+    def logReport(self, reportPath=None):
+        """Log the report of the run so far and write it to the report path, if any."""
+
+        if not self.enabled:
+            return None
+        report = self.report()
+        Logger.info("Instrumentation: %.3fs in total", report['totalSeconds'])
+        stages = sorted(report['stages'].items(), key=lambda item: -item[1]['selfSeconds'])
+        for name, stage in stages:
+            Logger.info(
+                    "Instrumentation: %-30s %9.3fs %6.1f%% %10d records %12s/s",
+                    name, stage['seconds'], 100 * stage['share'], stage['records'],
+                    "{:.0f}".format(stage['recordsPerSecond'])
+                    if stage['recordsPerSecond'] else "-")
+        reportPath = reportPath or self.reportPath
+        if reportPath:
+            with open(reportPath, 'w') as reportFile:
+                json.dump(report, reportFile, indent=4)
+        return report
+
+Instruments = Instrumentation.fromEnvironment()
@@ -0,0 +1,10 @@
+"""Logger shared by the trading, parsing and polling modules.
+
+It is a standard library logger so that these modules can be used without
+Kivy. When the GUI is running, Kivy's handlers on the root logger display
+its messages along with Kivy's own.
+"""
+
+import logging
+
+Logger = logging.getLogger('tracker')
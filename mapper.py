@@ -2,10 +2,13 @@ from datetime import datetime
 from decimal import Decimal
 import re
 
-from dateutil.parser import parse
-
 from definition import Definition
 from names import ORDER_TYPE_BUY, ORDER_TYPE_SELL, ORDER_TYPE_UNKNOWN
+from timestamp_parser import TimestampParser
+from trading.order import roundAmount
+from trading.trade_batch import TradeBatch
+
+KRAKEN_TIMESTAMP = TimestampParser(TimestampParser.ISO)
 
 def normalizeOrderType(orderType):
     buyStrings = ("limit_buy", "buy")
@@ -17,6 +20,14 @@ def normalizeOrderType(orderType):
     else:
         return ORDER_TYPE_UNKNOWN
 
+def splitBittrexMarket(market):
+    # base currency first, e.g. BTC-ETH
+    return market.split('-')
+
+def splitPoloniexMarket(market):
+    # currency first, e.g. ETH/BTC
+    return market.split('/')
+
 def normalizeKrakenMarket(market):
     currency, baseCurrency = market[:len(market)//2], market[len(market)//2:]
     return normalizeKrakenCurrency(currency), normalizeKrakenCurrency(baseCurrency)
@@ -29,31 +40,35 @@ def normalizeKrakenCurrency(currency):
     return currency
 
 def normalizeKrakenDate(date):
-    return parse(date[:date.rfind('.')])
+    # fractions of a second are dropped
+    return KRAKEN_TIMESTAMP(date[:date.rfind('.')])
 
 class Mapper():
     # map Trade attributes to keys in a record with optional post-processor function
     MAPPINGS = {
             'BittrexAPI': {
                     'orderId': Definition(key='OrderUuid'),
-                    'closedDate': Definition(key='Closed', transform=parse),
+                    'closedDate': Definition(
+                            key='Closed', transform=TimestampParser(TimestampParser.ISO)),
                     'exchange': Definition(value='Bittrex'),
                     'orderType': Definition(key='OrderType', transform=normalizeOrderType),
-                    'currency': Definition(key='Exchange', transform=lambda market: market.split('-')[1]),
-                    'baseCurrency': Definition(key='Exchange', transform=lambda market: market.split('-')[0]),
-                    'quantity': Definition(key='Quantity'),
-                    'price': Definition(key='Limit'),
-                    'subtotal': Definition(key='Price'),
+                    'currency': Definition(key='Exchange', transform=splitBittrexMarket, item=1),
+                    'baseCurrency': Definition(
+                            key='Exchange', transform=splitBittrexMarket, item=0),
+                    'quantity': Definition(key='Quantity', transform=roundAmount),
+                    'price': Definition(key='Limit', transform=roundAmount),
+                    'subtotal': Definition(key='Price', transform=roundAmount),
                     'currencyFee': Definition(value=Decimal(0.0)),
-                    'baseFee': Definition(key='Commission')
+                    'baseFee': Definition(key='Commission', transform=roundAmount)
             },
             'BittrexCSV': {
                     'orderId': Definition(key=0),
-                    'closedDate': Definition(key=8, transform=parse),
+                    'closedDate': Definition(key=8, transform=TimestampParser(
+                            '%m/%d/%Y %I:%M:%S %p', TimestampParser.ISO)),
                     'exchange': Definition(value='Bittrex'),
                     'orderType': Definition(key=2, transform=normalizeOrderType),
-                    'currency': Definition(key=1, transform=lambda market: market.split('-')[1]),
-                    'baseCurrency': Definition(key=1, transform=lambda market: market.split('-')[0]),
+                    'currency': Definition(key=1, transform=splitBittrexMarket, item=1),
+                    'baseCurrency': Definition(key=1, transform=splitBittrexMarket, item=0),
                     'quantity': Definition(key=3, transform=Decimal),
                     'subtotal': Definition(key=6, transform=Decimal),
                     'currencyFee': Definition(value=Decimal(0.0)),
@@ -76,8 +91,8 @@ class Mapper():
                     'closedDate': Definition(key=3, transform=normalizeKrakenDate),
                     'exchange': Definition(value='Kraken'),
                     'orderType': Definition(key=4, transform=normalizeOrderType),
-                    'currency': Definition(key=2, transform=lambda market: normalizeKrakenMarket(market)[0]),
-                    'baseCurrency': Definition(key=2, transform=lambda market: normalizeKrakenMarket(market)[1]),
+                    'currency': Definition(key=2, transform=normalizeKrakenMarket, item=0),
+                    'baseCurrency': Definition(key=2, transform=normalizeKrakenMarket, item=1),
                     'quantity': Definition(key=9, transform=Decimal),
                     'price': Definition(key=6, transform=Decimal),
                     'subtotal': Definition(key=7, transform=Decimal),
@@ -86,11 +101,11 @@ class Mapper():
             },
             'PoloniexCSV': {
                     'orderId': Definition(key=8),
-                    'closedDate': Definition(key=0, transform=parse),
+                    'closedDate': Definition(key=0, transform=TimestampParser(TimestampParser.ISO)),
                     'exchange': Definition(value='Poloniex'),
                     'orderType': Definition(key=3, transform=normalizeOrderType),
-                    'currency': Definition(key=1, transform=lambda market: market.split('/')[0]),
-                    'baseCurrency': Definition(key=1, transform=lambda market: market.split('/')[1]),
+                    'currency': Definition(key=1, transform=splitPoloniexMarket, item=0),
+                    'baseCurrency': Definition(key=1, transform=splitPoloniexMarket, item=1),
                     'quantity': Definition(key=5, transform=Decimal),
                     'price': Definition(key=4, transform=Decimal),
                     'subtotal': Definition(key=6, transform=Decimal),
@@ -99,17 +114,90 @@ class Mapper():
             }
     }
 
+    # record-to-trade functions compiled from MAPPINGS, by mapping key
+    _compiledMappings = {}
+
     @classmethod
     def mapRecordToTrade(cls, record, trade, mappingKey):
+        cls.compileMapping(mappingKey)(record, trade)
+
+    @classmethod
+    def compileMapping(cls, mappingKey):
+        """Build a function applying the definitions of a mapping to a record and trade.
+
+        The definitions are resolved once: specified values are computed up front
+        and each transform of a key is applied only once per record, even when
+        several attributes are taken from its result.
+        """
+
+        if mappingKey in cls._compiledMappings:
+            return cls._compiledMappings[mappingKey]
+
+        constants = []
+        copies = []
+        transforms = {}
         for attribute, definition in cls.MAPPINGS[mappingKey].items():
             # a specified value overrides the value in the corresponding key or
             # provides a default where the record does not contain this data
             if definition.value is not None:
-                setattr(trade, attribute, definition.value)
+                value = definition.value
+                if definition.transform is not None:
+                    value = definition.transform(value)
+                if definition.item is not None:
+                    value = value[definition.item]
+                constants.append((attribute, value))
             elif definition.key is not None:
-                setattr(trade, attribute, record[definition.key])
+                if definition.transform is None:
+                    copies.append((attribute, definition.key))
+                else:
+                    # post-processing is done if needed, e.g. converting a date string to a DateTime
+                    transforms.setdefault((definition.key, definition.transform), []).append(
+                            (attribute, definition.item))
+        transforms = [(key, transform, targets) for (key, transform), targets in transforms.items()]
 
-            # post-processing is done if needed, e.g. converting a date string to a DateTime
-            if definition.transform is not None:
-                value = definition.transform(getattr(trade, attribute))
+        def mapRecord(record, trade):
+            for attribute, value in constants:
                 setattr(trade, attribute, value)
+            for attribute, key in copies:
+                setattr(trade, attribute, record[key])
+            for key, transform, targets in transforms:
+                value = transform(record[key])
+                for attribute, item in targets:
+                    setattr(trade, attribute, value if item is None else value[item])
+
+        cls._compiledMappings[mappingKey] = mapRecord
+        return mapRecord
+
+    @classmethod
+    def mapRecordsToBatch(cls, records, mappingKey):
+        """Map records to a TradeBatch, or return None if they are to be mapped one at a time.
+
+        Amounts read by Decimal are passed on as text, which the batch reads
+        exactly. Other transforms are applied once per distinct value of a
+        key, as many records share e.g. their market and order type.
+        """
+
+        constants = {}
+        columns = {}
+        for attribute, definition in cls.MAPPINGS[mappingKey].items():
+            if attribute not in TradeBatch.ATTRIBUTES:
+                continue
+            if definition.value is not None:
+                value = definition.value
+                if definition.transform is not None:
+                    value = definition.transform(value)
+                if definition.item is not None:
+                    value = value[definition.item]
+                constants[attribute] = value
+            elif definition.key is not None:
+                values = [record[definition.key] for record in records]
+                if definition.transform is not None and definition.transform is not Decimal:
+                    transformed = {}
+                    for value in values:
+                        if value not in transformed:
+                            transformed[value] = definition.transform(value)
+                            if definition.item is not None:
+                                transformed[value] = transformed[value][definition.item]
+                    values = [transformed[value] for value in values]
+                columns[attribute] = values
+        return TradeBatch.create(len(records), constants, columns)
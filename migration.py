@@ -0,0 +1,115 @@
+"""Schema updates for databases created by earlier versions."""
+
+from sqlalchemy import inspect, Integer, MetaData
+from sqlalchemy.orm import sessionmaker
+
+from model import Base
+from trading.order import calculateFingerprint, Order, roundAmount, SqliteFixedPoint
+# import all entities so they are known to the ORM
+from trading.portfolio import Portfolio
+from trading.position import Position
+
+# number of rows copied at a time when rebuilding a table
+COPY_BATCH_SIZE = 1000
+
+def migrate(engine):
+    """Create missing tables and columns and fill in values for added columns."""
+
+    Base.metadata.create_all(engine)
+    addMissingColumns(engine)
+    convertFixedPointColumns(engine)
+    addMissingIndexes(engine)
+    session = sessionmaker(bind=engine)()
+    for position in session.query(Position).filter(Position.netCurrency == None):
+        position.recalculateTotals()
+    session.bulk_update_mappings(Order, [
+            {'id': row.id, 'fingerprint': calculateFingerprint(row)}
+            for row in session.query(*Order.comparedColumns()).filter(Order.fingerprint == None)])
+    session.commit()
+    session.close()
+
+def addMissingColumns(engine):
+    """Add columns of the model that are not in the database, by table name."""
+
+    inspector = inspect(engine)
+    addedColumns = {}
+    for table in Base.metadata.sorted_tables:
+        existingColumns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existingColumns:
+                engine.execute('ALTER TABLE {} ADD COLUMN "{}" {}'.format(
+                        table.name, column.name, column.type.compile(dialect=engine.dialect)))
+                addedColumns.setdefault(table.name, []).append(column.name)
+    return addedColumns
+
+def addMissingIndexes(engine):
+    """Create indexes of the model that are not in the database, returning their names."""
+
+    inspector = inspect(engine)
+    addedIndexes = []
+    for table in Base.metadata.sorted_tables:
+        existingIndexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            # existing rows may violate a unique index
+            if index.name not in existingIndexes and not index.unique:
+                index.create(engine)
+                addedIndexes.append(index.name)
+    return addedIndexes
+
+def convertFixedPointColumns(engine):
+    """Rebuild tables storing fixed-point columns as strings, returning their names."""
+
+    inspector = inspect(engine)
+    convertedTables = []
+    for table in Base.metadata.sorted_tables:
+        existingTypes = {
+                column['name']: column['type'] for column in inspector.get_columns(table.name)}
+        if any(isinstance(column.type, SqliteFixedPoint)
+                and not isinstance(existingTypes[column.name], Integer)
+                for column in table.columns):
+            _rebuildTable(engine, inspector, table)
+            convertedTables.append(table.name)
+    return convertedTables
+
+def _rebuildTable(engine, inspector, table):
+    # SQLite cannot change the type of a column, so copy the rows into a new
+    # table, replace the old table with it and recreate the indexes
+    metadata = MetaData()
+    # foreign keys of the new table refer to the other tables by name
+    for otherTable in Base.metadata.sorted_tables:
+        otherTable.tometadata(metadata)
+    newTable = table.tometadata(metadata, name=table.name + '_new')
+    columnNames = [column.name for column in table.columns]
+    converters = [
+            _fixedPointConverter(column.type, engine.dialect)
+            if isinstance(column.type, SqliteFixedPoint) else None for column in table.columns]
+    # read before the transaction, as the engine may have only one connection
+    indexes = inspector.get_indexes(table.name)
+    with engine.begin() as connection:
+        for index in indexes:
+            connection.execute('DROP INDEX "{}"'.format(index['name']))
+        newTable.create(connection)
+        rows = connection.execute('SELECT {} FROM "{}"'.format(
+                ', '.join('"{}"'.format(name) for name in columnNames), table.name))
+        insert = 'INSERT INTO "{}" ({}) VALUES ({})'.format(
+                newTable.name,
+                ', '.join('"{}"'.format(name) for name in columnNames),
+                ', '.join('?' for _ in columnNames))
+        batch = rows.fetchmany(COPY_BATCH_SIZE)
+        while batch:
+            connection.execute(insert, [
+                    tuple(
+                            convert(value) if convert else value
+                            for convert, value in zip(converters, row))
+                    for row in batch])
+            batch = rows.fetchmany(COPY_BATCH_SIZE)
+        connection.execute('DROP TABLE "{}"'.format(table.name))
+        connection.execute('ALTER TABLE "{}" RENAME TO "{}"'.format(newTable.name, table.name))
+
+def _fixedPointConverter(columnType, dialect):
+    def convert(value):
+        if value is None:
+            return None
+        # strings of more decimal places than are stored are rounded
+        return columnType.process_bind_param(roundAmount(value, columnType.scale), dialect)
+    return convert
@@ -1,7 +1,87 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+DATABASE_URL = 'sqlite:///tracker.db'
+# set on every connection to a database file
+PRAGMAS = (
+        # commits are durable once checkpointed, which is safe against corruption in WAL mode
+        ('synchronous', 'NORMAL'),
+        # in KiB when negative
+        ('cache_size', -65536),
+        ('mmap_size', 268435456),
+        # in milliseconds, e.g. while the command line interface imports into the same file
+        ('busy_timeout', 30000))
+# number of connections kept open for reading
+READER_POOL_SIZE = 4
+# seconds a thread waits for the writer connection before sqlalchemy.exc.TimeoutError is raised,
+# longer than the SQLite busy timeout as large imports hold it for a while
+WRITER_POOL_TIMEOUT = 300
+
+def _setPragmas(pragmas):
+    def setPragmas(connection, record):
+        cursor = connection.cursor()
+        for name, value in pragmas:
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+        cursor.close()
+    return setPragmas
+
+def _isFile(url):
+    return url.database not in (None, '', ':memory:')
+
+def createEngine(url=DATABASE_URL):
+    """Create an engine writing to the database through a single connection.
+
+    The database is put in WAL mode, in which readers do not block the
+    writer and see the last commit while a write transaction is open.
+    Threads wanting to write wait for the connection in turn rather than
+    failing with "database is locked", for up to WRITER_POOL_TIMEOUT
+    seconds. Sessions should return it through sessionScope.
+    """
+
+    engine = create_engine(
+            url, echo=False, poolclass=QueuePool, pool_size=1, max_overflow=0,
+            pool_timeout=WRITER_POOL_TIMEOUT, connect_args={'check_same_thread': False})
+    if _isFile(engine.url):
+        event.listen(engine, 'connect', _setPragmas((('journal_mode', 'WAL'),) + PRAGMAS))
+    return engine
+
+def createReaderEngine(engine, poolSize=READER_POOL_SIZE):
+    """Create an engine with a pool of read-only connections to the database of a writer engine.
+
+    An in-memory database cannot be shared between connections, so it is
+    read through the writer engine.
+    """
+
+    if not _isFile(engine.url):
+        return engine
+    readerEngine = create_engine(
+            engine.url, echo=False, poolclass=QueuePool, pool_size=poolSize,
+            connect_args={'check_same_thread': False})
+    event.listen(readerEngine, 'connect', _setPragmas(PRAGMAS + (('query_only', 'ON'),)))
+    return readerEngine
+
+@contextmanager
+def sessionScope(sessionClass):
+    """Provide a session of a sessionmaker which is closed however the block is left.
+
+    Closing the session rolls back what was not committed and returns its
+    connection to the pool, so that a failure cannot keep the writer
+    connection from other threads.
+    """
+
+    session = sessionClass()
+    try:
+        yield session
+    finally:
+        session.close()
 
 Base = declarative_base()
-engine = create_engine('sqlite:///tracker.db', echo=False)
+engine = createEngine()
+readerEngine = createReaderEngine(engine)
 Session = sessionmaker(bind=engine)
+# for reading only, as objects are not flushed while querying
+ReadSession = sessionmaker(bind=readerEngine, autoflush=False)
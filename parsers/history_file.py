@@ -0,0 +1,114 @@
+import codecs
+import mmap
+import os
+
+class HistoryFile():
+    """A memory-mapped history file, decoded in large chunks of whole lines.
+
+    The encoding is detected once from a byte order mark, or from the zero
+    bytes of UTF-16 text without one, such as Bittrex exports, and is
+    otherwise taken to be UTF-8. Offsets are byte offsets into the file.
+    """
+
+    # bytes decoded at a time
+    CHUNK_SIZE = 256 * 1024
+    BYTE_ORDER_MARKS = (
+            (codecs.BOM_UTF8, 'utf-8'),
+            (codecs.BOM_UTF16_LE, 'utf-16-le'),
+            (codecs.BOM_UTF16_BE, 'utf-16-be'))
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        if os.path.getsize(path) > 0:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            # empty files cannot be mapped
+            self.data = b''
+        self.encoding, self.dataStart = self.detectEncoding(self.data[:4])
+        self.newline = '\n'.encode(self.encoding)
+        # code units of UTF-16 text are two bytes long
+        self.unitSize = len(self.newline)
+        self.headerEnd = self._lineEnd(self.dataStart, len(self.data))
+
+    @classmethod
+    def detectEncoding(cls, start):
+        """Return the encoding of a file from its first bytes, and its byte order mark's length."""
+
+        for byteOrderMark, encoding in cls.BYTE_ORDER_MARKS:
+            if start.startswith(byteOrderMark):
+                return encoding, len(byteOrderMark)
+        if len(start) >= 2 and start[0] and not start[1]:
+            return 'utf-16-le', 0
+        if len(start) >= 2 and not start[0] and start[1]:
+            return 'utf-16-be', 0
+        return 'utf-8', 0
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def header(self):
+        return self._decode(self.dataStart, self.headerEnd).strip()
+
+    def lines(self, start=None, end=None):
+        """Generate the decoded lines after the header, or between offsets at the start of lines."""
+
+        start = self.headerEnd if start is None else start
+        end = self.size if end is None else end
+        while start < end:
+            chunkEnd = self._lineEnd(min(start + self.CHUNK_SIZE, end), end)
+            lines = self._decode(start, chunkEnd).split('\n')
+            # the chunk ends with a line break, except at the end of a file without one
+            if not lines[-1]:
+                lines.pop()
+            yield from lines
+            start = chunkEnd
+
+    def countLines(self):
+        """Count the lines after the header."""
+
+        numLines = 0
+        start = self.headerEnd
+        while start < self.size:
+            chunkEnd = self._lineEnd(min(start + self.CHUNK_SIZE, self.size), self.size)
+            numLines += self.data[start:chunkEnd].count(self.newline)
+            start = chunkEnd
+        if self.size > self.headerEnd and self.data[self.size - self.unitSize:] != self.newline:
+            numLines += 1
+        return numLines
+
+    def chunkOffsets(self, numChunks):
+        """Divide the lines after the header into chunks that start and end on line boundaries."""
+
+        offsets = [self.headerEnd]
+        chunkSize = max((self.size - self.headerEnd) // numChunks, 1)
+        while offsets[-1] < self.size:
+            offsets.append(self._lineEnd(offsets[-1] + chunkSize, self.size))
+        return offsets
+
+    def _lineEnd(self, offset, end):
+        """Return the offset after the first line break at or after an offset, or else the end."""
+
+        # start searching on a code unit boundary
+        offset -= (offset - self.dataStart) % self.unitSize
+        if offset >= end:
+            return end
+        index = self.data.find(self.newline, offset, end)
+        while index >= 0 and (index - self.dataStart) % self.unitSize:
+            index = self.data.find(self.newline, index + 1, end)
+        return end if index < 0 else index + len(self.newline)
+
+    def _decode(self, start, end):
+        return codecs.decode(self.data[start:end], self.encoding, 'replace')
@@ -1,19 +1,166 @@
-from kivy.logger import Logger
+from itertools import islice
+import os
 
-from trading.order import Order
+from instrumentation import Instruments
+from mapper import Mapper
+from parsers.history_file import HistoryFile
+from trading.order import OrderRecord
+from trading.trade import Trade
+from trading.trade_batch import TradeBatch
+
+def _parseChunk(parser, path, start, end):
+    """Parse the lines between two byte offsets of a history file in a worker process."""
+
+    with HistoryFile(path) as historyFile:
+        lines = historyFile.lines(start, end)
+        return list(parser.parseOrders(lines, lambda **kwargs: None))
 
 class HistoryParser():
+    # history files at least this large are parsed by a pool of processes
+    PARALLEL_PARSE_MIN_BYTES = 8 * 1024 * 1024
+    # records folded into orders at a time when NumPy is installed
+    BATCH_SIZE = 65536
+
+    @classmethod
+    def parse(cls, lines, progressCallback, callback, numLines=None):
+        # lines may be any iterable, e.g. the lines of a HistoryFile, so that records
+        # are folded into orders as they are read instead of being held in memory
+        if numLines is None:
+            numLines = len(lines)
+        progressCallback(value=0, maxValue=numLines)
+        with Instruments.span('ordersFromTrades'):
+            orders = cls.parseOrders(lines, progressCallback)
+        Instruments.count('ordersFromTrades', len(orders))
+        callback(orders)
+
+    @classmethod
+    def parseOrders(cls, lines, progressCallback):
+        """Parse the trades of lines and fold them into orders, in columnar batches given NumPy."""
+
+        if not TradeBatch.AVAILABLE:
+            return cls.ordersFromTrades(
+                    Instruments.iterate('parseLines', cls.parseTrades(lines, progressCallback)))
+        records = Instruments.iterate('parseLines', cls.parseRecords(lines, progressCallback))
+        orders = []
+        while True:
+            batch = list(islice(records, cls.BATCH_SIZE))
+            if not batch:
+                break
+            orders.extend(cls.ordersFromRecords(batch))
+        # orders may have trades in several batches
+        return cls.mergeOrders(orders)
+
+    @classmethod
+    def ordersFromRecords(cls, records):
+        with Instruments.span('ordersFromTradeBatch', records=len(records)):
+            batch = Mapper.mapRecordsToBatch(records, cls.PARSER_TYPE)
+            if batch is not None and cls.completeTradeBatch(batch):
+                return batch.orders()
+        return cls.ordersFromTrades(cls.tradeFromRecord(record) for record in records)
+
+    @classmethod
+    def parseTrades(cls, lines, progressCallback):
+        for record in cls.parseRecords(lines, progressCallback):
+            yield cls.tradeFromRecord(record)
 
     @classmethod
-    def parse(cls, lines, progressCallback, callback):
+    def parseRecords(cls, lines, progressCallback):
+        for line in lines:
+            record = cls.splitLine(line)
+            if record is not None:
+                yield record
+            progressCallback()
+
+    @classmethod
+    def parseLine(cls, line):
+        record = cls.splitLine(line)
+        return None if record is None else cls.tradeFromRecord(record)
+
+    @classmethod
+    def splitLine(cls, line):
+        """Split a line into the fields of a record, or return None if it has none."""
+
         raise NotImplementedError()
 
+    @classmethod
+    def tradeFromRecord(cls, record):
+        trade = Trade()
+        Mapper.mapRecordToTrade(record, trade, cls.PARSER_TYPE)
+        cls.completeTrade(trade)
+        return trade
+
+    @classmethod
+    def completeTrade(cls, trade):
+        """Calculate the values of a trade which are not in its record."""
+
+        raise NotImplementedError()
+
+    @classmethod
+    def completeTradeBatch(cls, batch):
+        """Calculate the values of a TradeBatch as completeTrade, or return False if inexact."""
+
+        return False
+
+    @classmethod
+    def parseHistoryFile(cls, path, progressCallback, callback):
+        """Parse the orders of a history file with a header recognized by this parser."""
+
+        if os.path.getsize(path) >= cls.PARALLEL_PARSE_MIN_BYTES:
+            cls.parseFile(path, progressCallback, callback)
+        else:
+            with HistoryFile(path) as historyFile:
+                with Instruments.span('countLines'):
+                    numLines = historyFile.countLines()
+                cls.parse(historyFile.lines(), progressCallback, callback, numLines=numLines)
+
+    @classmethod
+    def parseFile(cls, path, progressCallback, callback, processes=None, chunksPerProcess=4):
+        """Parse a history file in line-aligned chunks using a pool of processes.
+
+        Orders with trades in several chunks are merged, so the result
+        is the same as parsing the file sequentially.
+        """
+
+        # imported here as multiprocessing is only needed for large files
+        from concurrent.futures import ProcessPoolExecutor
+
+        processes = processes or os.cpu_count() or 1
+        with HistoryFile(path) as historyFile:
+            offsets = historyFile.chunkOffsets(processes * chunksPerProcess)
+        progressCallback(value=0, maxValue=offsets[-1])
+        executor = ProcessPoolExecutor(max_workers=processes)
+        with Instruments.span('parseFileInParallel'), executor:
+            numChunks = len(offsets) - 1
+            results = executor.map(
+                    _parseChunk, [cls] * numChunks, [path] * numChunks, offsets[:-1], offsets[1:])
+
+            def partialOrders():
+                for end, orders in zip(offsets[1:], results):
+                    yield from orders
+                    progressCallback(value=end)
+
+            orders = cls.mergeOrders(partialOrders())
+        Instruments.count('parseFileInParallel', len(orders))
+        callback(orders)
+
     @staticmethod
     def ordersFromTrades(trades):
         orders = {}
         for trade in trades:
             if trade.orderId not in orders:
-                orders[trade.orderId] = Order(trade)
+                orders[trade.orderId] = OrderRecord(trade)
             else:
                 orders[trade.orderId].addTrade(trade)
         return orders.values()
+
+    @staticmethod
+    def mergeOrders(partialOrders):
+        """Combine orders having the same id, e.g. parsed from different parts of a file."""
+
+        orders = {}
+        for order in partialOrders:
+            if order.id not in orders:
+                orders[order.id] = order
+            else:
+                orders[order.id].addTrade(order)
+        return orders.values()
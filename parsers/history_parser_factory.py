@@ -1,4 +1,6 @@
+from instrumentation import Instruments
 from parsers.bittrex_parser import BittrexParser
+from parsers.history_file import HistoryFile
 from parsers.kraken_parser import KrakenParser
 from parsers.poloniex_parser import PoloniexParser
 
@@ -11,3 +13,11 @@ class HistoryParserFactory():
             if header in parser.HEADERS:
                 return parser
         return None
+
+    @classmethod
+    def detectFileParser(cls, path):
+        """Return the parser for a history file and the header it was detected from."""
+
+        with Instruments.span('detectHeader'), HistoryFile(path) as historyFile:
+            header = historyFile.header()
+        return cls.detectParser(header), header
@@ -1,6 +1,4 @@
-from mapper import Mapper
 from parsers.history_parser import HistoryParser
-from trading.trade import Trade
 
 class PoloniexParser(HistoryParser):
     HEADERS = (
@@ -9,15 +7,19 @@ class PoloniexParser(HistoryParser):
     PARSER_TYPE = "PoloniexCSV"
 
     @classmethod
-    def parse(cls, lines, progressCallback, callback):
-        lines = [line.strip() for line in lines]
-        trades = []
-        progressCallback(value=0, maxValue=len(lines))
-        for line in lines:
-            trade = Trade()
-            Mapper.mapRecordToTrade(line.split(','), trade, cls.PARSER_TYPE)
-            trade.currencyFee = trade.quantity - abs(trade.netCurrency)
-            trade.baseFee = trade.subtotal - abs(trade.netBase)
-            trades.append(trade)
-            progressCallback()
-        callback(cls.ordersFromTrades(trades))
+    def splitLine(cls, line):
+        line = line.strip()
+        if not line:
+            return None
+        return line.split(',')
+
+    @classmethod
+    def completeTrade(cls, trade):
+        trade.currencyFee = trade.quantity - abs(trade.netCurrency)
+        trade.baseFee = trade.subtotal - abs(trade.netBase)
+
+    @classmethod
+    def completeTradeBatch(cls, batch):
+        batch.currencyFee = batch.quantity - abs(batch.netCurrency)
+        batch.baseFee = batch.subtotal - abs(batch.netBase)
+        return True
@@ -1,30 +1,68 @@
+import hashlib
+import hmac
+
 from bittrex.bittrex import Bittrex
-from kivy.logger import Logger
+import requests
 
 from mapper import Mapper
 from parsers.history_parser import HistoryParser
+from pollers.poller import Poller, RefreshError
 from trading.trade import Trade
 
-class BittrexPoller():
+class BittrexPoller(Poller):
+    BASE_URL = "https://bittrex.com"
+    EXCHANGE = "Bittrex"
     METHOD = "BittrexAPI"
+    # one request per second
+    RATE_LIMITS = {'api': (1, 1)}
+    # replies of the Bittrex client when there was no response or it could not be read
+    TEMPORARY_FAILURE_MESSAGES = ('NO_API_RESPONSE',)
+
+    def __init__(self, key, secret, baseUrl=BASE_URL):
+        super(BittrexPoller, self).__init__()
+        self.secret = secret
+        self.baseUrl = baseUrl
+        self.session = requests.Session()
+        # requests are rate limited by the poller instead of the client
+        self.bittrex = Bittrex(key, secret, calls_per_second=float('inf'), dispatch=self._dispatch)
+
+    def _dispatch(self, requestUrl, apisign):
+        """Send a request of the Bittrex client to the poller's base URL, over a pooled session."""
+
+        if self.baseUrl != self.BASE_URL:
+            requestUrl = self.baseUrl + requestUrl[len(self.BASE_URL):]
+            apisign = hmac.new(
+                    self.secret.encode(), requestUrl.encode(), hashlib.sha512).hexdigest()
+        return self.session.get(requestUrl, headers={'apisign': apisign}, timeout=10).json()
+
+    def isTemporaryFailure(self, result):
+        return not result['success'] and result['message'] in self.TEMPORARY_FAILURE_MESSAGES
+
+    async def retrieveOrders(self, progressCallback, syncCursor):
+        """Retrieve the orders closed since a sync cursor, or all orders without one.
 
-    def __init__(self, key, secret):
-        self.bittrex = Bittrex(key, secret)
+        The order history API cannot be queried from a date, so older orders
+        are skipped as they are received. The sync cursor holds the newest
+        closed date; orders closed at that time are retrieved again since
+        several orders may close at once, and are then left out as duplicates.
+        """
 
-    def getOrders(self, progressCallback, callback):
-        progressCallback(text="Processing orders...")
+        progressCallback(text="Retrieving Bittrex orders...")
         trades = []
-        reply = self.bittrex.get_order_history()
-        if reply['success']:
-            orderRecords = reply['result']
-            progressCallback(text="Processing orders...", value=0, maxValue=len(orderRecords))
-            for record in orderRecords:
-                trade = Trade()
-                Mapper.mapRecordToTrade(record, trade, self.METHOD)
+        syncCursors = {}
+        reply = await self.request(self.bittrex.get_order_history)
+        if not reply['success']:
+            raise RefreshError(self.EXCHANGE, "the reply was: {}".format(reply))
+        orderRecords = reply['result']
+        progressCallback(text="Processing Bittrex orders...", value=0, maxValue=len(orderRecords))
+        for record in orderRecords:
+            trade = Trade()
+            Mapper.mapRecordToTrade(record, trade, self.METHOD)
+            if not syncCursor or trade.closedDate >= syncCursor['closedDate']:
                 trade.recalculateNetAmounts()
                 trades.append(trade)
-                progressCallback()
-            progressCallback(text="Done retrieving orders.")
-        else:
-            Logger.error("Problem retrieving orders from Bittrex. The reply was: %s", reply)
-        callback(HistoryParser.ordersFromTrades(trades))
+            progressCallback()
+        if trades:
+            syncCursors[self.EXCHANGE] = {'closedDate': max(trade.closedDate for trade in trades)}
+        progressCallback(text="Done retrieving Bittrex orders.")
+        return HistoryParser.ordersFromTrades(trades), {'syncCursors': syncCursors}
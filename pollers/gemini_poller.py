@@ -1,77 +1,202 @@
+import asyncio
 import base64
 from decimal import Decimal
 from hashlib import sha384
 import hmac
 import json
+import threading
 import time
 
 import requests
-from kivy.logger import Logger
+from requests.adapters import HTTPAdapter
 
+from logger import Logger
 from mapper import Mapper
 from parsers.history_parser import HistoryParser
+from pollers.poller import Poller, RefreshError
 from trading.trade import Trade
 
-class GeminiPoller():
+class GeminiPoller(Poller):
     BASE_URL = "https://api.gemini.com"
+    EXCHANGE = "Gemini"
     MAX_TRADES_RETURNED = 500
+    # markets are retrieved at the same time, each over its own pooled connection
+    MAX_CONCURRENCY = 8
     METHOD = "GeminiAPI"
+    # public endpoints allow 120 requests per minute, private endpoints 600 per minute
+    RATE_LIMITS = {
+            'public': (2, 5),
+            'private': (10, 10)}
 
-    def __init__(self, key, secret):
+    # currencies of markets by base URL and symbol, shared by all pollers as they rarely change
+    _markets = {}
+
+    def __init__(self, key, secret, baseUrl=BASE_URL):
+        super(GeminiPoller, self).__init__()
         self.key = key
         self.secret = secret
+        self.baseUrl = baseUrl
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.MAX_CONCURRENCY)
+        self.session.mount(baseUrl, adapter)
+        # nonces must increase for every request made with the key
+        self.nonceLock = threading.Lock()
+        self.lastNonce = 0
+
+    async def retrieveOrders(self, progressCallback, syncCursor):
+        """Retrieve the trades made after a sync cursor, or all trades without one.
+
+        The sync cursor holds the newest trades retrieved in each market.
+        Along with the orders, the advanced sync cursor and the ids of orders
+        which may be missing trades retrieved before the cursor are returned.
+        """
 
-    def getOrders(self, progressCallback, callback):
-        progressCallback(text="Processing orders...")
+        syncCursor = syncCursor or {}
+        progressCallback(text="Retrieving Gemini markets...")
         trades = []
-        endpoint = "/v1/mytrades"
-        markets = [
-                {'baseCurrency': 'USD', 'currency': 'BTC'},
-                {'baseCurrency': 'USD', 'currency': 'ETH'},
-                {'baseCurrency': 'BTC', 'currency': 'ETH'}
-        ]
-        for market in markets:
-            symbol = (market['currency'] + market['baseCurrency']).lower()
-            payload = {
-                    'request': endpoint,
-                    'nonce': int(time.time() * 1000),
+        symbols = await self.getSymbols()
+        progressCallback(text="Retrieving Gemini orders...", value=0, maxValue=len(symbols))
+
+        async def getMarketRecords(symbol):
+            records = await self._getMarketRecords(symbol, syncCursor.get(symbol))
+            progressCallback()
+            return records
+
+        results = await asyncio.gather(*[getMarketRecords(symbol) for symbol in symbols])
+        # currencies are only looked up for markets with new trades
+        symbolRecords = [(symbol, records) for symbol, records in zip(symbols, results) if records]
+        markets = await self.getMarkets([symbol for symbol, _ in symbolRecords])
+        marketRecords = [(market, records) for market, (_, records) in zip(markets, symbolRecords)]
+        progressCallback(
+                text="Processing Gemini orders...", value=0,
+                maxValue=sum(len(records) for _, records in marketRecords))
+        newSyncCursor = dict(syncCursor)
+        partialOrderIds = set()
+        for market, records in marketRecords:
+            for record in records:
+                trade = self._createTrade(record, market)
+                trades.append(trade)
+                if market['symbol'] in syncCursor:
+                    partialOrderIds.add(trade.orderId)
+                progressCallback()
+            newestTimestamp = max(record['timestampms'] for record in records)
+            newSyncCursor[market['symbol']] = {
+                    'timestampms': newestTimestamp,
+                    'tradeIds': [
+                            record['tid'] for record in records
+                            if record['timestampms'] == newestTimestamp]}
+        progressCallback(text="Done retrieving Gemini orders.")
+        return HistoryParser.ordersFromTrades(trades), {
+                'syncCursors': {self.EXCHANGE: newSyncCursor},
+                'partialOrderIds': partialOrderIds}
+
+    async def getSymbols(self):
+        """Discover the symbols of the markets on Gemini."""
+
+        response = await self.request(
+                self.session.get, self.baseUrl + "/v1/symbols", rateLimit='public')
+        response.raise_for_status()
+        return response.json()
+
+    async def getMarkets(self, symbols):
+        """Look up the currency and base currency of each symbol.
+
+        The details of a symbol are only requested the first time it is
+        looked up, as every request counts against the public rate limit.
+        """
+
+        return await asyncio.gather(*[self._getMarket(symbol) for symbol in symbols])
+
+    async def _getMarket(self, symbol):
+        key = (self.baseUrl, symbol)
+        if key not in self._markets:
+            response = await self.request(
+                    self.session.get, self.baseUrl + "/v1/symbols/details/" + symbol,
+                    rateLimit='public')
+            response.raise_for_status()
+            details = response.json()
+            self._markets[key] = {
                     'symbol': symbol,
-                    'limit_trades': self.MAX_TRADES_RETURNED
-            }
-            encodedPayload = base64.b64encode(json.dumps(payload).encode())
-            signature = hmac.new(self.secret.encode(), encodedPayload, sha384).hexdigest()
-            headers = {
-                    'Content-Type': "text/plain",
-                    'Content-Length': "0",
-                    'X-GEMINI-APIKEY': self.key,
-                    'X-GEMINI-PAYLOAD': encodedPayload,
-                    'X-GEMINI-SIGNATURE': signature,
-                    'Cache-Control': "no-cache"
-            }
-            response = requests.request("POST", self.BASE_URL + endpoint, headers=headers)
-            if response.ok:
-                records = response.json(parse_float=Decimal)
-                progressCallback(text="Processing orders...", value=0, maxValue=len(records))
-                for record in records:
-                    trade = Trade()
-                    Mapper.mapRecordToTrade(record, trade, self.METHOD)
-                    trade.subtotal = trade.price * trade.quantity
-                    trade.currency = market['currency']
-                    trade.baseCurrency = market['baseCurrency']
-                    feeCurrency = record['fee_currency']
-                    if feeCurrency.upper() == trade.baseCurrency:
-                        trade.baseFee = Decimal(record['fee_amount'])
-                    elif feeCurrency.upper() == trade.currency:
-                        trade.currencyFee = Decimal(record['fee_amount'])
-                    else:
-                        Logger.warning(
-                                "Trade at %s in %s order %s had invalid"
-                                " currency %s for fee amount.",
-                                trade.closedDate, trade.exchange, trade.orderId, feeCurrency)
-                    trade.recalculateNetAmounts()
-                    trades.append(trade)
-                    progressCallback()
+                    'currency': details['base_currency'].upper(),
+                    'baseCurrency': details['quote_currency'].upper()}
+        return self._markets[key]
+
+    async def _getMarketRecords(self, symbol, marketCursor=None):
+        """Retrieve the trades in a market after its cursor, one page of trades at a time.
+
+        Given a timestamp, the API returns the oldest trades on or after it,
+        so each page starts at the newest timestamp of the previous page.
+        Trades on the boundary are returned twice and skipped by trade id.
+        """
+
+        records = []
+        if marketCursor:
+            seenTradeIds = set(marketCursor['tradeIds'])
+            oldestTimestamp = marketCursor['timestampms']
+        else:
+            seenTradeIds = set()
+            oldestTimestamp = 0
+        timestamp = oldestTimestamp // 1000
+        while True:
+            response = await self.request(self._post, "/v1/mytrades", {
+                    'symbol': symbol,
+                    'limit_trades': self.MAX_TRADES_RETURNED,
+                    'timestamp': timestamp}, rateLimit='private')
+            if not response.ok:
+                raise RefreshError(
+                        self.EXCHANGE, "{} orders, the reply was: {}".format(symbol, response))
+            page = response.json(parse_float=Decimal)
+            newRecords = [
+                    record for record in page
+                    if record['tid'] not in seenTradeIds
+                    and record['timestampms'] >= oldestTimestamp]
+            records += newRecords
+            seenTradeIds.update(record['tid'] for record in newRecords)
+            if len(page) < self.MAX_TRADES_RETURNED:
+                break
+            newestTimestamp = max(record['timestampms'] for record in page) // 1000
+            # a full page of trades in the same second could not be paged past otherwise
+            if newRecords and newestTimestamp > timestamp:
+                timestamp = newestTimestamp
             else:
-                Logger.error("Problem retrieving orders from Gemini. The reply was: %s", response)
-            progressCallback(text="Done retrieving orders.")
-        callback(HistoryParser.ordersFromTrades(trades))
+                timestamp += 1
+        return records
+
+    def _post(self, endpoint, parameters):
+        # the nonce is created as the request is sent, after any wait for the rate limit
+        payload = dict(parameters, request=endpoint, nonce=self._nextNonce())
+        encodedPayload = base64.b64encode(json.dumps(payload).encode())
+        signature = hmac.new(self.secret.encode(), encodedPayload, sha384).hexdigest()
+        headers = {
+                'Content-Type': "text/plain",
+                'Content-Length': "0",
+                'X-GEMINI-APIKEY': self.key,
+                'X-GEMINI-PAYLOAD': encodedPayload,
+                'X-GEMINI-SIGNATURE': signature,
+                'Cache-Control': "no-cache"
+        }
+        return self.session.post(self.baseUrl + endpoint, headers=headers)
+
+    def _nextNonce(self):
+        with self.nonceLock:
+            self.lastNonce = max(int(time.time() * 1000), self.lastNonce + 1)
+            return self.lastNonce
+
+    def _createTrade(self, record, market):
+        trade = Trade()
+        Mapper.mapRecordToTrade(record, trade, self.METHOD)
+        trade.subtotal = trade.price * trade.quantity
+        trade.currency = market['currency']
+        trade.baseCurrency = market['baseCurrency']
+        feeCurrency = record['fee_currency']
+        if feeCurrency.upper() == trade.baseCurrency:
+            trade.baseFee = Decimal(record['fee_amount'])
+        elif feeCurrency.upper() == trade.currency:
+            trade.currencyFee = Decimal(record['fee_amount'])
+        else:
+            Logger.warning(
+                    "Trade at %s in %s order %s had invalid"
+                    " currency %s for fee amount.",
+                    trade.closedDate, trade.exchange, trade.orderId, feeCurrency)
+        trade.recalculateNetAmounts()
+        return trade
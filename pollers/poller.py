@@ -0,0 +1,154 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import random
+
+import requests
+
+from instrumentation import Instruments
+from logger import Logger
+from pollers.token_bucket import TokenBucket
+
+class RefreshError(Exception):
+    """Orders could not be retrieved from an exchange."""
+
+    def __init__(self, exchange, cause):
+        super(RefreshError, self).__init__(
+                "Problem retrieving orders from {}: {}".format(exchange, cause))
+        self.exchange = exchange
+
+class Poller():
+    """Base class for retrieving order history from an exchange API.
+
+    Subclasses implement retrieveOrders as a coroutine and make their API
+    calls through request, which runs blocking calls in a thread pool with
+    bounded concurrency, the exchange's rate limits and retries.
+    """
+
+    EXCHANGE = None
+    # requests per second and burst size of each rate limit of the exchange
+    RATE_LIMITS = {'api': (1, 1)}
+    # number of requests in progress at the same time
+    MAX_CONCURRENCY = 4
+    MAX_RETRIES = 3
+    # seconds before the first retry, doubled for every further retry
+    RETRY_DELAY = 1.0
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    # token buckets shared by all pollers of an exchange, by exchange and rate limit name
+    _tokenBuckets = {}
+
+    def __init__(self):
+        self.semaphore = None
+        self.executor = None
+
+    def getOrders(self, progressCallback, callback, syncCursor=None, errorCallback=None):
+        """Retrieve orders after a sync cursor, or all orders without one, for the callback."""
+
+        self.refreshAll(
+                [self], progressCallback, callback, {self.EXCHANGE: syncCursor}, errorCallback)
+
+    @staticmethod
+    def refreshAll(
+            pollers, progressCallback, callback, syncCursors=None, errorCallback=None,
+            storedCursors=None):
+        """Retrieve orders from several exchanges at the same time.
+
+        The callback is called with the orders of each exchange as soon as
+        they have been retrieved, in the thread running the event loop.
+        Exchanges that fail are passed to the errorCallback as a RefreshError
+        while the others are still retrieved, or the error is raised without
+        an errorCallback.
+
+        The orders are passed along with startCursors, the sync cursor of the
+        exchange which was stored when the refresh started, so that they are
+        only added if no other refresh was added meanwhile. storedCursors
+        gives them when the refresh does not start from them, as for a full
+        resync, and defaults to syncCursors.
+        """
+
+        syncCursors = syncCursors or {}
+        if storedCursors is None:
+            storedCursors = syncCursors
+
+        async def retrieveAll():
+            retrievals = [
+                    poller._retrieve(
+                            progressCallback, syncCursors.get(poller.EXCHANGE),
+                            storedCursors.get(poller.EXCHANGE))
+                    for poller in pollers]
+            for retrieval in asyncio.as_completed(retrievals):
+                try:
+                    orders, kwargs = await retrieval
+                except RefreshError as error:
+                    Logger.error("%s", error)
+                    if errorCallback is None:
+                        raise
+                    errorCallback(error)
+                    continue
+                callback(orders, **kwargs)
+
+        with Instruments.span('refreshAll'):
+            asyncio.run(retrieveAll())
+
+    async def _retrieve(self, progressCallback, syncCursor, storedCursor):
+        self.semaphore = asyncio.Semaphore(self.MAX_CONCURRENCY)
+        with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENCY) as self.executor:
+            try:
+                orders, kwargs = await self.retrieveOrders(progressCallback, syncCursor)
+            except RefreshError:
+                raise
+            except Exception as e:
+                raise RefreshError(self.EXCHANGE, e) from e
+            Instruments.count('retrieveOrders.' + self.EXCHANGE, len(orders))
+            return orders, dict(kwargs, startCursors={self.EXCHANGE: storedCursor})
+
+    async def retrieveOrders(self, progressCallback, syncCursor):
+        """Return the orders after the sync cursor and keyword arguments for Portfolio.addOrders."""
+
+        raise NotImplementedError()
+
+    @classmethod
+    def _tokenBucket(cls, rateLimit):
+        key = (cls.EXCHANGE, rateLimit)
+        if key not in Poller._tokenBuckets:
+            Poller._tokenBuckets[key] = TokenBucket(*cls.RATE_LIMITS[rateLimit])
+        return Poller._tokenBuckets[key]
+
+    def isTemporaryFailure(self, result):
+        return getattr(result, 'status_code', None) in self.RETRY_STATUS_CODES
+
+    async def request(self, function, *args, rateLimit='api', **kwargs):
+        """Call a blocking API function, retrying with exponential backoff and jitter.
+
+        Calls are retried when they raise a requests exception or return
+        a result indicating a temporary problem, see isTemporaryFailure.
+        """
+
+        loop = asyncio.get_running_loop()
+        attempt = 0
+
+        def call():
+            # timed in the thread making the call
+            with Instruments.span('request.' + self.EXCHANGE):
+                return function(*args, **kwargs)
+
+        while True:
+            async with self.semaphore:
+                await self._tokenBucket(rateLimit).acquire()
+                try:
+                    result = await loop.run_in_executor(self.executor, call)
+                    retry = self.isTemporaryFailure(result)
+                    error = result
+                except requests.RequestException as e:
+                    retry = True
+                    error = e
+            if not retry:
+                return result
+            if attempt >= self.MAX_RETRIES:
+                if isinstance(error, Exception):
+                    raise error
+                return result
+            delay = self.RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5)
+            Logger.warning("Retrying %s request in %.1fs after: %s", self.EXCHANGE, delay, error)
+            await asyncio.sleep(delay)
+            attempt += 1
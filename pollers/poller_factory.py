@@ -0,0 +1,22 @@
+from logger import Logger
+from pollers.bittrex_poller import BittrexPoller
+from pollers.gemini_poller import GeminiPoller
+
+class PollerFactory():
+    # pollers by the name of their API key in keys.py
+    POLLERS = {
+            'bittrex': BittrexPoller,
+            'gemini': GeminiPoller
+    }
+
+    @classmethod
+    def createPollers(cls, keys, names=None):
+        """Create pollers for the named exchanges, or for every exchange with an API key."""
+
+        pollers = []
+        for name in names or sorted(name for name in keys if name in cls.POLLERS):
+            try:
+                pollers.append(cls.POLLERS[name](keys[name]['key'], keys[name]['secret']))
+            except KeyError:
+                Logger.error("No API key for %s. Check keys.py.", name)
+        return pollers
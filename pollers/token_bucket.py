@@ -0,0 +1,27 @@
+import asyncio
+import threading
+import time
+
+class TokenBucket():
+    """Rate limit allowing bursts of capacity requests, and rate requests per second on average.
+
+    Tokens are reserved under a lock before a request waits for them, as
+    a bucket is shared by the event loops of the threads polling an exchange.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    async def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            delay = -self.tokens / self.rate
+        if delay > 0:
+            await asyncio.sleep(delay)
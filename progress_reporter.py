@@ -0,0 +1,83 @@
+"""Progress reporting from worker threads at a bounded rate."""
+
+from datetime import timedelta
+import threading
+import time
+
+class ProgressReporter():
+    """Progress callback which coalesces updates from worker threads.
+
+    It is called like the progress callbacks of the parsers, pollers and
+    portfolio: with a text, a value or a maximum value, or without arguments
+    to advance by one. Advancing only increments a counter and the progress
+    is passed to the publish function at most rate times per second, along
+    with the throughput since the maximum value was set and the estimated
+    seconds remaining. A new text is published at once so that the start and
+    end of every stage are shown.
+    """
+
+    # publications per second
+    RATE = 20
+
+    def __init__(self, publish, rate=RATE, clock=time.monotonic):
+        self.publish = publish
+        self.interval = 1 / rate
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.text = None
+        self.maxValue = None
+        self.value = 0
+        self.started = clock()
+        self.startValue = 0
+        self.nextPublication = 0
+
+    def __call__(self, text=None, value=None, maxValue=None):
+        if text is None and value is None and maxValue is None:
+            # an uncontended lock is far cheaper than publishing every advance
+            with self.lock:
+                self.value += 1
+            if self.clock() >= self.nextPublication:
+                self.flush()
+            return
+        with self.lock:
+            if value is not None:
+                self.value = value
+            if maxValue is not None:
+                self.maxValue = maxValue
+                self.started = self.clock()
+                self.startValue = self.value
+            newText = text is not None and text != self.text
+            if text is not None:
+                self.text = text
+        if newText or self.clock() >= self.nextPublication:
+            self.flush()
+
+    def flush(self):
+        """Publish the current progress regardless of the rate."""
+
+        with self.lock:
+            now = self.clock()
+            self.nextPublication = now + self.interval
+            value = self.value
+            elapsed = now - self.started
+            throughput = None
+            remainingSeconds = None
+            if elapsed > 0 and value > self.startValue:
+                throughput = (value - self.startValue) / elapsed
+                if self.maxValue:
+                    remainingSeconds = max(self.maxValue - value, 0) / throughput
+            # published while locked so that updates arrive in order
+            self.publish(
+                    text=self.text, value=value, maxValue=self.maxValue,
+                    throughput=throughput, remainingSeconds=remainingSeconds)
+
+    @staticmethod
+    def describeRate(throughput, remainingSeconds):
+        """Describe the throughput and time remaining of a stage, e.g. '1,234/s, 0:01:05 left'."""
+
+        if throughput is None:
+            return ""
+        description = "{:,.0f}/s".format(throughput)
+        if remainingSeconds is not None:
+            description += ", {} left".format(timedelta(seconds=round(remainingSeconds)))
+        return description
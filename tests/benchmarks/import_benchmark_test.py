@@ -0,0 +1,19 @@
+from benchmarks.history_generator import FORMATS
+from benchmarks.import_benchmark import runBenchmark
+
+# verify that every format is imported, the re-import completing the last order of the first file
+def testImportBenchmark(tmpdir):
+    results = runBenchmark(str(tmpdir), sizes=(200,))
+
+    assert sorted(results) == sorted(FORMATS)
+    for historyFormat, result in results.items():
+        counts = result[200]['counts']
+        assert counts['rows'] == 200
+        assert counts['reimportInsertedOrders'] > 0
+        assert counts['reimportedOrders'] - counts['reimportInsertedOrders'] > 0
+        assert result[200]['addOrders']['seconds'] > 0
+    assert results['bittrex'][200]['counts'] == results['bittrex-utf16'][200]['counts']
+    assert results['bittrex'][200]['counts']['orders'] == 200
+    assert results['kraken'][200]['counts']['orders'] < 200
+    assert results['kraken'][200]['counts']['reimportUpdatedOrders'] == 1
+    assert results['kraken'][200]['counts'] == results['poloniex'][200]['counts']
@@ -0,0 +1,16 @@
+from benchmarks.poller_benchmark import runBenchmark
+from pollers.gemini_poller import GeminiPoller
+from pollers.poller import Poller
+
+# verify that every order reaches the database when requests are rejected by the server
+def testPollerBenchmark(monkeypatch):
+    monkeypatch.setattr(Poller, '_tokenBuckets', {})
+    monkeypatch.setattr(Poller, 'RETRY_DELAY', 0.01)
+    monkeypatch.setattr(GeminiPoller, 'MAX_TRADES_RETURNED', 50)
+
+    results = runBenchmark(numTrades=300, failEvery=4)
+
+    assert results['exchanges']['Bittrex']['orders'] == 300
+    assert 0 < results['exchanges']['Gemini']['orders'] < 300
+    assert results['rejectedRequests'] > 0
+    assert results['totalTime'] >= results['exchanges']['Gemini']['committedAfter']
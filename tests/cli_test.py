@@ -0,0 +1,67 @@
+from decimal import Decimal
+import subprocess
+import sys
+
+import cli
+from parsers.poloniex_parser import PoloniexParser
+from pollers.poller import Poller
+from pollers.poller_factory import PollerFactory
+
+class FakePoller(Poller):
+    def __init__(self, exchange, broken=False):
+        super(FakePoller, self).__init__()
+        self.EXCHANGE = exchange
+        self.broken = broken
+
+    async def retrieveOrders(self, progressCallback, syncCursor):
+        if self.broken:
+            raise ValueError("unexpected reply")
+        return [self.EXCHANGE], {'syncCursors': {}}
+
+POLONIEX_LINES = (
+        '2018-01-03 20:35:48,ETH/BTC,Exchange,Buy,0.05,1.0,0.05,0.25%,123,-0.05,1.0\n',
+        '2018-01-04 10:00:00,ETH/BTC,Exchange,Sell,0.06,1.0,0.06,0.25%,456,0.06,-1.0\n',
+        '2018-01-04 10:00:00,LTC/BTC,Exchange,Sell,0.01,3.0,0.03,0.25%,789,0.0299,-3.0\n')
+
+def testImportAndReport(prepareDatabase, tmpdir):
+    session = prepareDatabase['session']
+    historyFile = tmpdir.join('history.csv')
+    historyFile.write(PoloniexParser.HEADERS[0] + '\n' + ''.join(POLONIEX_LINES))
+    unsupportedFile = tmpdir.join('unsupported.csv')
+    unsupportedFile.write('a,b\n')
+
+    changes = cli.importFiles(session, [str(historyFile), str(unsupportedFile)])
+    assert changes.insertedOrderIds == {'123', '456', '789'}
+    assert len(changes.positionIds) == 2
+    changes = cli.importFiles(session, [str(historyFile)])
+    assert not changes.insertedOrderIds and not changes.updatedOrderIds
+
+    report = cli.createReport(session)
+    assert [(p['currency'], p['numOrders']) for p in report['openPositions']] == [
+            ('ETH', 2), ('LTC', 1)]
+    assert report['closedPositions'] == []
+    assert report['balances'] == {'Poloniex': {
+            'BTC': Decimal('0.0399'), 'ETH': Decimal(0), 'LTC': Decimal('-3')}}
+    assert [(o['currency'], o['numOrders'], o['netBase']) for o in report['offers']] == [
+            ('ETH', 2, Decimal('0.01'))]
+    # offers are made again until they are accepted
+    assert cli.createReport(session)['offers'] == report['offers']
+
+# verify that the orders of the other exchanges are added when one fails
+def testPollExchangeFailure(prepareDatabase, monkeypatch):
+    pollers = [FakePoller('Broken', broken=True), FakePoller('Working')]
+    monkeypatch.setattr(PollerFactory, 'createPollers', lambda keys, exchanges: pollers)
+    addedOrders = []
+    monkeypatch.setattr(
+            cli.Portfolio, 'addOrders',
+            lambda self, orders, session, progress, callback, **kwargs: addedOrders.extend(orders))
+
+    changes, errors = cli.pollExchanges(prepareDatabase['session'], [])
+
+    assert addedOrders == ['Working']
+    assert [error.exchange for error in errors] == ['Broken']
+    assert not changes.insertedOrderIds
+
+def testNoKivyImport():
+    subprocess.check_call(
+            [sys.executable, '-c', 'import sys, cli; assert "kivy" not in sys.modules'])
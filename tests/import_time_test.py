@@ -0,0 +1,33 @@
+import subprocess
+import sys
+
+# importing the domain model should take little more than importing SQLAlchemy
+IMPORT_TIME_BUDGET = 0.5
+NUM_RUNS = 3
+# modules which must only be imported by the GUI or when they are used
+UNWANTED_MODULES = ('kivy', 'multiprocessing', 'requests', 'bittrex', 'numpy')
+
+def _importModule(module):
+    """Import a module in a fresh interpreter.
+
+    Returns the import time in seconds and the names of all modules imported with it.
+    """
+
+    output = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+            stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+    cumulativeTimes = {}
+    # skip the header of the table
+    for line in output.splitlines()[1:]:
+        _, cumulative, name = line.split('|')
+        cumulativeTimes[name.strip()] = int(cumulative)
+    return cumulativeTimes[module] / 1e6, set(cumulativeTimes)
+
+def testImportTime():
+    for module in ('trading.portfolio', 'parsers.history_parser_factory'):
+        importTime, modules = min(_importModule(module) for _ in range(NUM_RUNS))
+        assert importTime < IMPORT_TIME_BUDGET, "importing {} took {:.3f}s".format(
+                module, importTime)
+        for unwanted in UNWANTED_MODULES:
+            assert not any(name.split('.')[0] == unwanted for name in modules), (
+                    "importing {} imports {}".format(module, unwanted))
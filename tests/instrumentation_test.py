@@ -0,0 +1,66 @@
+import json
+import time
+
+import cli
+from instrumentation import Instrumentation, Instruments
+from parsers.poloniex_parser import PoloniexParser
+
+POLONIEX_LINES = (
+        '2018-01-03 20:35:48,ETH/BTC,Exchange,Buy,0.05,1.0,0.05,0.25%,123,-0.05,1.0\n',
+        '2018-01-03 20:35:49,ETH/BTC,Exchange,Buy,0.05,2.0,0.10,0.25%,123,-0.10,2.0\n',
+        '2018-01-04 10:00:00,ETH/BTC,Exchange,Sell,0.06,1.0,0.06,0.25%,456,0.06,-1.0\n')
+
+# verify that time in nested spans and iterated items is excluded from the time of the stage itself
+def testNestedSpans(tmpdir):
+    instrumentation = Instrumentation(enabled=True)
+
+    def slowItems():
+        for item in range(3):
+            time.sleep(0.01)
+            yield item
+
+    with instrumentation.span('outer', records=10):
+        with instrumentation.span('inner'):
+            time.sleep(0.02)
+        assert list(instrumentation.iterate('items', slowItems())) == [0, 1, 2]
+    instrumentation.count('items', 2)
+    report = instrumentation.logReport(str(tmpdir.join('report.json')))
+
+    stages = report['stages']
+    assert stages['outer']['seconds'] >= stages['inner']['seconds'] + stages['items']['seconds']
+    assert stages['outer']['selfSeconds'] < 0.01
+    assert stages['items']['seconds'] >= 0.03
+    assert (stages['items']['calls'], stages['items']['records']) == (1, 5)
+    assert stages['outer']['recordsPerSecond'] == 10 / stages['outer']['seconds']
+    assert stages['inner']['recordsPerSecond'] is None
+    assert sum(stage['share'] for stage in stages.values()) <= 1
+    assert json.loads(tmpdir.join('report.json').read()) == report
+
+def testDisabled():
+    instrumentation = Instrumentation()
+    items = [1, 2]
+
+    with instrumentation.span('stage'):
+        pass
+
+    assert instrumentation.iterate('items', items) is items
+    assert instrumentation.report()['stages'] == {}
+    assert instrumentation.logReport() is None
+
+# verify that the stages of an import are reported
+def testImportStages(prepareDatabase, tmpdir, monkeypatch):
+    monkeypatch.setattr(Instruments, 'enabled', True)
+    Instruments.reset()
+    historyFile = tmpdir.join('history.csv')
+    historyFile.write(PoloniexParser.HEADERS[0] + '\n' + ''.join(POLONIEX_LINES))
+
+    cli.importFiles(prepareDatabase['session'], [str(historyFile)])
+
+    stages = Instruments.report()['stages']
+    assert {
+            'detectHeader', 'countLines', 'parseLines', 'ordersFromTrades',
+            'addOrders.commit'} <= set(stages)
+    assert stages['parseLines']['records'] == 3
+    assert stages['ordersFromTrades']['records'] == 2
+    assert stages['addOrders']['records'] == 2
+    assert stages['addOrders.insert']['records'] == 2
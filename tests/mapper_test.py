@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+from dateutil.parser import parse
+
+from mapper import Mapper
+from names import ORDER_TYPE_BUY, ORDER_TYPE_SELL
+from trading.trade import Trade
+
+def testCompiledMappingIsCached():
+    for mappingKey in Mapper.MAPPINGS:
+        assert Mapper.compileMapping(mappingKey) is Mapper.compileMapping(mappingKey)
+
+def testKrakenMapping():
+    record = (
+            'TXID1,ORDER1,XETHZUSD,2018-01-03 20:35:48.1234,sell,limit,'
+            '900.5,1801.0,2.8816,2.0').split(',')
+    trade = Trade()
+
+    Mapper.mapRecordToTrade(record, trade, 'KrakenCSV')
+
+    assert trade.id == 'TXID1'
+    assert trade.orderId == 'ORDER1'
+    assert trade.closedDate == parse('2018-01-03 20:35:48')
+    assert trade.exchange == 'Kraken'
+    assert trade.orderType == ORDER_TYPE_SELL
+    assert (trade.currency, trade.baseCurrency) == ('ETH', 'USD')
+    assert trade.quantity == Decimal('2.0')
+    assert trade.price == Decimal('900.5')
+    assert trade.subtotal == Decimal('1801.0')
+    assert trade.currencyFee == 0
+    assert trade.baseFee == Decimal('2.8816')
+
+def testBittrexAPIMapping():
+    record = {
+            'OrderUuid': 'uuid1',
+            'Exchange': 'BTC-LTC',
+            'OrderType': 'LIMIT_BUY',
+            'Quantity': Decimal('10'),
+            'Limit': Decimal('0.01'),
+            'Price': Decimal('0.1'),
+            'Commission': Decimal('0.00025'),
+            'Closed': '2018-01-03T20:35:48.47'}
+    trade = Trade()
+
+    Mapper.mapRecordToTrade(record, trade, 'BittrexAPI')
+
+    assert trade.orderId == 'uuid1'
+    assert trade.closedDate == parse('2018-01-03T20:35:48.47')
+    assert trade.exchange == 'Bittrex'
+    assert trade.orderType == ORDER_TYPE_BUY
+    assert (trade.currency, trade.baseCurrency) == ('LTC', 'BTC')
+    assert trade.quantity == Decimal('10')
+    assert trade.price == Decimal('0.01')
+    assert trade.subtotal == Decimal('0.1')
+    assert trade.baseFee == Decimal('0.00025')
@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from migration import migrate
+from trading.order import calculateFingerprint, Order
+from trading.position import Position
+
+def testMigrateStringColumns():
+    engine = create_engine('sqlite://', echo=False)
+    engine.execute(
+            'CREATE TABLE positions (id INTEGER PRIMARY KEY, "walletName" VARCHAR,'
+            ' exchange VARCHAR, currency VARCHAR, "baseCurrency" VARCHAR, "isOpen" BOOLEAN,'
+            ' "closedDate" DATETIME, "netCurrency" VARCHAR(100))')
+    engine.execute(
+            'CREATE UNIQUE INDEX single_open_position_per_market'
+            ' ON positions (exchange, currency, "baseCurrency") WHERE "isOpen" = 1')
+    engine.execute(
+            "INSERT INTO positions VALUES (1, 'wallet', 'exchange', 'ETH', 'BTC', 1, NULL, NULL)")
+    engine.execute(
+            'CREATE TABLE orders (id VARCHAR PRIMARY KEY, "walletName" VARCHAR,'
+            ' "positionId" VARCHAR, "closedDate" DATETIME, exchange VARCHAR, "orderType" VARCHAR,'
+            ' currency VARCHAR, "baseCurrency" VARCHAR, quantity VARCHAR(100),'
+            ' subtotal VARCHAR(100), "currencyFee" VARCHAR(100), "baseFee" VARCHAR(100),'
+            ' "netCurrency" VARCHAR(100), "netBase" VARCHAR(100))')
+    engine.execute(
+            "INSERT INTO orders VALUES ('order1', 'wallet', 1, '2018-01-03 20:35:48.000000',"
+            " 'exchange', 'buy', 'ETH', 'BTC', '1.0', '0.1', '0.0', '0.0', '1.0', '-0.1')")
+    engine.execute(
+            "INSERT INTO orders VALUES ('order2', 'wallet', 1, '2018-01-03 21:00:00.000000',"
+            " 'exchange', 'sell', 'ETH', 'BTC', '0.5', '0.1', '0.0', '0.0', '-0.5', '0.1')")
+    # the subtotal of a price times a quantity, with more decimal places than are stored
+    engine.execute(
+            "INSERT INTO orders VALUES ('order3', 'wallet', 1, '2018-01-03 22:00:00.000000',"
+            " 'exchange', 'buy', 'ETH', 'BTC', '0.00275132', '9.9942799528', '0.0', '0.0',"
+            " '0.00275132', '-9.9942799528')")
+
+    migrate(engine)
+
+    session = sessionmaker(bind=engine)()
+    position = session.query(Position).one()
+    assert position.currencyProfitLoss() == Decimal('0.50275132')
+    assert position.baseProfitLoss() == Decimal('-9.99427995')
+    assert (position.absoluteBuys, position.absoluteSells) == (
+            Decimal('10.09427995'), Decimal('0.1'))
+    assert position.hasConsistentTotals()
+    assert session.query(Order).get('order1').quantity == Decimal('1.0')
+    assert session.query(Order).get('order3').subtotal == Decimal('9.99427995')
+    assert engine.execute('SELECT typeof(quantity) FROM orders').first()[0] == 'integer'
+    assert engine.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'single_open_position_per_market'").first()
+    assert engine.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'order_fingerprints'").first()
+    assert [order.fingerprint for order in session.query(Order).order_by(Order.id)] == [
+            calculateFingerprint(order) for order in session.query(Order).order_by(Order.id)]
+    session.close()
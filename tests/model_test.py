@@ -0,0 +1,52 @@
+import pytest
+
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker
+
+import model
+from model import Base, createEngine, createReaderEngine, sessionScope
+
+def testReadWhileWriting(tmpdir):
+    engine = createEngine('sqlite:///' + str(tmpdir.join('tracker.db')))
+    readerEngine = createReaderEngine(engine)
+    Base.metadata.create_all(engine)
+    engine.execute("INSERT INTO portfolios (id) VALUES (1)")
+
+    with engine.begin() as connection:
+        connection.execute("INSERT INTO portfolios (id) VALUES (2)")
+        # readers see the last commit without waiting for the write transaction
+        assert readerEngine.execute("SELECT count(*) FROM portfolios").scalar() == 1
+    assert readerEngine.execute("SELECT count(*) FROM portfolios").scalar() == 2
+
+    assert engine.execute("PRAGMA journal_mode").scalar() == 'wal'
+    with pytest.raises(OperationalError):
+        readerEngine.execute("INSERT INTO portfolios (id) VALUES (3)")
+    readerEngine.dispose()
+    engine.dispose()
+
+def testInMemoryDatabaseIsReadThroughWriter():
+    engine = createEngine('sqlite://')
+
+    assert createReaderEngine(engine) is engine
+
+# verify that a session failing while writing returns the writer connection,
+# and that threads waiting for a connection which is never returned give up
+def testWriterConnectionIsReturned(tmpdir, monkeypatch):
+    monkeypatch.setattr(model, 'WRITER_POOL_TIMEOUT', 0.1)
+    engine = createEngine('sqlite:///' + str(tmpdir.join('tracker.db')))
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    with pytest.raises(ValueError):
+        with sessionScope(Session) as session:
+            session.execute("INSERT INTO portfolios (id) VALUES (1)")
+            raise ValueError()
+    with sessionScope(Session) as session:
+        assert session.execute("SELECT count(*) FROM portfolios").scalar() == 0
+
+    session = Session()
+    session.execute("INSERT INTO portfolios (id) VALUES (1)")
+    with pytest.raises(PoolTimeoutError):
+        engine.execute("SELECT 1")
+    session.close()
+    engine.dispose()
@@ -0,0 +1,45 @@
+import pytest
+
+from parsers.bittrex_parser import BittrexParser
+from parsers.history_file import HistoryFile
+from parsers.history_parser_factory import HistoryParserFactory
+
+BITTREX_LINES = [
+        'uuid{},BTC-LTC,LIMIT_BUY,10.0,0.01,0.00025,0.1,2018-01-03 20:30:00,'
+        '2018-01-03 20:35:48'.format(i)
+        for i in range(20)]
+
+@pytest.mark.parametrize('encoding, byteOrderMark', [
+        ('utf-8', b''),
+        ('utf-8', b'\xef\xbb\xbf'),
+        ('utf-16-le', b''),
+        ('utf-16-le', b'\xff\xfe'),
+        ('utf-16-be', b'\xfe\xff')])
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def testDecodeLines(tmpdir, monkeypatch, encoding, byteOrderMark, newline):
+    # lines cross the boundaries of chunks
+    monkeypatch.setattr(HistoryFile, 'CHUNK_SIZE', 101)
+    path = str(tmpdir.join('history.csv'))
+    with open(path, 'wb') as f:
+        f.write(byteOrderMark
+                + newline.join([BittrexParser.HEADERS[0]] + BITTREX_LINES).encode(encoding))
+
+    with HistoryFile(path) as historyFile:
+        assert historyFile.encoding == encoding
+        assert historyFile.header() == BittrexParser.HEADERS[0]
+        assert [line.strip() for line in historyFile.lines()] == BITTREX_LINES
+        assert historyFile.countLines() == len(BITTREX_LINES)
+        offsets = historyFile.chunkOffsets(7)
+        assert [line.strip() for start, end in zip(offsets, offsets[1:])
+                for line in historyFile.lines(start, end)] == BITTREX_LINES
+    assert HistoryParserFactory.detectFileParser(path) == (BittrexParser, BittrexParser.HEADERS[0])
+
+def testEmptyFile(tmpdir):
+    path = tmpdir.join('empty.csv')
+    path.write('')
+
+    with HistoryFile(str(path)) as historyFile:
+        assert historyFile.header() == ''
+        assert list(historyFile.lines()) == []
+        assert historyFile.countLines() == 0
+        assert historyFile.chunkOffsets(4) == [0]
@@ -0,0 +1,76 @@
+from decimal import Decimal
+
+from dateutil.parser import parse
+
+from names import ORDER_TYPE_BUY
+from parsers.bittrex_parser import BittrexParser
+from parsers.history_file import HistoryFile
+from parsers.history_parser_factory import HistoryParserFactory
+from parsers.kraken_parser import KrakenParser
+from parsers.poloniex_parser import PoloniexParser
+
+POLONIEX_LINES = (
+        '2018-01-03 20:35:48,ETH/BTC,Exchange,Buy,0.05,1.0,0.05,0.25%,123,-0.05,0.9975\n',
+        '2018-01-03 20:36:00,ETH/BTC,Exchange,Buy,0.05,2.0,0.10,0.25%,123,-0.10,1.995\n',
+        '\n',
+        '2018-01-04 10:00:00,LTC/BTC,Exchange,Sell,0.01,3.0,0.03,0.25%,456,0.0299,-3.0\n')
+
+# verify that lines are consumed lazily from any iterable and
+# that partial fills are folded into a single order
+def testStreamingParse():
+    progress = []
+    results = []
+
+    PoloniexParser.parse(
+            (line for line in POLONIEX_LINES),
+            lambda **kwargs: progress.append(kwargs),
+            results.append,
+            numLines=len(POLONIEX_LINES))
+
+    orders = {order.id: order for order in results[0]}
+    assert progress[0] == {'value': 0, 'maxValue': len(POLONIEX_LINES)}
+    assert len(progress) == len(POLONIEX_LINES) + 1
+    assert set(orders) == {'123', '456'}
+    order = orders['123']
+    assert order.orderType == ORDER_TYPE_BUY
+    assert order.closedDate == parse('2018-01-03 20:36:00')
+    assert order.quantity == Decimal('3.0')
+    assert order.netCurrency == Decimal('2.9925')
+    assert order.netBase == Decimal('-0.15')
+
+# verify that parsing in chunks gives the same orders as parsing sequentially,
+# including orders with trades on both sides of a chunk boundary
+def testParallelParse(tmpdir):
+    historyFile = tmpdir.join('history.csv')
+    historyFile.write(PoloniexParser.HEADERS[0] + '\n' + ''.join(POLONIEX_LINES * 3))
+    results = []
+    expectedResults = []
+
+    PoloniexParser.parseFile(str(historyFile), lambda **kwargs: None, results.append, processes=2)
+    PoloniexParser.parse(POLONIEX_LINES * 3, lambda **kwargs: None, expectedResults.append)
+
+    with HistoryFile(str(historyFile)) as f:
+        assert len(f.chunkOffsets(8)) > 3
+    assert list(results[0]) == list(expectedResults[0])
+
+def testParallelParseAllParsers(tmpdir):
+    lines = {
+            BittrexParser: (
+                    'uuid1,BTC-LTC,LIMIT_BUY,10.0,0.01,0.00025,0.1,2018-01-03 20:30:00,'
+                    '2018-01-03 20:35:48\n',),
+            PoloniexParser: POLONIEX_LINES,
+            KrakenParser: (
+                    '"T1","O1","XETHZUSD","2018-01-03 20:35:48.1234","buy","limit",'
+                    '"900.5","900.5","1.44","1.0","0.00000","","L1,L2"\n',
+                    '"T2","O1","XETHZUSD","2018-01-03 20:36:48.1234","buy","limit",'
+                    '"900.5","900.5","1.44","1.0","0.00000","","L3,L4"\n')}
+    for parser in HistoryParserFactory.PARSERS:
+        historyFile = tmpdir.join(parser.__name__ + '.csv')
+        historyFile.write(parser.HEADERS[0] + '\n' + ''.join(lines[parser]))
+        results = []
+        expectedResults = []
+
+        parser.parseFile(str(historyFile), lambda **kwargs: None, results.append, processes=2)
+        parser.parse(lines[parser], lambda **kwargs: None, expectedResults.append)
+
+        assert list(results[0]) == list(expectedResults[0])
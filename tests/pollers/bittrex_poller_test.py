@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+import pytest
+
+from benchmarks.fake_exchange_server import FakeExchangeServer
+from names import ORDER_TYPE_BUY
+from pollers.bittrex_poller import BittrexPoller
+from pollers.poller import Poller, RefreshError
+
+@pytest.fixture
+def fakeBittrex(monkeypatch):
+    monkeypatch.setattr(Poller, '_tokenBuckets', {})
+    monkeypatch.setattr(BittrexPoller, 'RATE_LIMITS', {'api': (1000, 1000)})
+    with FakeExchangeServer(numTrades=20) as server:
+        yield server
+
+def _getOrders(poller, syncCursor=None):
+    results = []
+    poller.getOrders(
+            lambda **kwargs: None,
+            lambda orders, **kwargs: results.append((list(orders), kwargs)), syncCursor)
+    return results[0]
+
+def testGetOrders(fakeBittrex):
+    record = dict(fakeBittrex.bittrexOrders[0], **{
+            'OrderUuid': 'uuid', 'Exchange': 'BTC-LTC', 'OrderType': 'LIMIT_BUY',
+            'Closed': '2019-01-01T00:00:00', 'Quantity': 1.1, 'Limit': 0.3, 'Price': 0.33,
+            'Commission': 0.000825})
+    fakeBittrex.bittrexOrders[0] = record
+
+    orders, kwargs = _getOrders(BittrexPoller('key', 'secret', fakeBittrex.url))
+
+    assert len(orders) == 20
+    order = next(order for order in orders if order.id == 'uuid')
+    assert (order.orderType, order.currency, order.baseCurrency) == (ORDER_TYPE_BUY, 'LTC', 'BTC')
+    # amounts are exact despite being sent as JSON numbers
+    assert order.quantity == Decimal('1.1')
+    assert order.netBase == Decimal('-0.330825')
+    assert kwargs['syncCursors']['Bittrex']['closedDate'] == order.closedDate
+
+    orders, kwargs = _getOrders(
+            BittrexPoller('key', 'secret', fakeBittrex.url), kwargs['syncCursors']['Bittrex'])
+    assert [order.id for order in orders] == ['uuid']
+
+def testInvalidSignature(fakeBittrex):
+    with pytest.raises(RefreshError, match="INVALID_SIGNATURE"):
+        _getOrders(BittrexPoller('key', 'wrong secret', fakeBittrex.url))
@@ -0,0 +1,145 @@
+from decimal import Decimal
+
+import pytest
+
+from benchmarks.fake_exchange_server import FakeExchangeServer, GEMINI_MARKETS
+from pollers.gemini_poller import GeminiPoller
+from pollers.poller import Poller
+
+def _trades(symbol, numTrades):
+    # several trades per second and order so that pages end within a second
+    return [{
+            'tid': "{}-{}".format(symbol, i),
+            'order_id': "{}-order-{}".format(symbol, i // 3),
+            'timestamp': 1514764800 + i // 4,
+            'timestampms': (1514764800 + i // 4) * 1000 + i % 4,
+            'type': 'Buy',
+            'amount': "1.5",
+            'price': "2.0",
+            'fee_currency': GEMINI_MARKETS[symbol][1],
+            'fee_amount': "0.01"} for i in range(numTrades)]
+
+@pytest.fixture
+def fakeGemini(monkeypatch):
+    # the stand-in does not need to be protected by rate limits
+    monkeypatch.setattr(Poller, '_tokenBuckets', {})
+    monkeypatch.setattr(GeminiPoller, '_markets', {})
+    monkeypatch.setattr(
+            GeminiPoller, 'RATE_LIMITS', {'public': (1000, 1000), 'private': (1000, 1000)})
+    with FakeExchangeServer(numTrades=0) as server:
+        server.geminiTrades = {
+                'btcusd': _trades('btcusd', 1234), 'ethbtc': _trades('ethbtc', 7), 'zecbtc': []}
+        yield server
+
+def _getOrders(poller, syncCursor=None):
+    results = []
+    poller.getOrders(
+            lambda **kwargs: None, lambda orders, **kwargs: results.append((orders, kwargs)),
+            syncCursor)
+    return results[0]
+
+def testGetOrders(fakeGemini):
+    poller = GeminiPoller('key', 'secret', baseUrl=fakeGemini.url)
+
+    orders, kwargs = _getOrders(poller)
+
+    orders = {order.id: order for order in orders}
+    # every trade is retrieved once, beyond the limit of a single page
+    assert len(orders) == 1234 // 3 + 1 + 7 // 3 + 1
+    assert sum(order.quantity for order in orders.values()) == Decimal('1.5') * (1234 + 7)
+    order = orders['ethbtc-order-0']
+    assert (order.currency, order.baseCurrency) == ('ETH', 'BTC')
+    assert order.quantity == Decimal('4.5')
+    assert order.baseFee == Decimal('0.03')
+    assert order.netBase == Decimal('-9.03')
+    assert kwargs['partialOrderIds'] == set()
+    assert kwargs['syncCursors']['Gemini']['ethbtc'] == {
+            'timestampms': (1514764800 + 1) * 1000 + 2, 'tradeIds': ['ethbtc-6']}
+    assert 'zecbtc' not in kwargs['syncCursors']['Gemini']
+
+# verify that the currencies of a market are only requested
+# once the market has trades, and only the first time
+def testMarketDetailsAreCached(fakeGemini):
+    fakeGemini.geminiTrades['btcusd'] = []
+
+    for _ in range(2):
+        _getOrders(GeminiPoller('key', 'secret', baseUrl=fakeGemini.url))
+
+    # symbols and a page of trades per market, and details of ethbtc on the first refresh
+    assert fakeGemini.numRequests == 2 * (1 + 3) + 1
+    assert list(GeminiPoller._markets) == [(fakeGemini.url, 'ethbtc')]
+
+# verify that a refresh from a sync cursor only retrieves new trades
+# and adds them to orders which were already stored
+def testRefreshFromSyncCursor(fakeGemini, prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    poller = GeminiPoller('key', 'secret', baseUrl=fakeGemini.url)
+    fakeGemini.geminiTrades['btcusd'] = []
+    fakeGemini.geminiTrades['ethbtc'] = _trades('ethbtc', 10)[:7]
+    orders, kwargs = _getOrders(poller)
+    portfolio.addOrders(
+            list(orders), session, lambda **kwargs: None, lambda changes: None, **kwargs)
+    fakeGemini.geminiTrades['ethbtc'] = _trades('ethbtc', 10)
+
+    orders, kwargs = _getOrders(poller, portfolio.getSyncCursor('Gemini'))
+    portfolio.addOrders(
+            list(orders), session, lambda **kwargs: None, lambda changes: None, **kwargs)
+
+    assert sorted(order.id for order in orders) == ['ethbtc-order-2', 'ethbtc-order-3']
+    assert kwargs['partialOrderIds'] == {'ethbtc-order-2', 'ethbtc-order-3'}
+    storedOrders = {order.id: order for order in portfolio.getOrders()}
+    assert len(storedOrders) == 4
+    assert storedOrders['ethbtc-order-2'].quantity == Decimal('4.5')
+    assert storedOrders['ethbtc-order-3'].quantity == Decimal('1.5')
+    assert storedOrders['ethbtc-order-2'].position.hasConsistentTotals()
+    assert portfolio.getSyncCursor('Gemini')['ethbtc']['tradeIds'] == ['ethbtc-9']
+
+# verify that of two refreshes from the same sync cursor, only the first
+# one added adds trades to the stored orders, so that none are counted twice
+def testOverlappingRefreshes(fakeGemini, prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    poller = GeminiPoller('key', 'secret', baseUrl=fakeGemini.url)
+    fakeGemini.geminiTrades['btcusd'] = []
+    fakeGemini.geminiTrades['ethbtc'] = _trades('ethbtc', 10)[:7]
+    orders, kwargs = _getOrders(poller)
+    portfolio.addOrders(
+            list(orders), session, lambda **kwargs: None, lambda changes: None, **kwargs)
+    fakeGemini.geminiTrades['ethbtc'] = _trades('ethbtc', 10)
+    syncCursor = portfolio.getSyncCursor('Gemini')
+    refreshes = [_getOrders(poller, syncCursor) for _ in range(2)]
+
+    results = []
+    for orders, kwargs in refreshes:
+        portfolio.addOrders(list(orders), session, lambda **kwargs: None, results.append, **kwargs)
+
+    assert results[0].updatedOrderIds == {'ethbtc-order-2'}
+    assert results[0].insertedOrderIds == {'ethbtc-order-3'}
+    assert not results[1].updatedOrderIds and not results[1].insertedOrderIds
+    storedOrders = {order.id: order for order in portfolio.getOrders()}
+    assert storedOrders['ethbtc-order-2'].quantity == Decimal('4.5')
+    assert storedOrders['ethbtc-order-3'].quantity == Decimal('1.5')
+    assert storedOrders['ethbtc-order-2'].position.hasConsistentTotals()
+    assert portfolio.getSyncCursor('Gemini')['ethbtc']['tradeIds'] == ['ethbtc-9']
+
+# verify that amounts with more decimal places than are stored, as the subtotal
+# of a price times a quantity, are rounded and match when retrieved again
+def testStoreAmountsOfMorePlaces(fakeGemini, prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    poller = GeminiPoller('key', 'secret', baseUrl=fakeGemini.url)
+    fakeGemini.geminiTrades = {'ethusd': [dict(
+            _trades('ethbtc', 1)[0], amount="0.00275132", price="3632.54",
+            fee_currency='USD', fee_amount="0.024985699882")]}
+    changes = []
+
+    for _ in range(2):
+        orders, kwargs = _getOrders(poller)
+        portfolio.addOrders(list(orders), session, lambda **kwargs: None, changes.append)
+
+    order = portfolio.getOrders()[0]
+    assert (order.subtotal, order.baseFee) == (Decimal('9.99427995'), Decimal('0.02498570'))
+    assert order.netBase == Decimal('-10.01926565')
+    assert order.position.hasConsistentTotals()
+    assert changes[1].insertedOrderIds == changes[1].updatedOrderIds == set()
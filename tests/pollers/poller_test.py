@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+
+import pytest
+import requests
+
+from pollers.poller import Poller, RefreshError
+from pollers.token_bucket import TokenBucket
+
+class FakePoller(Poller):
+    EXCHANGE = "Fake"
+    RATE_LIMITS = {'api': (1000, 1000)}
+    RETRY_DELAY = 0.01
+
+    def __init__(self, exchange, delay, failures=0):
+        super(FakePoller, self).__init__()
+        self.EXCHANGE = exchange
+        self.delay = delay
+        self.failures = failures
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise requests.ConnectionError("connection reset")
+        time.sleep(self.delay)
+        return self.EXCHANGE
+
+    async def retrieveOrders(self, progressCallback, syncCursor):
+        result = await self.request(self._call)
+        return [result], {'syncCursors': {self.EXCHANGE: syncCursor}}
+
+@pytest.fixture(autouse=True)
+def separateTokenBuckets(monkeypatch):
+    monkeypatch.setattr(Poller, '_tokenBuckets', {})
+
+def testTokenBucket():
+    bucket = TokenBucket(rate=50, capacity=5)
+
+    async def acquire(numTokens):
+        for _ in range(numTokens):
+            await bucket.acquire()
+
+    start = time.monotonic()
+    asyncio.run(acquire(5))
+    assert time.monotonic() - start < 0.05
+    asyncio.run(acquire(10))
+    # tokens beyond the burst are handed out at the rate
+    assert time.monotonic() - start >= 0.2 - 0.01
+
+# verify that event loops of several threads share the rate of a bucket
+def testTokenBucketThreads():
+    bucket = TokenBucket(rate=100, capacity=1)
+
+    async def acquire():
+        for _ in range(5):
+            await bucket.acquire()
+
+    threads = [threading.Thread(target=asyncio.run, args=(acquire(),)) for _ in range(4)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - start >= 0.19 - 0.01
+
+# verify that the orders of each exchange are passed on as soon as they
+# have been retrieved and that failed requests are retried
+def testRefreshAll():
+    results = []
+    errors = []
+    pollers = [
+            FakePoller('Slow', 0.3), FakePoller('Fast', 0, failures=1),
+            FakePoller('Broken', 0, failures=10)]
+
+    Poller.refreshAll(
+            pollers, lambda **kwargs: None,
+            lambda orders, **kwargs: results.append((list(orders), kwargs)),
+            {'Slow': 'cursor'}, errors.append)
+
+    assert results == [
+            (['Fast'], {'syncCursors': {'Fast': None}, 'startCursors': {'Fast': None}}),
+            (['Slow'], {'syncCursors': {'Slow': 'cursor'}, 'startCursors': {'Slow': 'cursor'}})]
+    assert [error.exchange for error in errors] == ['Broken']
+    assert isinstance(errors[0].__cause__, requests.ConnectionError)
+    assert pollers[1].calls == 2
+    assert pollers[2].calls == Poller.MAX_RETRIES + 1
+
+# verify that orders retrieved without the stored sync cursor, as for
+# a full resync, are passed on with the stored cursor
+def testRefreshAllWithoutStoredCursor():
+    results = []
+
+    Poller.refreshAll(
+            [FakePoller('Fast', 0)], lambda **kwargs: None,
+            lambda orders, **kwargs: results.append(kwargs), {}, None, {'Fast': 'stored'})
+
+    assert results == [{'syncCursors': {'Fast': None}, 'startCursors': {'Fast': 'stored'}}]
+
+def testRefreshAllRaises():
+    with pytest.raises(RefreshError, match="Problem retrieving orders from Broken"):
+        Poller.refreshAll([FakePoller('Broken', 0, failures=10)], lambda **kwargs: None, None)
@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from progress_reporter import ProgressReporter
+
+class FakeClock():
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+def _createReporter(clock):
+    publications = []
+    reporter = ProgressReporter(lambda **kwargs: publications.append(kwargs), rate=10, clock=clock)
+    return reporter, publications
+
+# verify that advances are published at most at the rate, and new texts at once
+def testCoalescedPublications():
+    clock = FakeClock()
+    reporter, publications = _createReporter(clock)
+
+    reporter(text="Parsing...", value=0, maxValue=1000)
+    for _ in range(100):
+        reporter()
+    assert [p['value'] for p in publications] == [0]
+    clock.now += 0.1
+    reporter()
+    assert publications[-1] == {
+            'text': "Parsing...", 'value': 101, 'maxValue': 1000,
+            'throughput': pytest.approx(1010), 'remainingSeconds': pytest.approx(899 / 1010)}
+    for _ in range(99):
+        reporter()
+    reporter(text="Done.")
+
+    assert [(p['text'], p['value']) for p in publications] == [
+            ("Parsing...", 0), ("Parsing...", 101), ("Done.", 200)]
+
+def testAdvancesFromThreads():
+    reporter, publications = _createReporter(FakeClock())
+
+    def advance():
+        for _ in range(10000):
+            reporter()
+
+    threads = [threading.Thread(target=advance) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    reporter.flush()
+
+    assert publications[-1]['value'] == 40000
+
+def testDescribeRate():
+    assert ProgressReporter.describeRate(None, None) == ""
+    assert ProgressReporter.describeRate(1234.5, None) == "1,234/s"
+    assert ProgressReporter.describeRate(10, 3725.4) == "10/s, 1:02:05 left"
@@ -0,0 +1,34 @@
+from dateutil.parser import parse
+import pytest
+
+from timestamp_parser import TimestampParser
+
+@pytest.mark.parametrize('text', [
+        '12/21/2017 3:19:26 PM',
+        '12/21/2017 12:19:26 AM',
+        '12/21/2017 12:19:26 PM',
+        '1/3/2018 11:59:59 pm',
+        '2018-01-03 20:35:48',
+        '2018-01-03T20:35:48.47',
+        # handled by dateutil
+        'Jan 3 2018 20:35:48',
+        '12/21/2017 15:19:26'])
+def testSameAsDateutil(text):
+    parser = TimestampParser('%m/%d/%Y %I:%M:%S %p', TimestampParser.ISO)
+
+    assert parser(text) == parse(text)
+
+def testDatesAreRemembered(monkeypatch):
+    monkeypatch.setattr(TimestampParser, 'MAX_DATES', 2)
+    parser = TimestampParser('%d.%m.%Y %H:%M:%S')
+
+    assert parser('03.01.2018 20:35:48') == parse('2018-01-03 20:35:48')
+    assert parser('03.01.2018 20:35:49') == parse('2018-01-03 20:35:49')
+    assert parser('04.01.2018 00:00:00') == parse('2018-01-04 00:00:00')
+    assert len(parser.dates) == 2
+    parser('05.01.2018 00:00:00')
+    assert len(parser.dates) == 1
+
+def testInvalidTimestamp():
+    with pytest.raises(ValueError):
+        TimestampParser(TimestampParser.ISO)('not a date')
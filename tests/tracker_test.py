@@ -0,0 +1,84 @@
+from decimal import Decimal
+import os
+
+from dateutil.parser import parse
+
+import model
+from model import createEngine, createReaderEngine, ReadSession, Session
+from names import ORDER_TYPE_BUY, ORDER_TYPE_SELL
+from trading.order import Order
+from trading.portfolio import Portfolio
+from trading.position import Position
+from trading.trade import Trade
+
+BASIC_DATE = parse('2018-01-03 20:35:48')
+LATER_DATE = parse('2018-01-03 21:00:00')
+
+# verify that the displays are refreshed while an import holds the writer
+# connection, and that their writes are made once the import is committed
+def testDisplaysAreRefreshedDuringImport(tmpdir, monkeypatch):
+    # the GUI is imported without Kivy reading the arguments of the tests
+    os.environ.setdefault('KIVY_NO_ARGS', '1')
+    from tracker import TrackerApp
+
+    # a display waiting for the writer connection fails quickly
+    monkeypatch.setattr(model, 'WRITER_POOL_TIMEOUT', 1)
+    engine = createEngine('sqlite:///' + str(tmpdir.join('tracker.db')))
+    readerEngine = createReaderEngine(engine)
+    app = TrackerApp(databaseEngine=engine, databaseReaderEngine=readerEngine)
+    try:
+        session = Session()
+        portfolio = Portfolio.getOrCreate(session)
+        app.portfolioId = portfolio.id
+        portfolio.addOrders(
+                [_createOrder('order1', ORDER_TYPE_BUY, 'LTC', Decimal('2.0'))], session,
+                lambda **kwargs: None, lambda changes: None)
+        closedPosition = session.query(Order).get('order1').position
+        portfolio.closePosition(closedPosition)
+        # as closed before closed dates were recorded
+        closedPosition.closedDate = None
+        portfolio.addOrders([
+                _createOrder('order2', ORDER_TYPE_BUY, 'ETH', Decimal('1.0')),
+                _createOrder('order3', ORDER_TYPE_SELL, 'ETH', Decimal('1.0'), LATER_DATE)],
+                session, lambda **kwargs: None, lambda changes: None)
+        session.commit()
+        closedPositionId = closedPosition.id
+        offerPositionId = session.query(Order).get('order2').position.id
+        session.close()
+
+        offers = []
+        with app.importLock, engine.connect() as connection:
+            # an import writing to the database without having committed
+            transaction = connection.begin()
+            connection.execute(Position.__table__.update().values(offerScanState=None))
+            app._updatePositionData(lambda **kwargs: None)
+            app._createClosedPositionOffers(
+                    lambda **kwargs: None, lambda: offers.extend(app.closedPositionOffers))
+            assert len(app.queuedWrites) == 2
+            transaction.rollback()
+        app._writeQueued()
+
+        assert [offer['numOrders'] for offer in offers] == [2]
+        session = Session()
+        assert session.query(Position).get(closedPositionId).closedDate == BASIC_DATE
+        assert session.query(Position).get(offerPositionId).offerScanState['numOrders'] == 2
+        session.close()
+    finally:
+        Session.configure(bind=model.engine)
+        ReadSession.configure(bind=model.readerEngine)
+        readerEngine.dispose()
+        engine.dispose()
+
+def _createOrder(orderId, orderType, currency, quantity, date=BASIC_DATE):
+    return Order(Trade(
+            id=orderId,
+            orderId=orderId,
+            closedDate=date,
+            exchange="exchange1",
+            orderType=orderType,
+            currency=currency,
+            baseCurrency='BTC',
+            quantity=quantity,
+            subtotal=quantity * Decimal('0.1'),
+            currencyFee=Decimal('0.0'),
+            baseFee=Decimal('0.0')))
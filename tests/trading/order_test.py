@@ -1,9 +1,11 @@
 from decimal import Decimal
+import pickle
 
 from dateutil.parser import parse
+import pytest
 
 from names import ORDER_TYPE_BUY
-from trading.order import Order
+from trading.order import Order, OrderRecord, roundAmount, SqliteFixedPoint
 from trading.trade import Trade
 
 EARLIER_DATE = parse('2017-12-20 22:33:44')
@@ -49,6 +51,64 @@ def testReplaceTotals():
 
     assert order == expectedOrder
 
+def testOrderRecord():
+    record = OrderRecord(_createBasicOrder())
+    record.addTrade(_createBasicTrade(LATER_DATE))
+    expectedOrder = _createBasicOrder()
+    expectedOrder.addTrade(_createBasicTrade(LATER_DATE))
+
+    assert record == expectedOrder
+    assert Order(record) == expectedOrder
+    assert pickle.loads(pickle.dumps(record)) == record
+    assert not hasattr(record, '__dict__')
+
+def testFixedPointRoundTrip():
+    columnType = SqliteFixedPoint(scale=8)
+    for value in (
+            Decimal('0'), Decimal('-50.5'), Decimal('0.00000001'), Decimal('123456789.12345678')):
+        storedValue = columnType.process_bind_param(value, None)
+        assert isinstance(storedValue, int)
+        assert columnType.process_result_value(storedValue, None) == value
+    assert columnType.process_bind_param(None, None) is None
+
+# verify that amounts are only stored exactly and within range
+def testFixedPointRejectsAmountsNotHeldExactly():
+    columnType = SqliteFixedPoint(scale=8)
+    largest = Decimal('92233720368.54775807')
+
+    assert columnType.process_bind_param(largest, None) == 2 ** 63 - 1
+    assert columnType.process_bind_param(-largest, None) == -(2 ** 63 - 1)
+    assert columnType.process_bind_param(Decimal('1.500000000'), None) == 150000000
+    # floats are read by their shortest representation, as parsed from JSON
+    assert columnType.process_bind_param(0.1, None) == 10000000
+    tooPrecise = (Decimal('9.9942799528'), 1e-9, Decimal('NaN'))
+    tooLarge = (largest + Decimal('0.00000001'), Decimal('1E+11'))
+    for value in tooPrecise + tooLarge:
+        with pytest.raises(ValueError):
+            columnType.process_bind_param(value, None)
+
+def testRoundAmount():
+    assert roundAmount(Decimal('9.9942799528')) == Decimal('9.99427995')
+    # half to even
+    assert roundAmount(Decimal('0.000000005')) == 0
+    assert roundAmount(Decimal('-0.000000015')) == Decimal('-0.00000002')
+    assert str(roundAmount(Decimal('1.50'))) == '1.50'
+    assert roundAmount(1e-9) == 0
+
+# verify that amounts calculated with more places than are stored are
+# rounded when an order is created, so that it can be stored
+def testOrderAmountsAreRounded():
+    trade = _createBasicTrade(BASIC_DATE)
+    trade.subtotal = Decimal('9.9942799528')
+    trade.recalculateNetAmounts()
+
+    order = Order(trade)
+
+    assert order.subtotal == Decimal('9.99427995')
+    assert order.netBase == Decimal('-9.99427995') - trade.baseFee
+    assert order.storedTotals() == order.totals()
+    assert OrderRecord(trade).storedTotals()['subtotal'] == Decimal('9.99427995')
+
 def _createBasicOrder():
     trade = Trade(
             id='trade1',
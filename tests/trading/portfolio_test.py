@@ -0,0 +1,354 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from dateutil.parser import parse
+import pytest
+from sqlalchemy.exc import StatementError
+from sqlalchemy.orm import Session
+
+from names import ORDER_TYPE_BUY, ORDER_TYPE_SELL
+from trading.order import calculateFingerprint, Order, OrderRecord
+from trading.portfolio import Portfolio
+from trading.portfolio_changes import PortfolioChanges
+from trading.position import Position
+from trading.trade import Trade
+
+EXCHANGE = "exchange1"
+EARLIER_DATE = parse('2017-12-20 22:33:44')
+BASIC_DATE = parse('2018-01-03 20:35:48')
+LATER_DATE = parse('2018-01-03 21:00:00')
+LAST_DATE = parse('2018-01-04 09:00:00')
+
+def testAddOrders(prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+
+    _addOrders(portfolio, session, [
+            _createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.0')),
+            _createOrder('order2', ORDER_TYPE_SELL, 'ETH', Decimal('0.5')),
+            _createOrder('order3', ORDER_TYPE_BUY, 'LTC', Decimal('2.0'))])
+
+    assert session.query(Order).count() == 3
+    assert session.query(Position).filter(Position.isOpen == True).count() == 2
+    position = session.query(Order).get('order1').position
+    assert sorted(position.getOrderIds()) == ['order1', 'order2']
+    assert position.currencyProfitLoss() == Decimal('0.5')
+
+# verify that an amount beyond the range of the fixed-point columns is
+# reported rather than stored inexactly, and that nothing is stored
+def testAddOrdersBeyondStoredRange(prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+
+    with pytest.raises(StatementError, match="beyond the largest amount"):
+        _addOrders(portfolio, session, [
+                _createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.0')),
+                _createOrder('order2', ORDER_TYPE_BUY, 'SHIB', Decimal('1E+11'))])
+    session.rollback()
+
+    assert session.query(Order).count() == 0
+
+# verify that a re-import skips unchanged orders, replaces the totals
+# of changed orders and adds new orders to the existing positions
+def testReimportOrders(prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    _addOrders(portfolio, session, [
+            _createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.0')),
+            _createOrder('order2', ORDER_TYPE_SELL, 'ETH', Decimal('0.5'))])
+    changedOrder = _createOrder('order2', ORDER_TYPE_SELL, 'ETH', Decimal('0.75'), LATER_DATE)
+
+    changes = _addOrders(portfolio, session, [
+            _createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.0')),
+            changedOrder,
+            _createOrder('order3', ORDER_TYPE_BUY, 'ETH', Decimal('2.0'))])
+
+    assert session.query(Order).count() == 3
+    assert session.query(Position).count() == 1
+    storedOrder = session.query(Order).get('order2')
+    assert changes.insertedOrderIds == {'order3'}
+    assert changes.updatedOrderIds == {'order2'}
+    assert changes.positionIds == {storedOrder.position.id}
+    assert storedOrder == changedOrder
+    assert storedOrder.position.currencyProfitLoss() == Decimal('2.25')
+    assert storedOrder.position.hasConsistentTotals()
+
+# verify that parsed order records are inserted as Orders and update stored orders
+def testAddOrderRecords(prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    _addOrders(portfolio, session, [
+            OrderRecord(_createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.0'))),
+            OrderRecord(_createOrder('order2', ORDER_TYPE_SELL, 'ETH', Decimal('0.5')))])
+    changedOrder = OrderRecord(
+            _createOrder('order2', ORDER_TYPE_SELL, 'ETH', Decimal('0.75'), LATER_DATE))
+
+    changes = _addOrders(portfolio, session, [
+            OrderRecord(_createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.0'))),
+            changedOrder])
+
+    storedOrder = session.query(Order).get('order2')
+    assert session.query(Order).count() == 2
+    assert changes.insertedOrderIds == set()
+    assert changes.updatedOrderIds == {'order2'}
+    assert storedOrder == changedOrder
+    assert storedOrder.position.hasConsistentTotals()
+
+# verify that stored orders are compared by their values where their fingerprints differ
+def testReimportComparesFingerprints(prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    _addOrders(portfolio, session, [
+            _createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.0')),
+            _createOrder('order2', ORDER_TYPE_SELL, 'ETH', Decimal('0.5'))])
+    session.query(Order).filter(Order.id == 'order2').update({'fingerprint': None})
+    session.commit()
+
+    changes = _addOrders(portfolio, session, [
+            _createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.00')),
+            _createOrder('order2', ORDER_TYPE_SELL, 'ETH', Decimal('0.5'))])
+    changedOrder = _createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('2.0'), LATER_DATE)
+    changedChanges = _addOrders(portfolio, session, [changedOrder])
+
+    assert changes.updatedOrderIds == set()
+    assert changedChanges.updatedOrderIds == {'order1'}
+    assert session.query(Order).get('order1').fingerprint == calculateFingerprint(changedOrder)
+
+# verify that orders added after a position is closed go into a new open position
+def testAddOrdersAfterClosePosition(prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    _addOrders(portfolio, session, [_createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.0'))])
+    closedPosition = session.query(Order).get('order1').position
+
+    portfolio.closePosition(closedPosition)
+    _addOrders(portfolio, session, [_createOrder('order2', ORDER_TYPE_BUY, 'ETH', Decimal('2.0'))])
+
+    openPosition = session.query(Order).get('order2').position
+    assert not closedPosition.isOpen
+    assert openPosition.isOpen
+    assert openPosition is not closedPosition
+    assert session.query(Position).filter(Position.isOpen == True).all() == [openPosition]
+
+# verify that a position loaded in another session is closed by id and
+# that closing a position which is not open is reported
+def testClosePositionOfAnotherSession(prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    _addOrders(portfolio, session, [_createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.0'))])
+    otherSession = Session(bind=session.get_bind())
+    position = otherSession.query(Order).get('order1').position
+
+    changes = PortfolioChanges()
+    portfolio.closePosition(position, changes)
+
+    assert not session.query(Position).get(position.id).isOpen
+    assert changes.positionIds == {position.id}
+    with pytest.raises(ValueError):
+        portfolio.closePosition(position)
+    otherSession.close()
+
+# verify that a position closed by another connection is not added to
+# by a session which resolved it before the other transaction committed
+def testOpenPositionsAreReloadedAfterCommit(prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    _addOrders(portfolio, session, [_createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.0'))])
+    position = session.query(Order).get('order1').position
+    session.execute(Position.__table__.update().values(isOpen=False))
+    session.commit()
+
+    _addOrders(portfolio, session, [_createOrder('order2', ORDER_TYPE_BUY, 'ETH', Decimal('2.0'))])
+
+    assert session.query(Order).get('order2').position is not position
+    assert sorted(position.getOrderIds()) == ['order1']
+
+def testMoveOrdersToNewClosedPosition(prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    _addOrders(portfolio, session, [
+            _createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.0')),
+            _createOrder('order2', ORDER_TYPE_SELL, 'ETH', Decimal('1.0'), LATER_DATE),
+            _createOrder('order3', ORDER_TYPE_BUY, 'ETH', Decimal('2.0'), LATER_DATE)])
+    position = session.query(Order).get('order1').position
+    ordersToMove = session.query(Order).filter(Order.id.in_(['order1', 'order2'])).all()
+
+    changes = PortfolioChanges()
+    closedPosition = portfolio.moveOrdersToNewClosedPosition(position, ordersToMove, changes)
+    session.commit()
+    _addOrders(portfolio, session, [_createOrder('order4', ORDER_TYPE_BUY, 'ETH', Decimal('1.0'))])
+
+    assert not closedPosition.isOpen
+    assert closedPosition.closedDate == LATER_DATE
+    assert sorted(closedPosition.getOrderIds()) == ['order1', 'order2']
+    assert sorted(position.getOrderIds()) == ['order3', 'order4']
+    assert changes.movedOrderIds == {'order1', 'order2'}
+    assert changes.positionIds == {position.id, closedPosition.id}
+
+def testPositionSummaries(prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    _addOrders(portfolio, session, [
+            _createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.0')),
+            _createOrder('order2', ORDER_TYPE_SELL, 'ETH', Decimal('0.5'), LATER_DATE),
+            _createOrder('order3', ORDER_TYPE_BUY, 'LTC', Decimal('2.0'))])
+    portfolio.closePosition(session.query(Order).get('order3').position)
+
+    summaries = portfolio.getPositionSummaries(session)
+
+    assert [(summary.currency, summary.isOpen) for summary in summaries] == [
+            ('ETH', True), ('LTC', False)]
+    for summary in summaries:
+        position = session.query(Position).get(summary.id)
+        assert summary.netCurrency == position.currencyProfitLoss()
+        assert summary.netBase == position.baseProfitLoss()
+        assert Position.profitPercent(summary.absoluteBuys, summary.absoluteSells) == (
+                position.baseProfitPercent())
+    assert summaries[0].absoluteBuys == Decimal('0.1')
+    assert summaries[0].absoluteSells == Decimal('0.05')
+    assert (summaries[0].firstOrderDate, summaries[0].lastOrderDate) == (BASIC_DATE, LATER_DATE)
+    assert summaries[0].numOrders == 2
+    assert summaries[1].closedDate == BASIC_DATE
+
+# verify that only orders added since the last scan are searched for sequences with a
+# net currency of zero and that sequences need not start at the first order
+# verify that offers which are not accepted are made again, without the
+# offers overlapping them, until their orders are moved
+def testClosedPositionOffers(prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    _addOrders(portfolio, session, [
+            _createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.0'), EARLIER_DATE),
+            _createOrder('order2', ORDER_TYPE_BUY, 'ETH', Decimal('1.0'), BASIC_DATE),
+            _createOrder('order3', ORDER_TYPE_SELL, 'ETH', Decimal('1.0'), LATER_DATE)])
+
+    offers = portfolio.createClosedPositionOffers()
+    session.commit()
+    # the sequence of the four orders overlaps the declined offer
+    _addOrders(portfolio, session, [
+            _createOrder('order4', ORDER_TYPE_SELL, 'ETH', Decimal('1.0'), LAST_DATE)])
+    laterOffers = portfolio.createClosedPositionOffers()
+    session.commit()
+
+    position = session.query(Order).get('order1').position
+    assert len(offers) == 1
+    assert (offers[0]['firstDate'], offers[0]['lastDate']) == (BASIC_DATE, LATER_DATE)
+    assert offers[0]['numOrders'] == 2
+    assert offers[0]['netBase'] == Decimal('0.0')
+    assert position.getOrderIdsBetween(offers[0]['startAfter'], offers[0]['end']) == [
+            'order2', 'order3']
+    assert laterOffers == offers
+
+    orderIds = position.getOrderIdsBetween(offers[0]['startAfter'], offers[0]['end'])
+    portfolio.moveOrdersToNewClosedPosition(
+            position, session.query(Order).filter(Order.id.in_(orderIds)).all())
+    session.commit()
+    remainingOffers = portfolio.createClosedPositionOffers()
+
+    assert [offer['numOrders'] for offer in remainingOffers] == [2]
+    assert sorted(position.getOrderIdsBetween(
+            remainingOffers[0]['startAfter'], remainingOffers[0]['end'])) == ['order1', 'order4']
+
+# verify that sequences overlapping an earlier offer of the same scan are
+# left out, so that no order can be moved by two accepted offers
+def testOverlappingClosedPositionOffers(prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    orderTypes = (
+            ORDER_TYPE_BUY, ORDER_TYPE_SELL, ORDER_TYPE_BUY, ORDER_TYPE_SELL, ORDER_TYPE_SELL)
+    _addOrders(portfolio, session, [
+            _createOrder(
+                    'order{}'.format(i), orderType, 'ETH', Decimal('1.0'),
+                    BASIC_DATE + timedelta(minutes=i))
+            for i, orderType in enumerate(orderTypes)])
+
+    offers = portfolio.createClosedPositionOffers()
+
+    position = session.query(Order).get('order0').position
+    # order1 to order2 and order2 to order3 also have a net currency of zero
+    assert [position.getOrderIdsBetween(offer['startAfter'], offer['end']) for offer in offers] == [
+            ['order0', 'order1'], ['order2', 'order3']]
+
+# verify that an order older than the last scanned order causes a full scan
+def testClosedPositionOffersRescan(prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    _addOrders(portfolio, session, [
+            _createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.0'), LATER_DATE)])
+    assert portfolio.createClosedPositionOffers() == []
+    session.commit()
+
+    _addOrders(portfolio, session, [
+            _createOrder('order2', ORDER_TYPE_SELL, 'ETH', Decimal('1.0'), BASIC_DATE)])
+    offers = portfolio.createClosedPositionOffers()
+
+    assert [offer['numOrders'] for offer in offers] == [2]
+    assert offers[0]['firstDate'] == BASIC_DATE
+
+# verify that the offer scan state of a position of many orders stays small
+# while sequences starting at recently reached net currencies and at zero are found
+def testClosedPositionOffersOfManyOrders(prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    numOrders = 3 * Position.MAX_OFFER_STARTS
+    dates = [BASIC_DATE + timedelta(minutes=i) for i in range(numOrders + 3)]
+    _addOrders(portfolio, session, [
+            _createOrder('order{}'.format(i), ORDER_TYPE_BUY, 'ETH', Decimal('1.0'), dates[i])
+            for i in range(numOrders)])
+    assert portfolio.createClosedPositionOffers() == []
+    session.commit()
+
+    _addOrders(portfolio, session, [
+            _createOrder('sell1', ORDER_TYPE_SELL, 'ETH', Decimal('1.0'), dates[numOrders]),
+            _createOrder(
+                    'sell2', ORDER_TYPE_SELL, 'ETH', Decimal(numOrders - 1), dates[numOrders + 1]),
+            _createOrder('buy', ORDER_TYPE_BUY, 'ETH', Decimal('1.0'), dates[numOrders + 2])])
+    offers = portfolio.createClosedPositionOffers()
+
+    # the net currency of 1 after the first order was reached too long ago to be kept,
+    # and the sequence of every order overlaps the offer
+    assert [offer['numOrders'] for offer in offers] == [2]
+    position = session.query(Order).get('order0').position
+    assert len(position.offerScanState['reached']) == Position.MAX_OFFER_STARTS
+    assert Decimal(0) in position.offerScanState['reached']
+
+# verify that offer scans made in a read-only session are saved unless orders were added meanwhile
+def testSaveOfferScanChanges(prepareDatabase):
+    session = prepareDatabase['session']
+    portfolio = prepareDatabase['wallet'].portfolio
+    _addOrders(portfolio, session, [
+            _createOrder('order1', ORDER_TYPE_BUY, 'ETH', Decimal('1.0'), LATER_DATE),
+            _createOrder('order2', ORDER_TYPE_BUY, 'LTC', Decimal('1.0'), LATER_DATE)])
+
+    scanSession = Session(bind=session.bind, autoflush=False)
+    assert scanSession.query(Portfolio).get(portfolio.id).createClosedPositionOffers() == []
+    scanChanges = Portfolio.getOfferScanChanges(scanSession)
+    scanSession.close()
+    _addOrders(portfolio, session, [
+            _createOrder('order3', ORDER_TYPE_SELL, 'ETH', Decimal('1.0'), BASIC_DATE)])
+    Portfolio.saveOfferScanChanges(session, scanChanges)
+    session.commit()
+
+    assert len(scanChanges) == 2
+    assert session.query(Order).get('order1').position.offerScanState is None
+    assert session.query(Order).get('order2').position.offerScanState['numOrders'] == 1
+    assert [offer['numOrders'] for offer in portfolio.createClosedPositionOffers()] == [2]
+
+def _addOrders(portfolio, session, orders):
+    results = []
+    portfolio.addOrders(orders, session, lambda **kwargs: None, results.append)
+    return results[0]
+
+def _createOrder(orderId, orderType, currency, quantity, date=BASIC_DATE):
+    return Order(Trade(
+            id=orderId,
+            orderId=orderId,
+            closedDate=date,
+            exchange=EXCHANGE,
+            orderType=orderType,
+            currency=currency,
+            baseCurrency='BTC',
+            quantity=quantity,
+            subtotal=quantity * Decimal('0.1'),
+            currencyFee=Decimal('0.0'),
+            baseFee=Decimal('0.0')))
@@ -50,13 +50,47 @@ def testSellOnlyProfit(prepareDatabase):
 
     assert position.baseProfitPercent() == 0
 
+def testRunningTotals(prepareDatabase):
+    session = prepareDatabase['session']
+    wallet = prepareDatabase['wallet']
+    with session.no_autoflush:
+        position = Position(wallet, EXCHANGE, CURRENCY, BASE_CURRENCY)
+        buy = _createBasicBuyOrder(wallet, None, BASIC_DATE)
+        sell = _createProfitableSellOrder(wallet, None, LATER_DATE)
+        position.addOrder(buy)
+        position.addOrder(sell)
+        session.commit()
+
+        assert position.hasConsistentTotals()
+        assert position.absoluteBuys == abs(buy.netBase)
+        assert position.absoluteSells == abs(sell.netBase)
+
+        buy.replaceTotals(_createBasicBuyOrder(None, None, EARLIER_DATE, Decimal('2.0')))
+        assert position.hasConsistentTotals()
+
+        otherPosition = Position(wallet, EXCHANGE, CURRENCY, BASE_CURRENCY)
+        otherPosition.isOpen = False
+        position.removeOrder(sell)
+        otherPosition.addOrder(sell)
+        session.commit()
+        assert position.hasConsistentTotals()
+        assert otherPosition.hasConsistentTotals()
+        assert position.currencyProfitLoss() == buy.netCurrency
+        assert position.baseProfitLoss() == buy.netBase
+        assert position.absoluteSells == 0
+
+        position.netBase = 0
+        assert not position.hasConsistentTotals()
+        position.recalculateTotals()
+        assert position.hasConsistentTotals()
+
 def _createBasicPosition(wallet):
     position = Position(wallet, EXCHANGE, CURRENCY, BASE_CURRENCY)
     position.addOrder(_createBasicBuyOrder(wallet, position, BASIC_DATE))
     position.addOrder(_createProfitableSellOrder(wallet, position, LATER_DATE))
     return position
 
-def _createBasicBuyOrder(wallet, position, date):
+def _createBasicBuyOrder(wallet, position, date, quantity=Decimal('1.0')):
     order = Order(Trade(
             id='trade1',
             orderId='order1',
@@ -65,7 +99,7 @@ def _createBasicBuyOrder(wallet, position, date):
             orderType=ORDER_TYPE_BUY,
             currency=CURRENCY,
             baseCurrency=BASE_CURRENCY,
-            quantity=Decimal('1.0'),
+            quantity=quantity,
             subtotal=Decimal('50.0'),
             currencyFee=Decimal('0.01'),
             baseFee=Decimal('0.5')))
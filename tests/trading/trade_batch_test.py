@@ -0,0 +1,72 @@
+from itertools import islice
+import math
+
+import pytest
+
+from benchmarks.history_generator import FORMATS, generateFills
+from mapper import Mapper
+from parsers.bittrex_parser import BittrexParser
+from parsers.kraken_parser import KrakenParser
+from parsers.poloniex_parser import PoloniexParser
+from trading.trade_batch import ATTRIBUTES
+
+pytest.importorskip('numpy')
+
+PARSERS = {'bittrex': BittrexParser, 'kraken': KrakenParser, 'poloniex': PoloniexParser}
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Record the batches mapped from records, None where trades are mapped one at a time."""
+
+    batches = []
+    mapRecordsToBatch = Mapper.mapRecordsToBatch
+
+    def recordBatch(records, mappingKey):
+        batches.append(mapRecordsToBatch(records, mappingKey))
+        return batches[-1]
+
+    monkeypatch.setattr(Mapper, 'mapRecordsToBatch', recordBatch)
+    return batches
+
+def parseBothWays(parser, lines):
+    orders = list(parser.parseOrders(lines, lambda **kwargs: None))
+    expectedOrders = list(parser.ordersFromTrades(parser.parseTrades(lines, lambda **kwargs: None)))
+    assert len(orders) == len(expectedOrders)
+    for order, expectedOrder in zip(orders, expectedOrders):
+        # values are compared by their representations, which include the exponents of Decimals
+        assert [repr(getattr(order, attribute)) for attribute in ATTRIBUTES[1:]] == [
+                repr(getattr(expectedOrder, attribute)) for attribute in ATTRIBUTES[1:]]
+        assert order.id == expectedOrder.id
+    return orders
+
+# verify that orders folded in batches, including orders with trades
+# in several batches, are the same as orders built from Trade objects
+@pytest.mark.parametrize('historyFormat', sorted(PARSERS))
+def testSameOrdersAsTrades(historyFormat, batches, monkeypatch):
+    _, formatLine, _, maxFillsPerOrder = FORMATS[historyFormat]
+    numFills = 300
+    batchSize = 7
+    fills = islice(generateFills(1, maxFillsPerOrder), numFills)
+    lines = [formatLine(fill) for fill in fills] + ['\n']
+    parser = PARSERS[historyFormat]
+    monkeypatch.setattr(parser, 'BATCH_SIZE', batchSize)
+
+    parseBothWays(parser, lines)
+
+    # the blank line at the end is not a record
+    assert len(batches) == math.ceil(numFills / batchSize)
+    assert None not in batches
+
+def testAmountsNotHeldExactlyAreParsedOneAtATime(batches):
+    lines = (
+            '2018-01-03 20:35:48,ETH/BTC,Exchange,Buy,0.05,1.0,0.05,0.25%,123,-0.05,0.9975\n',
+            '2018-01-03 20:36:00,ETH/BTC,Exchange,Buy,0.05,2E+1,1.0,0.25%,123,-1.0,19.95\n')
+    longLine = (
+            '2018-01-04 10:00:00,LTC/BTC,Exchange,Sell,0.01,12345678901.123456789,0.03,0.25%,'
+            '456,0.0299,-3.0\n')
+
+    orders = parseBothWays(PoloniexParser, lines)
+    parseBothWays(PoloniexParser, (longLine,))
+
+    assert batches == [None, None]
+    assert str(orders[0].quantity) == '21.0'
@@ -0,0 +1,42 @@
+from ui.order_rows import OrderRows
+
+HEADER = ['date', 'id']
+
+def _row(date, orderId):
+    return (date, orderId), ['{} {}'.format(date, orderId), orderId]
+
+def _replaceAll(rows):
+    return OrderRows(len(HEADER)).replaceAll(HEADER, list(rows))
+
+def testReplaceAll():
+    orderRows = OrderRows(len(HEADER))
+
+    data = orderRows.replaceAll(HEADER, [_row(2, 'b'), _row(1, 'a'), _row(3, 'c')])
+
+    assert data == HEADER + ['1 a', 'a', '2 b', 'b', '3 c', 'c']
+    assert orderRows.keys == [(1, 'a'), (2, 'b'), (3, 'c')]
+    assert orderRows.keysById['b'] == (2, 'b')
+
+# verify that replacing the rows of some orders gives the data of replacing every row
+def testReplaceOrders():
+    rows = [_row(date, orderId) for date, orderId in enumerate('abcdefgh')]
+    orderRows = OrderRows(len(HEADER))
+    data = orderRows.replaceAll(HEADER, list(rows))
+
+    # b is moved to the end, e changed in place, g removed and i inserted before a
+    changedRows = [_row(9, 'b'), (rows[4][0], ['changed', 'e']), _row(-1, 'i')]
+    orderRows.replace(data, changedRows, ['b', 'e', 'g', 'i'])
+
+    expectedRows = [row for row in rows if row[0][1] not in 'beg'] + changedRows
+    assert data == _replaceAll(expectedRows)
+    assert orderRows.keys == sorted(key for key, _ in expectedRows)
+    assert set(orderRows.keysById) == set('acdefhbi')
+
+def testReplaceOrdersAtEnd():
+    rows = [_row(date, orderId) for date, orderId in enumerate('abc')]
+    orderRows = OrderRows(len(HEADER))
+    data = orderRows.replaceAll(HEADER, list(rows))
+
+    orderRows.replace(data, [_row(5, 'd')], ['c', 'd'])
+
+    assert data == _replaceAll(rows[:2] + [_row(5, 'd')])
@@ -0,0 +1,60 @@
+from ui.position_list_item import PositionListItem
+from ui.position_lists import PositionLists
+from ui.sorted_widget_list import SortedWidgetList
+
+class _Layout():
+    # children of a layout are stored in reverse order of display
+    def __init__(self):
+        self.children = []
+
+    def add_widget(self, widget, index=0):
+        self.children.insert(index, widget)
+
+    def remove_widget(self, widget):
+        self.children.remove(widget)
+
+    def clear_widgets(self):
+        self.children = []
+
+    def displayed(self):
+        return list(reversed(self.children))
+
+def _createLists():
+    openLayout = _Layout()
+    closedLayout = _Layout()
+    positionLists = PositionLists(
+            SortedWidgetList(openLayout), SortedWidgetList(closedLayout),
+            lambda item: item.text, 'header')
+    return positionLists, openLayout, closedLayout
+
+def _openItem(positionId, currency):
+    return PositionListItem(
+            uiClass='button', text=currency, id=positionId, key=('X', 'BTC', currency))
+
+def _closedItem(positionId, currency, age):
+    return PositionListItem(
+            uiClass='button', text='{} {}'.format(currency, age), id=positionId,
+            key=('X', 'BTC', currency, age, positionId))
+
+def testReplaceAll():
+    positionLists, openLayout, closedLayout = _createLists()
+
+    positionLists.replace(
+            [_openItem(1, 'LTC'), _openItem(2, 'ETH')],
+            [_closedItem(3, 'ETH', 2), _closedItem(4, 'ETH', 1), _closedItem(5, 'LTC', 1)])
+
+    assert openLayout.displayed() == ['ETH', 'LTC']
+    assert closedLayout.displayed() == [
+            'X', '    BTC', '        ETH', 'ETH 1', 'ETH 2', '        LTC', 'LTC 1']
+
+# verify that closing a position moves it between the lists
+# and that headers left without positions are removed
+def testReplacePositions():
+    positionLists, openLayout, closedLayout = _createLists()
+    positionLists.replace([_openItem(1, 'LTC'), _openItem(2, 'ETH')], [_closedItem(3, 'ZEC', 1)])
+
+    positionLists.replace([_openItem(6, 'ETH')], [_closedItem(2, 'ETH', 1)], [2, 3, 6])
+
+    assert openLayout.displayed() == ['ETH', 'LTC']
+    assert closedLayout.displayed() == ['X', '    BTC', '        ETH', 'ETH 1']
+    assert sorted(positionLists.keysById) == [1, 2, 6]
@@ -0,0 +1,73 @@
+from datetime import datetime
+
+from dateutil.parser import parse
+
+def _parse24HourTime(text):
+    hour, minute, second = text.split(':')
+    return int(hour), int(minute), int(second)
+
+def _parse12HourTime(text):
+    time, period = text.split(' ')
+    hour, minute, second = time.split(':')
+    hour = int(hour)
+    period = period.upper()
+    if not 1 <= hour <= 12 or period not in ('AM', 'PM'):
+        raise ValueError("Invalid 12-hour time: {}".format(text))
+    return hour % 12 + (12 if period == 'PM' else 0), int(minute), int(second)
+
+# functions returning the hour, minute and second of a time, by strptime layout
+TIME_PARSERS = {
+        '%H:%M:%S': _parse24HourTime,
+        '%I:%M:%S %p': _parse12HourTime}
+
+class TimestampParser():
+    """Parse timestamps in the layouts of an exchange, falling back to dateutil for any other text.
+
+    Layouts are strptime formats with the date and time separated by a
+    space, or ISO for the ISO 8601 formats read by datetime.fromisoformat.
+    The date part of a layout is parsed once per distinct date, as history
+    records share dates, and common time layouts are parsed without strptime.
+    """
+
+    ISO = 'ISO 8601'
+    # number of distinct dates remembered
+    MAX_DATES = 4096
+
+    def __init__(self, *layouts):
+        self.layouts = layouts
+        self.dates = {}
+        self.parsers = tuple(self._createParser(layout) for layout in layouts)
+
+    def __call__(self, text):
+        for parser in self.parsers:
+            try:
+                timestamp = parser(text)
+            except ValueError:
+                continue
+            if parser is not self.parsers[0]:
+                # the next timestamp most likely has the same layout
+                self.parsers = (parser,) + tuple(p for p in self.parsers if p is not parser)
+            return timestamp
+        return parse(text)
+
+    def _createParser(self, layout):
+        if layout == self.ISO:
+            return datetime.fromisoformat
+        dateLayout, timeLayout = layout.split(' ', 1)
+        parseTime = TIME_PARSERS.get(timeLayout)
+        if parseTime is None:
+            def parseTime(text):
+                time = datetime.strptime(text, timeLayout)
+                return time.hour, time.minute, time.second, time.microsecond
+
+        def parseTimestamp(text):
+            dateText, timeText = text.split(' ', 1)
+            date = self.dates.get((dateLayout, dateText))
+            if date is None:
+                if len(self.dates) >= self.MAX_DATES:
+                    self.dates.clear()
+                date = datetime.strptime(dateText, dateLayout)
+                date = self.dates[(dateLayout, dateText)] = (date.year, date.month, date.day)
+            return datetime(*date, *parseTime(timeText))
+
+        return parseTimestamp
@@ -1,5 +1,7 @@
 """Main module for the trade tracker program."""
 
+from collections import deque
+from datetime import datetime
 import sys
 import threading
 
@@ -16,21 +18,31 @@ from kivy.uix.scrollview import ScrollView
 from kivy.uix.stacklayout import StackLayout
 from kivy.uix.tabbedpanel import TabbedPanel
 from kivy.uix.tabbedpanel import TabbedPanelItem
+from kivy.uix.togglebutton import ToggleButton
 
+from instrumentation import Instruments
 from keys import KEYS
-from model import Base, engine, Session
+from migration import migrate
+from model import createReaderEngine, engine, readerEngine, ReadSession, Session, sessionScope
 from parsers.history_parser_factory import HistoryParserFactory
-from pollers.bittrex_poller import BittrexPoller
-from pollers.gemini_poller import GeminiPoller
+from pollers.poller import Poller
+from pollers.poller_factory import PollerFactory
+from progress_reporter import ProgressReporter
 from trading.order import Order
 from trading.portfolio import Portfolio
+from trading.portfolio_changes import PortfolioChanges
 from trading.position import Position
 from ui.import_dialog import ImportDialog
 from ui.order_list_view import OrderListView, NUM_DISPLAY_COLUMNS
+from ui.order_rows import OrderRows
 from ui.position_list_item import PositionListItem
+from ui.position_lists import PositionLists
 from ui.position_order_list_dialog import PositionOrderListDialog
+from ui.sorted_widget_list import SortedWidgetList
 
 NUM_DECIMAL_PLACES = 8
+# subtracting dates from this gives sort keys placing recent dates first
+LATEST_DATE = datetime.max
 
 class TrackerApp(App):
     """Main GUI class created on startup. Allows the user to add and interact with order records."""
@@ -39,19 +51,34 @@ class TrackerApp(App):
             "Closed Date", "Exchange", "Type", "Currency", "Base", "Quantity",
             "Price", "Subtotal", "Net Currency", "Net Base"]
 
-    def __init__(self, **kwargs):
+    def __init__(self, databaseEngine=engine, databaseReaderEngine=None, **kwargs):
         super(TrackerApp, self).__init__(**kwargs)
-        Base.metadata.create_all(engine)
+        migrate(databaseEngine)
+        Session.configure(bind=databaseEngine)
+        if databaseReaderEngine is None and databaseEngine is engine:
+            databaseReaderEngine = readerEngine
+        elif databaseReaderEngine is None:
+            databaseReaderEngine = createReaderEngine(databaseEngine)
+        # displays are read through other connections, without waiting for imports to be committed
+        ReadSession.configure(bind=databaseReaderEngine)
 
         self.portfolioId = None
         self.ordersTable = None
+        self.orderRows = OrderRows(NUM_DISPLAY_COLUMNS)
         self.openPositionsTable = None
         self.closedPositionsTable = None
+        self.positionLists = None
         self.closedPositionOffers = []
         self.importDialog = None
         self.importProgressView = None
         self.progressBarLabel = None
         self.progressBar = None
+        # passed to worker threads, which may report progress for every record
+        self.progress = ProgressReporter(self.updateProgress)
+        self.fullResyncButton = None
+        self.importLock = threading.Lock()
+        # writes of the displays, made once running imports release the writer connection
+        self.queuedWrites = deque()
 
     @mainthread
     def _parseHistory(self, view, path):
@@ -59,101 +86,117 @@ class TrackerApp(App):
 
         view.dismiss()
         if len(path) > 0:
+            Instruments.reset()
             self.openImportProgressView()
             filename = path[0]
-            f = open(filename)
-            self.updateProgress(text="Parsing {}...".format(filename))
-            header = f.readline().strip()
-            parser = HistoryParserFactory.detectParser(header)
+            self.progress(text="Parsing {}...".format(filename))
+            parser, header = HistoryParserFactory.detectFileParser(filename)
             if parser:
-                lines = f.readlines()
                 threading.Thread(
-                        target=parser.parse,
+                        target=parser.parseHistoryFile,
                         kwargs={
-                                'lines': lines,
-                                'progressCallback': self.updateProgress,
+                                'path': filename,
+                                'progressCallback': self.progress,
                                 'callback': self.doneParseHistory
                         }).start()
             else:
                 Logger.warning("Parser: Unsupported history file '%s' with header: %s", filename, header)
-                self.updateProgress(text="Unsupported history file.")
-            f.close()
+                self.progress(text="Unsupported history file.")
 
     @mainthread
     def openImportProgressView(self):
         self.importProgressView.open()
 
     @mainthread
-    def updateProgress(self, text=None, value=None, maxValue=None):
-        """Called by worker threads to perform a status update in the GUI thread."""
+    def updateProgress(self, text, value, maxValue, throughput, remainingSeconds):
+        """Show the progress published by the progress reporter in the GUI thread."""
 
-        if text:
-            self.progressBarLabel.text = text
+        rate = ProgressReporter.describeRate(throughput, remainingSeconds)
+        self.progressBarLabel.text = "\n".join(line for line in (text, rate) if line)
         if maxValue and maxValue != self.progressBar.max:
             self.progressBar.max = maxValue
-        if value is not None:
-            self.progressBar.value = value
-        elif not value and not text and not maxValue:
-            self.progressBar.value += 1
+        self.progressBar.value = min(value, self.progressBar.max)
 
     @mainthread
-    def doneParseHistory(self, orders):
+    def doneParseHistory(self, orders, syncCursors=None, partialOrderIds=(), startCursors=None):
         """Start a background thread to add order objects to the database.
 
         Called by worker threads after orders have been parsed
         from a history file or retrieved from an exchange.
         """
 
-        self.updateProgress(text="Done parsing history.")
+        self.progress(text="Done parsing history.")
         threading.Thread(target=self._addParsedOrders, kwargs={
                 'orders': orders,
-                'progressCallback': self.updateProgress,
-                'callback': self.doneAddParsedOrders}).start()
-
-    def _addParsedOrders(self, orders, progressCallback, callback):
+                'progressCallback': self.progress,
+                'callback': self.doneAddParsedOrders,
+                'syncCursors': syncCursors,
+                'partialOrderIds': partialOrderIds,
+                'startCursors': startCursors}).start()
+
+    def _addParsedOrders(
+            self, orders, progressCallback, callback, syncCursors=None, partialOrderIds=(),
+            startCursors=None):
         """Add order objects to the database."""
 
-        session = Session()
-        self._currentPortfolio(session).addOrders(orders, session, progressCallback, callback)
-        session.close()
+        # orders of several exchanges may arrive at once when refreshing all exchanges
+        with self.importLock, sessionScope(Session) as session:
+            self._currentPortfolio(session).addOrders(
+                    orders, session, progressCallback, callback,
+                    syncCursors=syncCursors, partialOrderIds=partialOrderIds,
+                    startCursors=startCursors)
 
     @mainthread
-    def doneAddParsedOrders(self):
+    def doneAddParsedOrders(self, changes):
         """Start a background thread to perform post-import tasks.
 
         Called by worker threads after orders have been added to the database.
         """
 
         threading.Thread(target=self._updateAllDisplays, kwargs={
-                'progressCallback': self.updateProgress,
-                'callback': self.doneImport}).start()
+                'progressCallback': self.progress,
+                'callback': self.doneImport,
+                'changes': changes}).start()
+
+    def _updateAllDisplays(self, progressCallback, callback, changes=None):
+        """Refresh displayed portfolio data in the GUI.
 
-    def _updateAllDisplays(self, progressCallback, callback):
-        """Refresh all displayed portfolio data in the GUI."""
+        If changes are given, only the affected orders and positions are refreshed.
+        """
 
         self.openImportProgressView()
-        self._updateOrderData(progressCallback)
-        self._updateOpenPositionData(progressCallback)
-        self._updateClosedPositionData(progressCallback)
+        with Instruments.span('updateDisplays'):
+            if changes is None:
+                self._updateOrderData(progressCallback)
+                self._updatePositionData(progressCallback)
+            else:
+                self._updateOrderData(
+                        progressCallback, changes.insertedOrderIds | changes.updatedOrderIds)
+                self._updatePositionData(progressCallback, changes.positionIds)
         if callback:
             callback()
 
-    def _updateOrderData(self, progressCallback):
+    def _updateOrderData(self, progressCallback, orderIds=None):
         progressCallback(text='Updating order list...')
-        session = Session()
-        # save header
-        data = self.ordersTable.data[0:NUM_DISPLAY_COLUMNS]
-        orders = self._currentPortfolio(session).getOrders()
-        progressCallback(value=0, maxValue=len(orders))
-        for o in orders:
-            values = [
-                    str(o.closedDate).rsplit('.', 1)[0], o.exchange, o.orderType, o.currency,
-                    o.baseCurrency, self._format(o.quantity), self._format(o.averagePrice()),
-                    self._format(o.subtotal), self._format(o.netCurrency), self._format(o.netBase)]
-            data += [{'text': value, 'orderId': o.id} for value in values]
-            progressCallback()
-        session.close()
-        self._updateOrderList(data, progressCallback)
+        with Instruments.span('updateOrderData'), sessionScope(ReadSession) as session:
+            if orderIds is None:
+                orders = self._currentPortfolio(session).getOrders()
+            else:
+                orders = self._currentPortfolio(session).getOrdersById(session, orderIds)
+            rows = []
+            progressCallback(value=0, maxValue=len(orders))
+            for o in orders:
+                values = [
+                        str(o.closedDate).rsplit('.', 1)[0], o.exchange, o.orderType, o.currency,
+                        o.baseCurrency, self._format(o.quantity), self._format(o.averagePrice()),
+                        self._format(o.subtotal), self._format(o.netCurrency),
+                        self._format(o.netBase)]
+                # most recent orders first
+                key = (LATEST_DATE - o.closedDate, o.id)
+                rows.append((key, [{'text': value, 'orderId': o.id} for value in values]))
+                progressCallback()
+        Instruments.count('updateOrderData', len(rows))
+        self._updateOrderList(rows, orderIds, progressCallback)
 
     def _format(self, number, withSign=False):
         sign = ""
@@ -163,152 +206,153 @@ class TrackerApp(App):
                 number=number, sign=sign, precision=NUM_DECIMAL_PLACES)
 
     @mainthread
-    def _updateOrderList(self, data, progressCallback):
-        self.ordersTable.data = data
+    def _updateOrderList(self, rows, orderIds, progressCallback):
+        """Replace the rows of the order list, or only the rows of the given orders."""
+
+        with Instruments.span('updateOrderList', records=len(rows)):
+            if orderIds is None:
+                self.ordersTable.data = self.orderRows.replaceAll(
+                        self.ordersTable.data[:NUM_DISPLAY_COLUMNS], rows)
+            else:
+                self.orderRows.replace(self.ordersTable.data, rows, orderIds)
         progressCallback(text='Finished updating order list.')
 
-    def _updateOpenPositionData(self, progressCallback):
-        session = Session()
-        positions = self._currentPortfolio(session).getOpenPositions()
-        positionListItems = []
-        progressCallback(text='Updating open positions list...', value=0, maxValue=len(positions))
-        for position in positions:
-            netCurrency = position.currencyProfitLoss()
-            netBase = position.baseProfitLoss()
-            positionText = "{0} {1}/{2}: {3} {2}, {4} {1}\n".format(
-                    position.exchange, position.baseCurrency, position.currency,
-                    self._format(netCurrency, withSign=True), self._format(netBase, withSign=True))
-            if netCurrency > 0:
-                if netBase < 0:
-                    positionText += "sell above {} {}".format(
-                            self._format(abs(netBase / netCurrency)), position.baseCurrency)
+    def _updatePositionData(self, progressCallback, positionIds=None):
+        """Refresh both position lists, or only the given positions, from a single summary."""
+
+        with Instruments.span('updatePositionData'):
+            with sessionScope(ReadSession) as session:
+                summaries = self._currentPortfolio(session).getPositionSummaries(
+                        session, positionIds)
+            # positions closed before closed dates were recorded take the date of their last order
+            closedDates = [
+                    {'id': summary.id, 'closedDate': summary.lastOrderDate} for summary in summaries
+                    if not summary.isOpen and not summary.closedDate and summary.lastOrderDate]
+            if closedDates:
+                self._queueWrite(
+                        lambda session: session.bulk_update_mappings(Position, closedDates))
+            progressCallback(text='Updating positions lists...', value=0, maxValue=len(summaries))
+            openItems = []
+            closedItems = []
+            for summary in summaries:
+                if summary.isOpen:
+                    openItems.append(self._openPositionItem(summary))
                 else:
-                    positionText += "in profit"
-            elif netCurrency == 0:
-                if netBase < 0:
-                    positionText += "in loss"
-                elif netBase > 0:
-                    positionText += "in profit"
+                    closedItems.append(self._closedPositionItem(summary))
+                progressCallback()
+        Instruments.count('updatePositionData', len(summaries))
+        self._updatePositionLists(openItems, closedItems, positionIds, progressCallback)
+
+    def _openPositionItem(self, summary):
+        netCurrency = summary.netCurrency
+        netBase = summary.netBase
+        positionText = "{0} {1}/{2}: {3} {2}, {4} {1}\n".format(
+                summary.exchange, summary.baseCurrency, summary.currency,
+                self._format(netCurrency, withSign=True), self._format(netBase, withSign=True))
+        if netCurrency > 0:
+            if netBase < 0:
+                positionText += "sell above {} {}".format(
+                        self._format(abs(netBase / netCurrency)), summary.baseCurrency)
             else:
-                if netBase <= 0:
-                    positionText += "in loss"
-                else:
-                    positionText += "buy below {} {}".format(
-                            self._format(abs(netBase / netCurrency)), position.baseCurrency)
-            positionListItems.append(PositionListItem(uiClass=Button, text=positionText, id=position.id))
-            progressCallback()
-        session.close()
-        self._updatePositionList(self.openPositionsTable, positionListItems, progressCallback)
+                positionText += "in profit"
+        elif netCurrency == 0:
+            if netBase < 0:
+                positionText += "in loss"
+            elif netBase > 0:
+                positionText += "in profit"
+        else:
+            if netBase <= 0:
+                positionText += "in loss"
+            else:
+                positionText += "buy below {} {}".format(
+                        self._format(abs(netBase / netCurrency)), summary.baseCurrency)
+        return PositionListItem(
+                uiClass=Button, text=positionText, id=summary.id,
+                key=(summary.exchange, summary.baseCurrency, summary.currency))
+
+    def _closedPositionItem(self, summary):
+        closedDate = summary.closedDate or summary.lastOrderDate
+        if not closedDate:
+            Logger.error("Position %d has no orders.", summary.id)
+        positionText = "{}: {} {}, {} {} ({:+.2f}%)".format(
+                str(closedDate or "no date").rsplit('.')[0],
+                self._format(summary.netCurrency, withSign=True),
+                summary.currency, self._format(summary.netBase, withSign=True),
+                summary.baseCurrency,
+                Position.profitPercent(summary.absoluteBuys, summary.absoluteSells))
+        # grouped by market, most recently closed first
+        return PositionListItem(
+                uiClass=Button, text=positionText, id=summary.id,
+                key=(summary.exchange, summary.baseCurrency, summary.currency,
+                        LATEST_DATE - (closedDate or datetime.min), summary.id))
 
     @mainthread
-    def _updatePositionList(self, positionList, positionItems, progressCallback):
-        """Refresh a position list in the GUI."""
-
-        positionList.clear_widgets()
-        for item in positionItems:
-            uiItem = item.uiClass(text=item.text, halign='left', padding=(4, 4), size_hint_y=None)
-            if item.uiClass == Button:
-                uiItem.positionId = item.id
-                uiItem.bind(on_release=self._editPosition)
-            uiItem.bind(texture_size=uiItem.setter('size'))
-            uiItem.bind(width=self._setTextWidth)
-            positionList.add_widget(uiItem)
+    def _updatePositionLists(self, openItems, closedItems, positionIds, progressCallback):
+        """Replace the items of the position lists, or only the items of the given positions."""
+
+        with Instruments.span('updatePositionLists', records=len(openItems) + len(closedItems)):
+            self.positionLists.replace(openItems, closedItems, positionIds)
         progressCallback(text='Finished updating positions list.')
 
+    def _createPositionWidget(self, item):
+        uiItem = item.uiClass(text=item.text, halign='left', padding=(4, 4), size_hint_y=None)
+        if item.uiClass == Button:
+            uiItem.positionId = item.id
+            uiItem.bind(on_release=self._editPosition)
+        uiItem.bind(texture_size=uiItem.setter('size'))
+        uiItem.bind(width=self._setTextWidth)
+        return uiItem
+
     def _setTextWidth(self, instance, value):
         instance.text_size[0] = value
 
-    def _updateClosedPositionData(self, progressCallback):
-        session = Session()
-        positions = self._currentPortfolio(session).getClosedPositions(session)
-        positionItems = []
-        numPositions = positions.count()
-        progressCallback(text='Updating closed positions list...', value=0, maxValue=numPositions)
-        lastExchange = ""
-        lastBaseCurrency = ""
-        lastCurrency = ""
-        for position in positions:
-            if position.exchange != lastExchange:
-                positionItems.append(PositionListItem(uiClass=Label, text=position.exchange))
-                lastExchange = position.exchange
-            if position.baseCurrency != lastBaseCurrency:
-                positionItems.append(PositionListItem(uiClass=Label, text="    " + position.baseCurrency))
-                lastBaseCurrency = position.baseCurrency
-            if position.currency != lastCurrency:
-                positionItems.append(PositionListItem(uiClass=Label, text="        " + position.currency))
-                lastCurrency = position.currency
-
-            closedDate = position.closedDate
-            if not closedDate:
-                try:
-                    closedDate = (session.query(Order.closedDate)
-                            .filter(Order.position == position)
-                            .order_by(Order.closedDate.desc())
-                            .first()[0])
-                    position.closedDate = closedDate
-                except TypeError:
-                    Logger.error("Position %d has no orders.", position.id)
-                    closedDate = "no date"
-            netCurrency = position.currencyProfitLoss()
-            netBase = position.baseProfitLoss()
-            positionText = "{}: {} {}, {} {} ({:+.2f}%)".format(
-                    str(closedDate).rsplit('.')[0], self._format(netCurrency, withSign=True),
-                    position.currency, self._format(netBase, withSign=True),
-                    position.baseCurrency, position.baseProfitPercent())
-            positionItems.append(PositionListItem(uiClass=Button, text=positionText, id=position.id))
-            progressCallback()
-        session.commit()
-        session.close()
-        self._updatePositionList(self.closedPositionsTable, positionItems, progressCallback)
-
     @mainthread
     def doneImport(self):
         """Start a background thread to calculate positions that can be closed."""
 
         offerThread = threading.Thread(target=self._createClosedPositionOffers, kwargs={
-                'progressCallback': self.updateProgress,
+                'progressCallback': self.progress,
                 'callback': self.showNextOffer})
         offerThread.start()
 
     def _createClosedPositionOffers(self, progressCallback, callback):
         """Calculate positions that can be closed.
 
-        Determine if any consecutive sequence of orders from the beginning
-        of the position onwards results in a net currency of zero, indicating
+        Determine if any consecutive sequence of orders added since the
+        last calculation completes a net currency of zero, indicating
         that profit can be calculated on this group of orders.
         """
 
         progressCallback(text='Determining positions that can be closed...', value=0, maxValue=100)
-        session = Session()
-        offers = self._currentPortfolio(session).createClosedPositionOffers()
-        for offer in offers:
-            position = session.query(Position).get(offer['positionId'])
-            ordersToMove = (session.query(Order)
-                    .filter(Order.id.in_(offer['orderIds']))
-                    .order_by(Order.closedDate).all())
-            firstOrder = ordersToMove[0]
-            lastOrder = ordersToMove[-1]
-            offer['text1'] = "Close zero-net-currency position in {} {}/{} using {} orders?".format(
-                    position.exchange, position.baseCurrency,
-                    position.currency, len(offer['orderIds']))
-            offer['text2'] = "Open {}, close {}, profit {} {}".format(
-                    str(firstOrder.closedDate).rsplit('.')[0], lastOrder.closedDate,
-                    offer['netBase'], position.baseCurrency)
-            self.closedPositionOffers.append(offer)
-        session.close()
+        with sessionScope(ReadSession) as scanSession:
+            offers = self._currentPortfolio(scanSession).createClosedPositionOffers()
+            for offer in offers:
+                offer['text1'] = (
+                        "Close zero-net-currency position in {} {}/{} using {} orders?".format(
+                                offer['exchange'], offer['baseCurrency'], offer['currency'],
+                                offer['numOrders']))
+                offer['text2'] = "Open {}, close {}, profit {} {}".format(
+                        str(offer['firstDate']).rsplit('.')[0], offer['lastDate'],
+                        offer['netBase'], offer['baseCurrency'])
+            # offers which were not accepted are made again by every scan
+            self.closedPositionOffers = offers
+            # save the progress of the calculation
+            scanChanges = Portfolio.getOfferScanChanges(scanSession)
+        self._queueWrite(lambda session: Portfolio.saveOfferScanChanges(session, scanChanges))
+        # offers are the last stage of an import or refresh
+        Instruments.logReport()
         progressCallback(text='Done.')
         callback()
 
     @mainthread
-    def showNextOffer(self, view=None, lastPositionId=None, lastOrderIds=None):
+    def showNextOffer(self, view=None, lastOffer=None):
         """Display positions that can be closed fully or partially."""
 
         self.importProgressView.dismiss()
-        self.updateProgress(text="")
-        if lastPositionId and lastOrderIds:
-            threading.Thread(target=self._closePosition, kwargs={
-                    'positionId': lastPositionId,
-                    'orderIds': lastOrderIds,
+        self.progress(text="")
+        if lastOffer:
+            threading.Thread(target=self._acceptOffer, kwargs={
+                    'offer': lastOffer,
                     'callback': self.doneClosePosition}).start()
         if view:
             view.dismiss()
@@ -323,17 +367,11 @@ class TrackerApp(App):
                     size_hint=(0.5, 0.3)))
             layout.add_widget(Button(
                     text="Yes",
-                    on_release=lambda _: self.showNextOffer(
-                            view,
-                            offer['positionId'],
-                            offer['orderIds']),
+                    on_release=lambda _: self.showNextOffer(view, offer),
                     size_hint=(0.5, 0.3)))
             view = ModalView(auto_dismiss=False, size_hint=(0.8, 0.2))
             view.add_widget(layout)
             view.open()
-        else:
-            self._updateOpenPositionData(self.updateProgress)
-            self._updateClosedPositionData(self.updateProgress)
 
     def _editPosition(self, instance):
         """Display the order list for a position.
@@ -341,53 +379,94 @@ class TrackerApp(App):
         Selected orders can be used to fully or partially close an open position.
         """
 
-        session = Session()
         data = []
         for col, header in enumerate(self.HEADER_LABELS):
             data += [{'text': header, 'orderId': None, 'col': col}]
-        position = session.query(Position).get(instance.positionId)
-        for o in position.getOrders():
-            values = [
-                    str(o.closedDate).rsplit('.')[0], o.exchange, o.orderType, o.currency,
-                    o.baseCurrency, self._format(o.quantity), self._format(o.averagePrice()),
-                    self._format(o.subtotal), self._format(o.netCurrency), self._format(o.netBase)]
-            data += [{'text': value, 'orderId': o.id, 'col': col} for col, value in enumerate(values)]
-
-        view = PositionOrderListDialog(instance.positionId, position.isOpen, data, self._closePositionFromOrderList)
+        with sessionScope(ReadSession) as session:
+            position = session.query(Position).get(instance.positionId)
+            for o in position.getOrders():
+                values = [
+                        str(o.closedDate).rsplit('.')[0], o.exchange, o.orderType, o.currency,
+                        o.baseCurrency, self._format(o.quantity), self._format(o.averagePrice()),
+                        self._format(o.subtotal), self._format(o.netCurrency),
+                        self._format(o.netBase)]
+                data += [
+                        {'text': value, 'orderId': o.id, 'col': col}
+                        for col, value in enumerate(values)]
+            isOpen = position.isOpen
+
+        view = PositionOrderListDialog(
+                instance.positionId, isOpen, data, self._closePositionFromOrderList)
         view.open()
-        session.close()
+
+    def _queueWrite(self, write):
+        """Write to the database in a background thread, once running imports are committed.
+
+        Displays only read the database, so that they are not held up by an
+        import using the writer connection. write is called with a session.
+        """
+
+        self.queuedWrites.append(write)
+        threading.Thread(target=self._writeQueued).start()
+
+    def _writeQueued(self):
+        # imports hold the lock until they are committed
+        with self.importLock:
+            if not self.queuedWrites:
+                return
+            with sessionScope(Session) as session:
+                while self.queuedWrites:
+                    self.queuedWrites.popleft()(session)
+                session.commit()
 
     def _currentPortfolio(self, session):
         """Obtain the most recent portfolio from the database."""
 
         return session.query(Portfolio).get(self.portfolioId)
 
+    def _acceptOffer(self, offer, callback):
+        """Close the position using the orders of an offer if they still net zero currency."""
+
+        with sessionScope(ReadSession) as session:
+            position = session.query(Position).get(offer['positionId'])
+            orderIds = position.getOrderIdsBetween(offer['startAfter'], offer['end'])
+            netCurrency = sum(order.netCurrency for order in
+                    session.query(Order.netCurrency).filter(Order.id.in_(orderIds)))
+        # orders may have been moved by accepting an overlapping offer
+        if len(orderIds) == offer['numOrders'] and netCurrency == 0:
+            self._closePosition(offer['positionId'], orderIds, callback)
+        else:
+            Logger.warning("Offer to close position %d is no longer valid.", offer['positionId'])
+            callback(PortfolioChanges())
+
     def _closePosition(self, positionId, orderIds, callback):
         """Close the position using the selected orders.
 
         If not all orders in the position are selected, the selected orders
         will be moved to a new position which is immediately closed.
         """
-        session = Session()
-        position = session.query(Position).get(positionId)
-        ordersToMove = session.query(Order).filter(Order.id.in_(orderIds)).all()
-        closingWholePosition = sorted(orderIds) == sorted(position.getOrderIds())
-        if closingWholePosition:
-            self._currentPortfolio(session).closePosition(position)
-        else:
-            position = self._currentPortfolio(session).moveOrdersToNewClosedPosition(position, ordersToMove)
-        session.commit()
-        session.close()
+        changes = PortfolioChanges()
+        with sessionScope(Session) as session:
+            position = session.query(Position).get(positionId)
+            ordersToMove = session.query(Order).filter(Order.id.in_(orderIds)).all()
+            closingWholePosition = sorted(orderIds) == sorted(position.getOrderIds())
+            if closingWholePosition:
+                self._currentPortfolio(session).closePosition(position, changes)
+            else:
+                self._currentPortfolio(session).moveOrdersToNewClosedPosition(
+                        position, ordersToMove, changes)
+            session.commit()
 
-        callback()
+        callback(changes)
 
     @mainthread
-    def doneClosePosition(self):
-        """Start a background thread to refresh"""
+    def doneClosePosition(self, changes):
+        """Start a background thread to refresh the positions affected by closing a position."""
 
         threading.Thread(target=self._updateAllDisplays, kwargs={
-                'progressCallback': self.updateProgress,
-                'callback': self.importProgressView.dismiss}).start()
+                'progressCallback': self.progress,
+                'callback': self.importProgressView.dismiss,
+                'changes': changes}).start()
 
     def _closePositionFromOrderList(self, button):
         """Start a background thread to close the position."""
@@ -400,33 +479,50 @@ class TrackerApp(App):
                     'callback': self.doneClosePosition}).start()
             button.viewToDismiss.dismiss()
 
-    def _pollBittrex(self, _):
-        """Start a background thread to query the Bittrex API for order history."""
+    def _poll(self, names=None):
+        """Start a background thread to query exchange APIs for order history.
 
-        try:
-            key = KEYS['bittrex']['key']
-            secret = KEYS['bittrex']['secret']
-            bittrex = BittrexPoller(key, secret)
-            threading.Thread(target=bittrex.getOrders, kwargs={
-                    'progressCallback': self.updateProgress,
-                    'callback': self.doneParseHistory}).start()
-            self.openImportProgressView()
-        except:
-            Logger.error("Could not refresh from Bittrex. Check keys.py.")
-
-    def _pollGemini(self, _):
-        """Start a background thread to query the Gemini API for order history."""
-
-        try:
-            key = KEYS['gemini']['key']
-            secret = KEYS['gemini']['secret']
-            gemini = GeminiPoller(key, secret)
-            threading.Thread(target=gemini.getOrders, kwargs={
-                    'progressCallback': self.updateProgress,
-                    'callback': self.doneParseHistory}).start()
-            self.openImportProgressView()
-        except:
-            Logger.error("Could not refresh from Gemini. Check keys.py.")
+        Without names, all exchanges with API keys are queried at the same
+        time and the orders of each exchange are imported as they arrive.
+        """
+
+        pollers = PollerFactory.createPollers(KEYS, names)
+        if not pollers:
+            Logger.error("Could not refresh from exchanges. Check keys.py.")
+            return
+        Instruments.reset()
+        storedCursors = self._getSyncCursors(pollers)
+        syncCursors = storedCursors
+        if self.fullResyncButton.state == 'down':
+            self.fullResyncButton.state = 'normal'
+            syncCursors = {}
+        threading.Thread(target=Poller.refreshAll, kwargs={
+                'pollers': pollers,
+                'progressCallback': self.progress,
+                'callback': self.doneParseHistory,
+                'syncCursors': syncCursors,
+                'errorCallback': self.showRefreshError,
+                'storedCursors': storedCursors}).start()
+        self.openImportProgressView()
+
+    @mainthread
+    def showRefreshError(self, error):
+        """Tell that the orders of an exchange could not be retrieved, others may still arrive."""
+
+        Popup(
+                title='Refresh failed',
+                content=Label(text=str(error), text_size=(330, None)),
+                size_hint=(None, None),
+                size=(350, 200)).open()
+
+    def _getSyncCursors(self, pollers):
+        """Obtain the position of the last refresh from each exchange."""
+
+        with sessionScope(ReadSession) as session:
+            portfolio = self._currentPortfolio(session)
+            return {
+                    poller.EXCHANGE: portfolio.getSyncCursor(poller.EXCHANGE)
+                    for poller in pollers}
 
     def build(self):
         """Create the main GUI."""
@@ -437,15 +533,11 @@ class TrackerApp(App):
 
         self._createImportProgressView()
 
-        session = Session()
-        if session.query(Portfolio).count() < 1:
-            session.add(Portfolio())
-            session.commit()
-        self.portfolioId = session.query(Portfolio.id).first()
-        session.close()
+        with sessionScope(Session) as session:
+            self.portfolioId = Portfolio.getOrCreate(session).id
 
         threading.Thread(target=self._updateAllDisplays, kwargs={
-                'progressCallback': self.updateProgress,
+                'progressCallback': self.progress,
                 'callback': self.importProgressView.dismiss}).start()
 
         return layout
@@ -459,15 +551,23 @@ class TrackerApp(App):
         importButton.bind(on_release=self.importDialog.open)
 
         pollBittrexButton = Button(text='Refresh from Bittrex', size_hint_y=0.1)
-        pollBittrexButton.bind(on_release=self._pollBittrex)
+        pollBittrexButton.bind(on_release=lambda _: self._poll(['bittrex']))
 
         pollGeminiButton = Button(text='Refresh from Gemini', size_hint_y=0.1)
-        pollGeminiButton.bind(on_release=self._pollGemini)
+        pollGeminiButton.bind(on_release=lambda _: self._poll(['gemini']))
+
+        pollAllButton = Button(text='Refresh All', size_hint_y=0.1)
+        pollAllButton.bind(on_release=lambda _: self._poll())
+
+        # the next refresh retrieves all orders instead of only those added since the last refresh
+        self.fullResyncButton = ToggleButton(text='Full Resync', size_hint_y=0.1)
 
         leftPanel = BoxLayout(orientation='vertical', size_hint=(0.2, 1))
         leftPanel.add_widget(importButton)
         leftPanel.add_widget(pollBittrexButton)
         leftPanel.add_widget(pollGeminiButton)
+        leftPanel.add_widget(pollAllButton)
+        leftPanel.add_widget(self.fullResyncButton)
         leftPanel.add_widget(Label(size_hint_y=1))
         return leftPanel
 
@@ -508,6 +608,10 @@ class TrackerApp(App):
 
         self.closedPositionsTable = BoxLayout(orientation='vertical', size_hint=(1, None))
         self.closedPositionsTable.bind(minimum_height=self.closedPositionsTable.setter('height'))
+        self.positionLists = PositionLists(
+                SortedWidgetList(self.openPositionsTable),
+                SortedWidgetList(self.closedPositionsTable),
+                self._createPositionWidget, Label)
 
         closedPositionsTab = ScrollView(size_hint=(1, 1))
         closedPositionsTab.add_widget(self.closedPositionsTable)
@@ -525,4 +629,5 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         if sys.argv[1] == "debug":
             Logger.setLevel(LOG_LEVELS['debug'])
+            Instruments.enable()
     TrackerApp().run()
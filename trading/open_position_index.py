@@ -0,0 +1,54 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+
+from logger import Logger
+from trading.position import Position
+
+class OpenPositionIndex():
+    """Open positions of a session by market, loaded with a single query per session.
+
+    The index is kept in the session's info dictionary so that every wallet
+    taking part in an import resolves positions against the same state,
+    until the transaction ends. It must be updated whenever a position is
+    opened or closed.
+    """
+
+    SESSION_KEY = 'openPositionIndex'
+
+    def __init__(self, session):
+        self.positions = {}
+        for position in session.query(Position).filter(Position.isOpen == True):
+            if position.market() in self.positions:
+                Logger.error(
+                        "Multiple open positions in same market. "
+                        "Database constraint violated: %s %s/%s",
+                        position.exchange, position.baseCurrency, position.currency)
+                continue
+            self.positions[position.market()] = position
+
+    @classmethod
+    def forSession(cls, session):
+        if cls.SESSION_KEY not in session.info:
+            session.info[cls.SESSION_KEY] = cls(session)
+        return session.info[cls.SESSION_KEY]
+
+    def get(self, exchange, currency, baseCurrency):
+        return self.positions.get((exchange, currency, baseCurrency))
+
+    def add(self, position):
+        self.positions[position.market()] = position
+
+    def remove(self, position):
+        if self.positions.get(position.market()) is position:
+            del self.positions[position.market()]
+
+# positions opened or closed in a rolled back transaction are no longer valid
+@event.listens_for(OrmSession, 'after_soft_rollback')
+def _discardIndex(session, previousTransaction):
+    session.info.pop(OpenPositionIndex.SESSION_KEY, None)
+
+# other connections may open or close positions once a transaction ends,
+# so a session held open across transactions reloads the index
+@event.listens_for(OrmSession, 'after_commit')
+def _discardCommittedIndex(session):
+    session.info.pop(OpenPositionIndex.SESSION_KEY, None)
@@ -1,59 +1,100 @@
 from decimal import Decimal
+import hashlib
+import operator
 
-from sqlalchemy import Column, DateTime, ForeignKey, String, TypeDecorator, VARCHAR
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, TypeDecorator
 from sqlalchemy.orm import relationship
+from sqlalchemy.schema import Index
 
 from model import Base
 
-# adapted from https://stackoverflow.com/questions/10355767/how-should-i-handle-decimal-in-sqlalchemy-sqlite/10386911#10386911
-# store Python Decimal as a String to prevent loss of precision
-class SqliteNumeric(TypeDecorator):
-    impl = String
+# decimal places of stored amounts, down to the smallest unit of Bitcoin
+AMOUNT_PLACES = 8
 
-    def load_dialect_impl(self, dialect):
-        return dialect.type_descriptor(VARCHAR(100))
+def roundAmount(amount, places=AMOUNT_PLACES):
+    """Round an amount to the decimal places it is stored with, half to even.
+
+    Amounts can have more places than are stored, e.g. a subtotal calculated
+    as a price times a quantity. A float, as parsed from JSON, is read by its
+    shortest representation rather than by its binary value.
+    """
+
+    amount = Decimal(repr(amount)) if isinstance(amount, float) else Decimal(amount)
+    if amount.is_finite() and amount.as_tuple().exponent < -places:
+        return amount.quantize(Decimal(1).scaleb(-places))
+    return amount
+
+class SqliteFixedPoint(TypeDecorator):
+    """Python Decimals stored as integer numbers of 10^-scale units.
+
+    SQLite can then compare and sum the values without loss of precision.
+    Values are stored exactly or not at all: a value with more decimal
+    places than the scale, which should be rounded by roundAmount first,
+    or beyond the range of a 64-bit integer raises ValueError. At the
+    default scale of 8, amounts range up to about 9.2e10.
+    """
+
+    impl = Integer
+    # largest number of units held by an SQLite integer
+    MAX_UNITS = 2 ** 63 - 1
+
+    def __init__(self, scale=AMOUNT_PLACES):
+        super(SqliteFixedPoint, self).__init__()
+        self.scale = scale
 
     def process_bind_param(self, value, dialect):
-        return str(value)
+        if value is None:
+            return None
+        amount = Decimal(repr(value)) if isinstance(value, float) else Decimal(value)
+        units = amount.scaleb(self.scale)
+        if not units.is_finite() or units != units.to_integral_value():
+            raise ValueError("{} cannot be stored exactly with {} decimal places".format(
+                    value, self.scale))
+        if abs(units) > self.MAX_UNITS:
+            raise ValueError("{} is beyond the largest amount of {} that can be stored".format(
+                    value, Decimal(self.MAX_UNITS).scaleb(-self.scale)))
+        return int(units)
 
     def process_result_value(self, value, dialect):
-        return Decimal(value)
+        if value is None:
+            return None
+        return Decimal(value).scaleb(-self.scale)
 
-class Order(Base):
-    __tablename__ = 'orders'
+def calculateFingerprint(order):
+    """Hash the compared attributes of an order, or of a row of their columns, to a 64-bit integer.
 
-    id = Column(String, primary_key=True)
-    walletName = Column(String, ForeignKey('wallets.name'), nullable=False)
-    wallet = relationship("Wallet", back_populates="orders")
-    positionId = Column(String, ForeignKey('positions.id'), nullable=False)
-    position = relationship("Position", back_populates="orders")
-    closedDate = Column(DateTime, nullable=False)
-    exchange = Column(String, nullable=False)
-    orderType = Column(String, nullable=False)
-    currency = Column(String, nullable=False)
-    baseCurrency = Column(String, nullable=False)
-    quantity = Column(SqliteNumeric, nullable=False)
-    subtotal = Column(SqliteNumeric, nullable=False)
-    currencyFee = Column(SqliteNumeric)
-    baseFee = Column(SqliteNumeric)
-    netCurrency = Column(SqliteNumeric, nullable=False)
-    netBase = Column(SqliteNumeric, nullable=False)
+    Equal orders have the same fingerprint, e.g. with amounts of 1.0 and
+    1.00, and the fingerprint is the same in every process. Amounts are
+    compared as they are stored, so that an order matches its stored row.
+    """
 
-    def __init__(self, trade):
-        self.id = trade.orderId
-        self.walletName = None
-        self.position = None
-        self.closedDate = trade.closedDate
-        self.exchange = trade.exchange
-        self.orderType = trade.orderType
-        self.currency = trade.currency
-        self.baseCurrency = trade.baseCurrency
-        self.quantity = trade.quantity
-        self.subtotal = trade.subtotal
-        self.currencyFee = trade.currencyFee
-        self.baseFee = trade.baseFee
-        self.netCurrency = trade.netCurrency
-        self.netBase = trade.netBase
+    texts = list(map(str, _fingerprintTexts(order)))
+    texts.append(order.closedDate.isoformat())
+    # zero may be negative
+    texts.extend(
+            str(roundAmount(amount).normalize()) if amount else '0'
+            for amount in _fingerprintAmounts(order))
+    digest = hashlib.blake2b('\x1f'.join(texts).encode(), digest_size=8).digest()
+    # SQLite integers are signed
+    return int.from_bytes(digest, 'big', signed=True)
+
+class OrderValues():
+    """Totals and comparisons of an order, whether an Order in the database or an OrderRecord."""
+
+    __slots__ = ()
+
+    # attributes taken from an incoming order when it differs from the stored one
+    TOTAL_ATTRIBUTES = (
+            'closedDate', 'quantity', 'subtotal', 'currencyFee', 'baseFee', 'netCurrency',
+            'netBase')
+    # attributes compared to determine whether two orders are equal
+    COMPARED_ATTRIBUTES = (
+            ('id', 'exchange', 'orderType', 'currency', 'baseCurrency') + TOTAL_ATTRIBUTES)
+
+    @property
+    def orderId(self):
+        # an order can be created from another order, as from the first trade of an order
+        return self.id
 
     def addTrade(self, trade):
         self.closedDate = max(self.closedDate, trade.closedDate)
@@ -67,14 +108,17 @@ class Order(Base):
     def averagePrice(self):
         return self.subtotal / self.quantity
 
-    def replaceTotals(self, other):
-        self.closedDate = other.closedDate
-        self.quantity = other.quantity
-        self.subtotal = other.subtotal
-        self.currencyFee = other.currencyFee
-        self.baseFee = other.baseFee
-        self.netCurrency = other.netCurrency
-        self.netBase = other.netBase
+    def totals(self):
+        return {attribute: getattr(self, attribute) for attribute in self.TOTAL_ATTRIBUTES}
+
+    def storedTotals(self):
+        """Return the totals with amounts rounded to the decimal places they are stored with."""
+
+        totals = self.totals()
+        for attribute in self.TOTAL_ATTRIBUTES[1:]:
+            if totals[attribute] is not None:
+                totals[attribute] = roundAmount(totals[attribute])
+        return totals
 
     def __str__(self):
         return "{0} {1} {2} {3} at {4} {5}/{3} for {6} {5} on {7}".format(
@@ -95,3 +139,87 @@ class Order(Base):
                 and self.baseFee == other.baseFee
                 and self.netCurrency == other.netCurrency
                 and self.netBase == other.netBase)
+
+_fingerprintTexts = operator.attrgetter('id', 'exchange', 'orderType', 'currency', 'baseCurrency')
+_fingerprintAmounts = operator.attrgetter(*OrderValues.TOTAL_ATTRIBUTES[1:])
+
+class Order(OrderValues, Base):
+    __tablename__ = 'orders'
+
+    id = Column(String, primary_key=True)
+    walletName = Column(String, ForeignKey('wallets.name'), nullable=False)
+    wallet = relationship("Wallet", back_populates="orders")
+    positionId = Column(String, ForeignKey('positions.id'), nullable=False)
+    position = relationship("Position", back_populates="orders")
+    closedDate = Column(DateTime, nullable=False)
+    exchange = Column(String, nullable=False)
+    orderType = Column(String, nullable=False)
+    currency = Column(String, nullable=False)
+    baseCurrency = Column(String, nullable=False)
+    quantity = Column(SqliteFixedPoint, nullable=False)
+    subtotal = Column(SqliteFixedPoint, nullable=False)
+    currencyFee = Column(SqliteFixedPoint)
+    baseFee = Column(SqliteFixedPoint)
+    netCurrency = Column(SqliteFixedPoint, nullable=False)
+    netBase = Column(SqliteFixedPoint, nullable=False)
+    # calculateFingerprint of the order, set when it is inserted or its totals are replaced
+    fingerprint = Column(Integer)
+
+    # orders are looked up by id along with their fingerprints without reading the table
+    __table_args__ = (Index('order_fingerprints', id, fingerprint),)
+
+    def __init__(self, trade):
+        self.id = trade.orderId
+        self.walletName = None
+        self.position = None
+        self.exchange = trade.exchange
+        self.orderType = trade.orderType
+        self.currency = trade.currency
+        self.baseCurrency = trade.baseCurrency
+        # amounts calculated from prices may have more places than are stored
+        self._setTotals(trade)
+
+    def replaceTotals(self, other):
+        position = self.position
+        if position is not None:
+            position.updateTotals(self, sign=-1)
+        self._setTotals(other)
+        self.fingerprint = calculateFingerprint(self)
+        if position is not None:
+            position.updateTotals(self)
+
+    def _setTotals(self, other):
+        self.closedDate = other.closedDate
+        for attribute in self.TOTAL_ATTRIBUTES[1:]:
+            value = getattr(other, attribute)
+            setattr(self, attribute, value if value is None else roundAmount(value))
+
+    @classmethod
+    def comparedColumns(cls):
+        return [getattr(cls, attribute) for attribute in cls.COMPARED_ATTRIBUTES]
+
+class OrderRecord(OrderValues):
+    """An order parsed from a history file or polled from an exchange, before it joins a portfolio.
+
+    Unlike an Order, a record is not tracked by SQLAlchemy, so that orders
+    which are already stored cost no more than their values. An Order is
+    only created for a record which is inserted.
+    """
+
+    __slots__ = (
+            'id', 'closedDate', 'exchange', 'orderType', 'currency', 'baseCurrency',
+            'quantity', 'subtotal', 'currencyFee', 'baseFee', 'netCurrency', 'netBase')
+
+    def __init__(self, trade):
+        self.id = trade.orderId
+        self.closedDate = trade.closedDate
+        self.exchange = trade.exchange
+        self.orderType = trade.orderType
+        self.currency = trade.currency
+        self.baseCurrency = trade.baseCurrency
+        self.quantity = trade.quantity
+        self.subtotal = trade.subtotal
+        self.currencyFee = trade.currencyFee
+        self.baseFee = trade.baseFee
+        self.netCurrency = trade.netCurrency
+        self.netBase = trade.netBase
@@ -1,37 +1,158 @@
-from sqlalchemy import Column, Integer
-from sqlalchemy.orm import relationship
+from itertools import islice
 
+from sqlalchemy import and_, case, Column, func, inspect, Integer, or_, type_coerce
+from sqlalchemy.orm import object_session, relationship
+
+from instrumentation import Instruments
+from logger import Logger
 from model import Base, Session
-from trading.order import Order
+from names import ORDER_TYPE_BUY, ORDER_TYPE_SELL
+from trading.open_position_index import OpenPositionIndex
+from trading.order import calculateFingerprint, Order, SqliteFixedPoint
+from trading.portfolio_changes import PortfolioChanges
 from trading.position import Position
 from trading.wallet import Wallet
 
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+def _fixedPointSum(expression):
+    return type_coerce(func.coalesce(func.sum(expression), 0), SqliteFixedPoint())
+
 class Portfolio(Base):
     __tablename__ = 'portfolios'
+    # number of orders looked up per query, within SQLite's limit on bound parameters
+    CHUNK_SIZE = 500
 
     id = Column(Integer, primary_key=True)
     wallets = relationship("Wallet", back_populates="portfolio", lazy="dynamic")
 
-    def addOrders(self, orders, session, progressCallback, callback):
+    @classmethod
+    def getOrCreate(cls, session):
+        """Obtain the first portfolio in the database, creating it if there is none."""
+
+        portfolio = session.query(cls).order_by(cls.id).first()
+        if portfolio is None:
+            portfolio = cls()
+            session.add(portfolio)
+            session.commit()
+        return portfolio
+
+    def addOrders(
+            self, orders, session, progressCallback, callback, syncCursors=None, partialOrderIds=(),
+            startCursors=None):
+        """Insert new orders and update stored orders which have changed.
+
+        Orders are OrderRecords, as parsed or polled, or Orders. Only stored
+        orders with fingerprints other than those of the incoming orders are
+        read and compared, and they are updated without loading them as Orders.
+
+        syncCursors maps wallet names to the sync cursors of exchange pollers,
+        which are stored in the same commit as the orders. Orders in
+        partialOrderIds only contain trades retrieved after a sync cursor
+        and are added to the stored orders with the same id.
+
+        startCursors maps wallet names to the sync cursors which were stored
+        when the orders were polled. If a wallet's cursor changed since, as
+        orders of another refresh from the same cursor were added meanwhile,
+        the orders are discarded, since they may contain the same trades.
+        They are retrieved again by the next refresh.
+        """
+
         progressCallback(text="Adding orders to portfolio...", value=0, maxValue=len(orders))
-        for order in orders:
-            if order.exchange not in [wallet.name for wallet in self.wallets]:
-                wallet = Wallet(name=order.exchange, portfolio=self)
-                session.add(wallet)
-            else:
-                wallet = self.wallets.filter(Wallet.name == order.exchange, Wallet.portfolio == self).first()
-            existingOrder = session.query(Order).get(order.id)
-            if existingOrder:
-                # incoming order is newer
-                if not order == existingOrder:
-                    existingOrder.replaceTotals(order)
-            else:
-                wallet.addOrder(order, session)
-            progressCallback()
-        progressCallback(text="Committing changes to database")
-        session.commit()
+        changes = PortfolioChanges()
+        if startCursors and not self._lockStartCursors(session, startCursors):
+            session.rollback()
+            Logger.warning(
+                    "Discarded %d orders of a refresh of %s overtaken by another refresh",
+                    len(orders), ", ".join(sorted(startCursors)))
+            progressCallback(text="Discarded orders of an overtaken refresh")
+            callback(changes)
+            return
+        with Instruments.span('addOrders', records=len(orders)):
+            wallets = {wallet.name: wallet for wallet in self.wallets}
+            for chunk in _chunks(orders, self.CHUNK_SIZE):
+                with Instruments.span('addOrders.findExisting', records=len(chunk)):
+                    storedFingerprints = dict(session
+                            .query(Order.id, Order.fingerprint)
+                            .filter(Order.id.in_([order.id for order in chunk])))
+                    # stored orders with other fingerprints are read to be compared and updated
+                    changedIds = [
+                            order.id for order in chunk if order.id in storedFingerprints and (
+                                    order.id in partialOrderIds
+                                    or calculateFingerprint(order) != storedFingerprints[order.id])]
+                    existingOrders = {}
+                    if changedIds:
+                        existingOrders = {
+                                row.id: row for row in session
+                                .query(Order.positionId, *Order.comparedColumns())
+                                .filter(Order.id.in_(changedIds))}
+                newOrders = {}
+                changedTotals = []
+                for order in chunk:
+                    existingOrder = existingOrders.get(order.id)
+                    if existingOrder is not None and order.id in partialOrderIds:
+                        order.addTrade(existingOrder)
+                    if order.id not in storedFingerprints:
+                        # only orders which are inserted are tracked by SQLAlchemy
+                        newOrders.setdefault(order.exchange, []).append(
+                                order if isinstance(order, Order) else Order(order))
+                    elif existingOrder is not None and not order == existingOrder:
+                        # incoming order is newer
+                        changedTotals.append(dict(
+                                order.storedTotals(), id=order.id,
+                                fingerprint=calculateFingerprint(order)))
+                        position = session.query(Position).get(existingOrder.positionId)
+                        position.updateTotals(existingOrder, sign=-1)
+                        position.updateTotals(order)
+                        changes.updatedOrderIds.add(order.id)
+                        changes.positionIds.add(position.id)
+                    progressCallback()
+                for exchange, exchangeOrders in newOrders.items():
+                    if exchange not in wallets:
+                        wallets[exchange] = Wallet(name=exchange, portfolio=self)
+                        session.add(wallets[exchange])
+                    with Instruments.span('addOrders.insert', records=len(exchangeOrders)):
+                        wallets[exchange].addOrders(exchangeOrders, session)
+                    changes.insertedOrderIds.update(order.id for order in exchangeOrders)
+                    changes.positionIds.update(order.positionId for order in exchangeOrders)
+                with Instruments.span('addOrders.update', records=len(changedTotals)):
+                    session.bulk_update_mappings(Order, changedTotals)
+            for walletName, syncCursor in (syncCursors or {}).items():
+                if walletName not in wallets:
+                    wallets[walletName] = Wallet(name=walletName, portfolio=self)
+                    session.add(wallets[walletName])
+                wallets[walletName].syncCursor = syncCursor
+            progressCallback(text="Committing changes to database")
+            with Instruments.span('addOrders.commit'):
+                session.commit()
         progressCallback(text="Done adding orders to database")
-        callback()
+        callback(changes)
+
+    @staticmethod
+    def _lockStartCursors(session, startCursors):
+        """Check that the sync cursors of wallets are those a refresh started from.
+
+        The wallets are written first so that the check is made in the write
+        transaction, and no other connection can change the cursors before
+        it commits.
+        """
+
+        walletNames = list(startCursors)
+        (session
+                .query(Wallet)
+                .filter(Wallet.name.in_(walletNames))
+                .update({Wallet.syncCursor: Wallet.syncCursor}, synchronize_session=False))
+        storedCursors = dict(session
+                .query(Wallet.name, Wallet.syncCursor)
+                .filter(Wallet.name.in_(walletNames)))
+        return all(
+                storedCursors.get(walletName) == startCursor
+                for walletName, startCursor in startCursors.items())
 
     def getOrders(self):
         orders = []
@@ -40,6 +161,19 @@ class Portfolio(Base):
         orders.sort(key=lambda order: order.closedDate, reverse=True)
         return orders
 
+    def getOrdersById(self, session, orderIds):
+        orders = []
+        for chunk in _chunks(orderIds, self.CHUNK_SIZE):
+            orders += (session.query(Order)
+                    .filter(Order.id.in_(chunk))
+                    .filter(Order.wallet.has(Wallet.portfolio == self))
+                    .all())
+        return orders
+
+    def getSyncCursor(self, walletName):
+        wallet = self.wallets.filter(Wallet.name == walletName).first()
+        return wallet.syncCursor if wallet else None
+
     def getWallets(self):
         return self.wallets
 
@@ -68,17 +202,120 @@ class Portfolio(Base):
                         Position.closedDate.desc()
                 ))
 
-    def closePosition(self, position):
-        for wallet in self.wallets:
-            if position in wallet.getOpenPositions():
-                wallet.closePosition(position)
-                return
+    def getPositionSummaries(self, session, positionIds=None):
+        """Summarize the orders of every position in the portfolio with a single grouped query.
+
+        If positionIds is given, only those positions are summarized. Each
+        row has the position's id, exchange, currency, baseCurrency, isOpen
+        and closedDate along with the netCurrency, netBase, absoluteBuys,
+        absoluteSells, firstOrderDate, lastOrderDate and numOrders of its
+        orders.
+        """
+
+        absoluteNetBase = case([(Order.netBase < 0, -Order.netBase)], else_=Order.netBase)
+        buyNetBase = case([(Order.orderType == ORDER_TYPE_BUY, absoluteNetBase)])
+        sellNetBase = case([(Order.orderType == ORDER_TYPE_SELL, absoluteNetBase)])
+        query = (session.query(
+                        Position.id, Position.exchange, Position.currency, Position.baseCurrency,
+                        Position.isOpen, Position.closedDate,
+                        _fixedPointSum(Order.netCurrency).label('netCurrency'),
+                        _fixedPointSum(Order.netBase).label('netBase'),
+                        _fixedPointSum(buyNetBase).label('absoluteBuys'),
+                        _fixedPointSum(sellNetBase).label('absoluteSells'),
+                        func.min(Order.closedDate).label('firstOrderDate'),
+                        func.max(Order.closedDate).label('lastOrderDate'),
+                        func.count(Order.id).label('numOrders'))
+                .join(Wallet, Position.walletName == Wallet.name)
+                .outerjoin(Order, Order.positionId == Position.id)
+                .filter(Wallet.portfolioId == self.id))
+        if positionIds is not None:
+            query = query.filter(Position.id.in_(positionIds))
+        return (query
+                .group_by(Position.id)
+                .order_by(
+                        Position.exchange.asc(),
+                        Position.baseCurrency.asc(),
+                        Position.currency.asc(),
+                        func.coalesce(Position.closedDate, func.max(Order.closedDate)).desc())
+                .all())
+
+    def closePosition(self, position, changes=None):
+        """Close an open position of the portfolio, resolved by id if loaded in another session.
+
+        Raises ValueError if the position is not open or belongs to another portfolio.
+        """
+
+        session = object_session(self)
+        if object_session(position) is not session:
+            position = session.query(Position).get(position.id)
+        openPositions = OpenPositionIndex.forSession(session)
+        if (position is None or openPositions.get(*position.market()) is not position
+                or position.wallet.portfolio is not self):
+            raise ValueError("Not an open position of the portfolio: {}".format(
+                    position.id if position is not None else None))
+        position.wallet.closePosition(position)
+        if changes is not None:
+            changes.positionIds.add(position.id)
 
     def createClosedPositionOffers(self):
         offers = []
-        for wallet in self.wallets:
-            offers += wallet.createClosedPositionOffers()
+        with Instruments.span('createClosedPositionOffers'):
+            for wallet in self.wallets:
+                offers += wallet.createClosedPositionOffers()
+        Instruments.count('createClosedPositionOffers', len(offers))
         return offers
 
-    def moveOrdersToNewClosedPosition(self, position, orders):
-        return position.wallet.moveOrdersToNewClosedPosition(position, orders)
+    @staticmethod
+    def getOfferScanChanges(scanSession):
+        """Collect the offer scan states changed in a session, e.g. a read-only one, by position id.
+
+        Each state is given along with the state it replaced, so that it can
+        be stored by saveOfferScanChanges after the session is closed.
+        """
+
+        changes = {}
+        for instance in scanSession.dirty:
+            if isinstance(instance, Position):
+                history = inspect(instance).attrs.offerScanState.history
+                if history.added:
+                    changes[instance.id] = (
+                            history.deleted[0] if history.deleted else None, history.added[0])
+        return changes
+
+    @staticmethod
+    def saveOfferScanChanges(session, changes):
+        """Store offer scan states unless the position was changed after it was read for the scan.
+
+        A state is not stored if the position's state was replaced meanwhile,
+        or if orders up to the last scanned order were added or removed, as
+        when orders are imported into a position which had not been scanned.
+        Those orders are then scanned again.
+        """
+
+        storedStates = dict(session
+                .query(Position.id, Position.offerScanState)
+                .filter(Position.id.in_(changes)))
+        scannedStates = []
+        for positionId, (previousState, state) in changes.items():
+            if positionId not in storedStates or storedStates[positionId] != previousState:
+                continue
+            scannedOrders = (session
+                    .query(func.count(Order.id), _fixedPointSum(Order.netCurrency))
+                    .filter(Order.positionId == positionId))
+            if state['lastOrder'] is not None:
+                lastDate, lastId = state['lastOrder']
+                scannedOrders = scannedOrders.filter(or_(
+                        Order.closedDate < lastDate,
+                        and_(Order.closedDate == lastDate, Order.id <= lastId)))
+            if tuple(scannedOrders.one()) == (state['numOrders'], state['netCurrency']):
+                scannedStates.append({'id': positionId, 'offerScanState': state})
+        session.bulk_update_mappings(Position, scannedStates)
+
+    def moveOrdersToNewClosedPosition(self, position, orders, changes=None):
+        newPosition = position.wallet.moveOrdersToNewClosedPosition(position, orders)
+        if changes is not None:
+            # assign an identifier to the new position
+            object_session(self).flush()
+            changes.movedOrderIds.update(order.id for order in orders)
+            changes.positionIds.update((position.id, newPosition.id))
+        return newPosition
@@ -0,0 +1,14 @@
+class PortfolioChanges():
+    """Record the orders and positions affected by changes to a portfolio."""
+
+    def __init__(self):
+        self.insertedOrderIds = set()
+        self.updatedOrderIds = set()
+        self.movedOrderIds = set()
+        self.positionIds = set()
+
+    def update(self, other):
+        self.insertedOrderIds |= other.insertedOrderIds
+        self.updatedOrderIds |= other.updatedOrderIds
+        self.movedOrderIds |= other.movedOrderIds
+        self.positionIds |= other.positionIds
@@ -1,13 +1,21 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
-from sqlalchemy.orm import relationship
+from decimal import Decimal
+
+from sqlalchemy import and_, Boolean, Column, DateTime, ForeignKey, Integer, or_, PickleType, String
+from sqlalchemy.orm import object_session, relationship
 from sqlalchemy.schema import Index
 
 from model import Base
 from names import ORDER_TYPE_BUY, ORDER_TYPE_SELL
-from trading.order import Order
+from trading.order import Order, roundAmount, SqliteFixedPoint
+
+def _orderKey(order):
+    # orders are scanned in order of closed date, then id
+    return (order.closedDate, order.id)
 
 class Position(Base):
     __tablename__ = 'positions'
+    # number of net currencies kept in offerScanState at which offered sequences can start
+    MAX_OFFER_STARTS = 500
 
     id = Column(Integer, primary_key=True)
     walletName = Column(String, ForeignKey('wallets.name'), nullable=False)
@@ -18,6 +26,13 @@ class Position(Base):
     isOpen = Column(Boolean, nullable=False)
     closedDate = Column(DateTime)
     orders = relationship("Order", back_populates="position", lazy="dynamic")
+    # running totals of the orders in the position
+    netCurrency = Column(SqliteFixedPoint)
+    netBase = Column(SqliteFixedPoint)
+    absoluteBuys = Column(SqliteFixedPoint)
+    absoluteSells = Column(SqliteFixedPoint)
+    # progress of the search for closed position offers, see scanForOffers
+    offerScanState = Column(PickleType)
 
     __table_args__ = (Index(
             'single_open_position_per_market',
@@ -33,6 +48,13 @@ class Position(Base):
         self.currency = currency
         self.baseCurrency = baseCurrency
         self.isOpen = True
+        self.netCurrency = Decimal(0)
+        self.netBase = Decimal(0)
+        self.absoluteBuys = Decimal(0)
+        self.absoluteSells = Decimal(0)
+
+    def market(self):
+        return (self.exchange, self.currency, self.baseCurrency)
 
     def getOrders(self):
         return self.orders.order_by(Order.closedDate)
@@ -42,24 +64,165 @@ class Position(Base):
 
     def addOrder(self, order):
         self.orders.append(order)
+        self.updateTotals(order)
 
     def removeOrder(self, order):
         self.orders.remove(order)
+        self.updateTotals(order, sign=-1)
 
-    def currencyProfitLoss(self):
-        return sum([order.netCurrency for order in self.orders])
+    def updateTotals(self, order, sign=1):
+        """Add the amounts of an order to the running totals, or subtract them if sign is -1."""
 
-    def baseProfitLoss(self):
-        return sum([order.netBase for order in self.orders])
+        # offers can only be searched for incrementally while orders are added
+        # after the last scanned order
+        if self.offerScanState and (
+                sign < 0 or _orderKey(order) <= self.offerScanState['lastOrder']):
+            self.offerScanState = None
+        # totals are kept as the sums of the stored amounts
+        netBase = roundAmount(order.netBase)
+        self.netCurrency += sign * roundAmount(order.netCurrency)
+        self.netBase += sign * netBase
+        if order.orderType == ORDER_TYPE_BUY:
+            self.absoluteBuys += sign * abs(netBase)
+        elif order.orderType == ORDER_TYPE_SELL:
+            self.absoluteSells += sign * abs(netBase)
 
-    def baseProfitPercent(self):
-        absoluteBuys = 0
-        absoluteSells = 0
+    def calculateTotals(self):
+        """Compute the running totals from the orders in the position."""
+
+        totals = {
+                'netCurrency': Decimal(0),
+                'netBase': Decimal(0),
+                'absoluteBuys': Decimal(0),
+                'absoluteSells': Decimal(0)}
         for order in self.orders:
+            netBase = roundAmount(order.netBase)
+            totals['netCurrency'] += roundAmount(order.netCurrency)
+            totals['netBase'] += netBase
             if order.orderType == ORDER_TYPE_BUY:
-                absoluteBuys += abs(order.netBase)
+                totals['absoluteBuys'] += abs(netBase)
             elif order.orderType == ORDER_TYPE_SELL:
-                absoluteSells += abs(order.netBase)
+                totals['absoluteSells'] += abs(netBase)
+        return totals
+
+    def recalculateTotals(self):
+        for attribute, value in self.calculateTotals().items():
+            setattr(self, attribute, value)
+
+    def hasConsistentTotals(self):
+        return all(
+                getattr(self, attribute) == value
+                for attribute, value in self.calculateTotals().items())
+
+    def scanForOffers(self):
+        """Find sequences of orders with a net currency of zero, which can be closed as positions.
+
+        Each order is reported as the end of the shortest zero-net-currency
+        sequence ending at it, which need not start at the first order of the
+        position. Sequences overlapping an earlier one are left out, so that
+        accepting every offer never moves an order twice. Offers are kept in
+        offerScanState and made again by every scan until their orders are
+        moved, which resets the state, so that declined offers are not lost.
+
+        The running net amounts and the points at which each net currency was
+        last reached are kept in offerScanState, so only new orders are read.
+        Only the MAX_OFFER_STARTS most recently reached net currencies are kept,
+        along with zero, so that the state of a position of many orders stays
+        small. A sequence starting at a net currency which was dropped is not
+        found, unless a later scan starts over as orders are moved or added
+        before the last scanned order.
+        """
+
+        state = self.offerScanState or {
+                'lastOrder': None,
+                'netCurrency': Decimal(0),
+                'netBase': Decimal(0),
+                'numOrders': 0,
+                # net currency -> net base, number of orders, last order and
+                # date of the following order when the net currency was reached
+                'reached': {Decimal(0): (Decimal(0), 0, None, None)},
+                'offers': []}
+        lastOrder = state['lastOrder']
+        netCurrency = state['netCurrency']
+        netBase = state['netBase']
+        numOrders = state['numOrders']
+        reached = dict(state['reached'])
+        offers = list(state.get('offers', ()))
+
+        query = (object_session(self)
+                .query(Order.id, Order.closedDate, Order.netCurrency, Order.netBase)
+                .filter(Order.positionId == self.id))
+        if lastOrder:
+            query = query.filter(or_(
+                    Order.closedDate > lastOrder[0],
+                    and_(Order.closedDate == lastOrder[0], Order.id > lastOrder[1])))
+        for order in query.order_by(Order.closedDate, Order.id):
+            previousNetBase, previousNumOrders, previousLastOrder, nextDate = reached[netCurrency]
+            if nextDate is None:
+                reached[netCurrency] = (
+                        previousNetBase, previousNumOrders, previousLastOrder, order.closedDate)
+            netCurrency += order.netCurrency
+            netBase += order.netBase
+            numOrders += 1
+            lastOrder = _orderKey(order)
+            if netCurrency in reached:
+                startNetBase, startNumOrders, startAfter, firstDate = reached[netCurrency]
+                # offers end in order, so an offer only overlaps an earlier one if it starts before
+                # the end of the last offer
+                if not offers or (startAfter is not None and startAfter >= offers[-1]['end']):
+                    offers.append({
+                            'positionId': self.id,
+                            'exchange': self.exchange,
+                            'currency': self.currency,
+                            'baseCurrency': self.baseCurrency,
+                            'startAfter': startAfter,
+                            'end': lastOrder,
+                            'firstDate': firstDate,
+                            'lastDate': order.closedDate,
+                            'numOrders': numOrders - startNumOrders,
+                            'netBase': netBase - startNetBase})
+            # reached net currencies are kept from the least to the most recently reached
+            reached.pop(netCurrency, None)
+            reached[netCurrency] = (netBase, numOrders, lastOrder, None)
+            if len(reached) > self.MAX_OFFER_STARTS:
+                del reached[next(start for start in reached if start)]
+
+        # assign a new state so that the change is detected and saved
+        self.offerScanState = {
+                'lastOrder': lastOrder,
+                'netCurrency': netCurrency,
+                'netBase': netBase,
+                'numOrders': numOrders,
+                'reached': reached,
+                'offers': offers}
+        return [dict(offer) for offer in offers]
+
+    def getOrderIdsBetween(self, startAfter, end):
+        """Get the ids of orders after the startAfter order up to and including the end order."""
+
+        query = (object_session(self)
+                .query(Order.id)
+                .filter(Order.positionId == self.id)
+                .filter(or_(
+                        Order.closedDate < end[0],
+                        and_(Order.closedDate == end[0], Order.id <= end[1]))))
+        if startAfter:
+            query = query.filter(or_(
+                    Order.closedDate > startAfter[0],
+                    and_(Order.closedDate == startAfter[0], Order.id > startAfter[1])))
+        return [orderId for orderId, in query]
+
+    def currencyProfitLoss(self):
+        return self.netCurrency
+
+    def baseProfitLoss(self):
+        return self.netBase
+
+    def baseProfitPercent(self):
+        return self.profitPercent(self.absoluteBuys, self.absoluteSells)
+
+    @staticmethod
+    def profitPercent(absoluteBuys, absoluteSells):
         if absoluteBuys == 0 or absoluteSells == 0:
             return 0
         else:
@@ -1,6 +1,9 @@
 from names import ORDER_TYPE_BUY, ORDER_TYPE_SELL
 
 class Trade():
+    __slots__ = (
+            'id', 'orderId', 'closedDate', 'exchange', 'orderType', 'currency', 'baseCurrency',
+            'quantity', 'price', 'subtotal', 'currencyFee', 'baseFee', 'netCurrency', 'netBase')
 
     def __init__(
             self, id=None, orderId=None, closedDate=None, exchange=None, orderType=None,
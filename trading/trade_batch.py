@@ -0,0 +1,225 @@
+from collections import namedtuple
+from decimal import Decimal
+from importlib.util import find_spec
+import operator
+
+from names import ORDER_TYPE_BUY, ORDER_TYPE_SELL
+from trading.order import OrderRecord
+
+# imported once a batch is created, since importing NumPy takes longer than the rest of the
+# domain model; trades are parsed one at a time without it
+numpy = None
+
+# amounts of a trade which are totalled by its order
+AMOUNTS = ('quantity', 'subtotal', 'currencyFee', 'baseFee', 'netCurrency', 'netBase')
+# attributes of a trade which are kept by its order
+ATTRIBUTES = (
+        'orderId', 'closedDate', 'exchange', 'orderType', 'currency', 'baseCurrency') + AMOUNTS
+# largest number of digits of an amount, or of a total of amounts, held in a 64-bit integer
+MAX_DIGITS = 18
+
+# the trade from which an order is created
+OrderTotals = namedtuple('OrderTotals', ATTRIBUTES)
+
+def _importNumpy():
+    global numpy
+    if numpy is None:
+        import numpy
+    return numpy
+
+def _parseDecimalTexts(texts):
+    """Return the digits of decimal numbers as integers along with their numbers of decimal places.
+
+    None is returned unless every text is a plain decimal number of at
+    most MAX_DIGITS digits, e.g. -12.3400, which is read exactly as
+    Decimal reads it.
+    """
+
+    _importNumpy()
+    try:
+        # byte strings are processed about twice as fast as str
+        texts = numpy.asarray(texts, dtype=bytes)
+    except UnicodeEncodeError:
+        return None
+    parts = numpy.char.partition(texts, b'.')
+    wholes, fractions = parts[:, 0], parts[:, 2]
+    negative = numpy.char.startswith(wholes, b'-')
+    if negative.any():
+        wholes = numpy.where(negative, numpy.char.replace(wholes, b'-', b'', 1), wholes)
+    digits = numpy.char.add(wholes, fractions)
+    numDigits = numpy.char.str_len(digits)
+    if not numpy.char.isdigit(digits).all() or numDigits.max() > MAX_DIGITS:
+        return None
+    units = digits.astype(numpy.int64)
+    return numpy.where(negative, -units, units), numDigits, numpy.char.str_len(fractions)
+
+class FixedPointColumn():
+    """Decimal amounts of a batch as integers in units of 10^-scale along with their exponents.
+
+    Adding or subtracting columns gives the exponents Decimal arithmetic
+    would, so that the Decimals materialized from a column are the same.
+    """
+
+    def __init__(self, units, exponents):
+        self.units = units
+        self.exponents = exponents
+
+    def __add__(self, other):
+        return FixedPointColumn(
+                self.units + other.units, numpy.minimum(self.exponents, other.exponents))
+
+    def __sub__(self, other):
+        return FixedPointColumn(
+                self.units - other.units, numpy.minimum(self.exponents, other.exponents))
+
+    def __neg__(self):
+        return FixedPointColumn(-self.units, self.exponents)
+
+    def __abs__(self):
+        return FixedPointColumn(numpy.abs(self.units), self.exponents)
+
+    @staticmethod
+    def where(condition, column, otherColumn):
+        return FixedPointColumn(
+                numpy.where(condition, column.units, otherColumn.units),
+                numpy.where(condition, column.exponents, otherColumn.exponents))
+
+    def totals(self, rows, starts):
+        """Total the amounts of groups of rows, each group starting at an index of starts."""
+
+        units = self.units[rows]
+        return FixedPointColumn(
+                numpy.add.reduceat(units, starts),
+                numpy.minimum.reduceat(self.exponents[rows], starts))
+
+    def decimals(self, scale):
+        # the units of each amount are a multiple of the power of ten of its exponent
+        coefficients = self.units // numpy.power(10, scale + self.exponents, dtype=numpy.int64)
+        exponents = self.exponents.tolist()
+        # multiplying 1E-n by an integer gives a Decimal with the exponent -n
+        powers = {exponent: Decimal(1).scaleb(exponent) for exponent in set(exponents)}
+        return list(map(operator.mul, map(powers.__getitem__, exponents), coefficients.tolist()))
+
+class TradeBatch():
+    """Trades of a batch of records, held in columns and folded into orders by vectorized code.
+
+    Amounts are held as 64-bit integers in units of 10^-scale, where scale
+    is the largest number of decimal places of an amount in the batch, and
+    are only materialized as Decimals for the totals of each order. The
+    orders are the same as those built by adding up Trade objects, down
+    to the exponents of their Decimals. Other attributes are kept in lists.
+    """
+
+    AVAILABLE = find_spec('numpy') is not None
+    ATTRIBUTES = ATTRIBUTES
+
+    def __init__(self, size, scale, constants, columns, amounts):
+        self.size = size
+        self.scale = scale
+        # attributes having the same value for every trade
+        self.constants = constants
+        self.columns = columns
+        self.orderIds = numpy.asarray(columns['orderId'], dtype=str)
+        self.orderTypes = numpy.asarray(columns['orderType'], dtype=str)
+        for attribute in AMOUNTS:
+            setattr(self, attribute, amounts[attribute])
+
+    @classmethod
+    def create(cls, size, constants, columns):
+        """Create a batch from attributes shared by all trades and lists of the attributes of each.
+
+        Amounts are given as decimal text. None is returned if the trades
+        cannot be folded exactly, e.g. as an amount has too many digits,
+        in which case they should be parsed one at a time.
+        """
+
+        if not cls.AVAILABLE or not size:
+            return None
+        _importNumpy()
+        columns = dict(columns)
+        for attribute in ('orderId', 'closedDate', 'orderType'):
+            if attribute in constants:
+                columns[attribute] = [constants[attribute]] * size
+        constants = {
+                attribute: value for attribute, value in constants.items()
+                if attribute not in columns}
+        if set(columns) | set(constants) | set(AMOUNTS) != set(ATTRIBUTES):
+            return None
+
+        parsedAmounts = {}
+        for attribute in AMOUNTS:
+            if attribute in columns:
+                parsedAmounts[attribute] = _parseDecimalTexts(columns.pop(attribute))
+            else:
+                # amounts not in the records are calculated once the batch is created,
+                # as those of a Trade
+                parsedAmounts[attribute] = _parseDecimalTexts([str(constants.pop(attribute, 0))])
+                if parsedAmounts[attribute] is not None:
+                    parsedAmounts[attribute] = [
+                            numpy.broadcast_to(values, size) for values in parsedAmounts[attribute]]
+            if parsedAmounts[attribute] is None:
+                return None
+        scale = max(int(places.max()) for _, _, places in parsedAmounts.values())
+        amounts = {}
+        magnitude = 0.0
+        for attribute, (units, numDigits, places) in parsedAmounts.items():
+            if (numDigits + scale - places).max() > MAX_DIGITS:
+                return None
+            amounts[attribute] = FixedPointColumn(
+                    units * numpy.power(10, scale - places, dtype=numpy.int64),
+                    -places.astype(numpy.int64))
+            magnitude += numpy.abs(amounts[attribute].units).sum(dtype=float)
+        # each total is at most the sum of two amounts of every trade in the batch
+        if 2 * magnitude >= 10 ** MAX_DIGITS:
+            return None
+
+        batch = cls(size, scale, constants, columns, amounts)
+        if not numpy.isin(batch.orderTypes, (ORDER_TYPE_BUY, ORDER_TYPE_SELL)).all():
+            return None
+        return batch
+
+    def recalculateNetAmounts(self):
+        """Calculate the net amounts of every trade from its amounts and fees.
+
+        They are calculated as by Trade.recalculateNetAmounts.
+        """
+
+        buy = self.orderTypes == ORDER_TYPE_BUY
+        self.netCurrency = FixedPointColumn.where(
+                buy, self.quantity - self.currencyFee, -self.quantity - self.currencyFee)
+        self.netBase = FixedPointColumn.where(
+                buy, -self.subtotal - self.baseFee, self.subtotal - self.baseFee)
+
+    def orders(self):
+        """Fold the trades into orders, in the order of their first trades.
+
+        This is the order in which HistoryParser.ordersFromTrades returns them.
+        """
+
+        _, firstRows, groups = numpy.unique(self.orderIds, return_index=True, return_inverse=True)
+        # number the orders by their first trades rather than by their ids
+        ranks = numpy.argsort(firstRows)
+        orderNumbers = numpy.empty_like(ranks)
+        orderNumbers[ranks] = numpy.arange(len(ranks))
+        orderNumbers = orderNumbers[groups.reshape(-1)]
+        rows = numpy.argsort(orderNumbers, kind='stable')
+        starts = numpy.searchsorted(orderNumbers[rows], numpy.arange(len(ranks)))
+        firstRows = firstRows[ranks]
+
+        values = {attribute: [value] * len(ranks) for attribute, value in self.constants.items()}
+        firstRows = firstRows.tolist()
+        for attribute, column in self.columns.items():
+            values[attribute] = [column[row] for row in firstRows]
+        # orders take the latest date of their trades, compared in the order of the trades as when
+        # they are added one at a time, so only orders with several trades take any time
+        later = numpy.ones(self.size, dtype=bool)
+        later[firstRows] = False
+        laterRows = numpy.flatnonzero(later)
+        closedDates = values['closedDate']
+        for orderNumber, row in zip(orderNumbers[laterRows].tolist(), laterRows.tolist()):
+            closedDates[orderNumber] = max(
+                    closedDates[orderNumber], self.columns['closedDate'][row])
+        for attribute in AMOUNTS:
+            values[attribute] = getattr(self, attribute).totals(rows, starts).decimals(self.scale)
+        orderTotals = zip(*(values[attribute] for attribute in ATTRIBUTES))
+        return list(map(OrderRecord, map(OrderTotals._make, orderTotals)))
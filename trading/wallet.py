@@ -1,10 +1,10 @@
 from decimal import Decimal
 
-from kivy.logger import Logger
 from sqlalchemy import Column, ForeignKey, Integer, PickleType, String
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import object_session, relationship
 
-from trading.order import Order
+from trading.open_position_index import OpenPositionIndex
+from trading.order import calculateFingerprint, Order
 from trading.position import Position
 
 # import last so classes are detected for corresponding tables
@@ -16,6 +16,8 @@ class Wallet(Base):
     portfolioId = Column(Integer, ForeignKey('portfolios.id'), nullable=False)
     portfolio = relationship("Portfolio", back_populates="wallets")
     balances = Column(PickleType)
+    # position of the last retrieval from the exchange API, as defined by its poller
+    syncCursor = Column(PickleType)
     orders = relationship("Order", order_by=Order.closedDate, back_populates="wallet", lazy="dynamic")
     positions = relationship("Position", back_populates="wallet", lazy="dynamic")
 
@@ -27,27 +29,41 @@ class Wallet(Base):
     def addOrder(self, order, session=None):
         if not session:
             session = Session()
-        # find an open position this order can be put in
-        positions = session.query(Position).filter(
-                Position.exchange == order.exchange,
-                Position.currency == order.currency,
-                Position.baseCurrency == order.baseCurrency,
-                Position.isOpen == True).all()
-        if len(positions) > 1:
-            Logger.error(
-                    "Multiple open positions in same market. Database constraint violated: %s %s/%s",
-                    order.exchange, order.baseCurrency, order.currency)
-        elif len(positions) == 1:
-            position = positions[0]
-        else:
-            position = Position(self, order.exchange, order.currency, order.baseCurrency)
-            session.add(position)
+        position = self._findOpenPosition(order, session)
         # prevent order from being added to session until references
         # to other database objects are finalized
         with session.no_autoflush:
             order.wallet = self
-            order.position = position
+            order.fingerprint = calculateFingerprint(order)
+            position.addOrder(order)
+        self._addToBalances(order)
+
+    def addOrders(self, orders, session):
+        """Put new orders in open positions and insert them with a bulk statement."""
+
+        positions = [self._findOpenPosition(order, session) for order in orders]
+        # assign identifiers to any new positions
+        session.flush()
+        for order, position in zip(orders, positions):
+            order.walletName = self.name
+            order.positionId = position.id
+            order.fingerprint = calculateFingerprint(order)
+            position.updateTotals(order)
+            self._addToBalances(order)
+        session.bulk_save_objects(orders)
+
+    def _findOpenPosition(self, order, session):
+        """Find an open position the order can be put in, creating one if necessary."""
+
+        openPositions = OpenPositionIndex.forSession(session)
+        position = openPositions.get(order.exchange, order.currency, order.baseCurrency)
+        if position is None:
+            position = Position(self, order.exchange, order.currency, order.baseCurrency)
+            session.add(position)
+            openPositions.add(position)
+        return position
 
+    def _addToBalances(self, order):
         if order.currency not in self.balances:
             self.balances[order.currency] = Decimal(0.0)
         if order.baseCurrency not in self.balances:
@@ -61,9 +77,15 @@ class Wallet(Base):
 
     def closePosition(self, position):
         position.close()
+        session = object_session(position)
+        if session:
+            OpenPositionIndex.forSession(session).remove(position)
 
     def moveOrdersToNewClosedPosition(self, position, orders):
         newPosition = Position(self, position.exchange, position.currency, position.baseCurrency)
+        # the open position of this market stays in place, so the new position
+        # must not be flushed as open while its orders are being moved
+        newPosition.isOpen = False
         for order in orders:
             position.removeOrder(order)
             newPosition.addOrder(order)
@@ -74,21 +96,7 @@ class Wallet(Base):
     def createClosedPositionOffers(self):
         offers = []
         for position in self.getOpenPositions():
-            orderIds = []
-            netCurrency = 0
-            netBase = 0
-            for order in position.getOrders():
-                orderIds.append(order.id)
-                netCurrency += order.netCurrency
-                netBase += order.netBase
-                # found a sequence of orders from the beginning of the position that
-                # yields a net zero currency, not necessarily positive net base
-                if netCurrency == 0:
-                    offers.append({
-                            'positionId': position.id, 'orderIds': orderIds, 'netBase': netBase})
-                    orderIds = []
-                    netCurrency = 0
-                    netBase = 0
+            offers += position.scanForOffers()
         return offers
 
     def getOpenPositions(self):
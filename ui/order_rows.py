@@ -0,0 +1,64 @@
+from bisect import bisect_left
+
+class OrderRows():
+    """Keep the rows of an order list sorted by key, to replace the rows of some orders in place.
+
+    The data of the list is a flat list of cells, a header row followed by
+    the cells of each row. The key of a row ends with the id of its order.
+    """
+
+    def __init__(self, numColumns):
+        self.numColumns = numColumns
+        self.keys = []
+        self.keysById = {}
+
+    def replaceAll(self, header, rows):
+        """Return the data of the list with the header and the given rows, as (key, cells) pairs."""
+
+        rows.sort(key=lambda row: row[0])
+        data = list(header)
+        for _, cells in rows:
+            data += cells
+        self.keys = [key for key, _ in rows]
+        self.keysById = {key[-1]: key for key, _ in rows}
+        return data
+
+    def replace(self, data, rows, orderIds):
+        """Replace the rows of the given orders in the data of the list by the given rows.
+
+        The orders of the rows need not have been in the list, and orders
+        without a row are removed. The changed rows lie between the first
+        modified row and the rows at the end that were not affected, which
+        are replaced with a single modification of the data.
+        """
+
+        keys = list(self.keys)
+        newCells = {}
+        first = len(keys)
+        numUnchangedAtEnd = len(keys)
+        for orderId in orderIds:
+            if orderId in self.keysById:
+                index = bisect_left(keys, self.keysById.pop(orderId))
+                del keys[index]
+                first = min(first, index)
+                numUnchangedAtEnd = min(numUnchangedAtEnd, len(keys) - index)
+        for key, cells in rows:
+            index = bisect_left(keys, key)
+            keys.insert(index, key)
+            self.keysById[key[-1]] = key
+            newCells[key] = cells
+            first = min(first, index)
+            numUnchangedAtEnd = min(numUnchangedAtEnd, len(keys) - index - 1)
+
+        oldEnd = len(self.keys) - numUnchangedAtEnd
+        oldRows = {key: first + offset for offset, key in enumerate(self.keys[first:oldEnd])}
+        cells = []
+        for key in keys[first:len(keys) - numUnchangedAtEnd]:
+            if key in newCells:
+                cells += newCells[key]
+            else:
+                # rows of the data start after the header
+                row = oldRows[key] + 1
+                cells += data[row * self.numColumns:(row + 1) * self.numColumns]
+        data[(first + 1) * self.numColumns:(oldEnd + 1) * self.numColumns] = cells
+        self.keys = keys
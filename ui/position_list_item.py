@@ -1,5 +1,7 @@
 class PositionListItem():
-    def __init__(self, uiClass, text, id=None):
+    def __init__(self, uiClass, text, id=None, key=None):
         self.uiClass = uiClass
         self.text = text
         self.id = id
+        # position of the item in a SortedWidgetList
+        self.key = key
@@ -0,0 +1,50 @@
+from ui.position_list_item import PositionListItem
+
+class PositionLists():
+    """The open and closed position lists, whose items are replaced by position id.
+
+    The lists are SortedWidgetLists of widgets created from PositionListItems
+    by createWidget. Closed positions are grouped under header items of
+    headerClass for their exchange, base currency and currency.
+    """
+
+    def __init__(self, openList, closedList, createWidget, headerClass):
+        self.openList = openList
+        self.closedList = closedList
+        self.createWidget = createWidget
+        self.headerClass = headerClass
+        self.keysById = {}
+
+    def replace(self, openItems, closedItems, positionIds=None):
+        """Replace every item by the given items, or only the items of the given positions."""
+
+        if positionIds is None:
+            self.openList.clear()
+            self.closedList.clear()
+            self.keysById = {}
+        else:
+            for positionId in positionIds:
+                if positionId in self.keysById:
+                    self._remove(self.keysById.pop(positionId))
+        for item in openItems:
+            self.openList.insert(item.key, self.createWidget(item))
+            self.keysById[item.id] = item.key
+        for item in closedItems:
+            for level, text in enumerate(item.key[:3]):
+                headerKey = item.key[:level + 1]
+                if headerKey not in self.closedList:
+                    self.closedList.insert(headerKey, self.createWidget(
+                            PositionListItem(uiClass=self.headerClass, text="    " * level + text)))
+            self.closedList.insert(item.key, self.createWidget(item))
+            self.keysById[item.id] = item.key
+
+    def _remove(self, key):
+        if key in self.openList:
+            self.openList.remove(key)
+        elif key in self.closedList:
+            self.closedList.remove(key)
+            # remove headers left without positions
+            for level in (3, 2, 1):
+                headerKey = key[:level]
+                if headerKey in self.closedList and not self.closedList.hasChildren(headerKey):
+                    self.closedList.remove(headerKey)
@@ -0,0 +1,38 @@
+from bisect import bisect_left, bisect_right
+
+class SortedWidgetList():
+    """Keep the widgets of a vertical layout ordered by key so that they can be changed in place.
+
+    Keys are tuples, so a key that is a prefix of other keys, such as a group
+    header, is displayed before them.
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.keys = []
+        self.widgets = {}
+
+    def __contains__(self, key):
+        return key in self.widgets
+
+    def insert(self, key, widget):
+        if key in self.widgets:
+            self.remove(key)
+        index = bisect_left(self.keys, key)
+        self.keys.insert(index, key)
+        self.widgets[key] = widget
+        # children of a layout are stored in reverse order of display
+        self.layout.add_widget(widget, index=len(self.keys) - 1 - index)
+
+    def remove(self, key):
+        del self.keys[bisect_left(self.keys, key)]
+        self.layout.remove_widget(self.widgets.pop(key))
+
+    def hasChildren(self, key):
+        index = bisect_right(self.keys, key)
+        return index < len(self.keys) and self.keys[index][:len(key)] == key
+
+    def clear(self):
+        self.keys = []
+        self.widgets = {}
+        self.layout.clear_widgets()